@@ -0,0 +1,178 @@
+# admision.py
+"""
+Control de admisión para las etapas pesadas.
+
+Cada etapa (remover el fondo de la firma, extraer el TDR, generar los
+documentos) tiene un límite de ejecuciones simultáneas compartido por todas
+las sesiones del proceso y una cola FIFO acotada. Así, cuando muchos usuarios
+pulsan a la vez, el equipo no reparte sus núcleos (ni su memoria) entre
+decenas de inferencias de rembg o lecturas de pdfplumber: unas pocas avanzan
+a velocidad normal y el resto espera su turno viendo su posición en la cola.
+
+Si la cola está llena la solicitud se rechaza de inmediato con ``ColaLlena``;
+si espera más de ``ESPERA_MAXIMA`` segundos se abandona con
+``EsperaAgotada``. La profundidad de la cola, la espera y los rechazos se
+registran en ``metricas``, y las ejecuciones activas y en cola de cada etapa
+se exportan como *gauges*.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from metricas import observar, registrar_colector
+
+LIMITES = {
+    # Una inferencia de ONNX ya usa todos los núcleos
+    'firma': int(os.environ.get('COTIZACION_LIMITE_FIRMA', '1')),
+    'tdr': int(os.environ.get('COTIZACION_LIMITE_TDR', '2')),
+    'documentos': int(os.environ.get('COTIZACION_LIMITE_DOCUMENTOS', '2')),
+}
+MAX_EN_COLA = int(os.environ.get('COTIZACION_COLA_MAX', '20'))
+ESPERA_MAXIMA = float(os.environ.get('COTIZACION_COLA_ESPERA_MAXIMA', '120'))
+# Cada cuánto se avisa la posición en la cola mientras se espera
+INTERVALO_AVISO = 0.5
+
+
+class ErrorAdmision(Exception):
+    """La solicitud no obtuvo turno en una etapa pesada."""
+
+
+class ColaLlena(ErrorAdmision):
+    """La cola de la etapa está llena."""
+
+
+class EsperaAgotada(ErrorAdmision):
+    """La solicitud esperó en la cola más de lo permitido."""
+
+
+class Etapa:
+    """
+    Límite de concurrencia y cola FIFO de una etapa.
+
+    Args:
+        nombre: Nombre de la etapa (se usa en las métricas)
+        limite: Ejecuciones simultáneas
+        max_en_cola: Solicitudes que pueden esperar; más allá se rechazan
+        espera_maxima: Segundos que una solicitud puede esperar su turno
+    """
+
+    def __init__(self, nombre, limite, max_en_cola=MAX_EN_COLA, espera_maxima=ESPERA_MAXIMA):
+        self.nombre = nombre
+        self.limite = max(1, limite)
+        self.max_en_cola = max_en_cola
+        self.espera_maxima = espera_maxima
+        self._activas = 0
+        self._cola = []
+        self._condicion = threading.Condition()
+
+    def _puede_entrar(self, ticket):
+        # Se llama con la condición tomada
+        return self._activas < self.limite and self._cola[0] is ticket
+
+    @contextmanager
+    def turno(self, al_esperar=None):
+        """
+        Espera un turno en la etapa y lo libera al salir del bloque.
+
+        Args:
+            al_esperar: Función opcional que recibe la posición en la cola
+                (1 es la siguiente) cada vez que cambia mientras se espera
+
+        Raises:
+            ColaLlena: Si la cola ya tiene ``max_en_cola`` solicitudes
+            EsperaAgotada: Si no hubo turno en ``espera_maxima`` segundos
+        """
+        inicio = time.monotonic()
+        ticket = object()
+        with self._condicion:
+            if self._activas < self.limite and not self._cola:
+                self._activas += 1
+                ticket = None
+            elif len(self._cola) >= self.max_en_cola:
+                observar(f'cola_{self.nombre}_rechazos', 1)
+                raise ColaLlena(f"Hay demasiadas solicitudes en espera para '{self.nombre}'")
+            else:
+                self._cola.append(ticket)
+                observar(f'cola_{self.nombre}_profundidad', len(self._cola))
+
+        if ticket is not None:
+            self._esperar(ticket, inicio, al_esperar)
+        observar(f'cola_{self.nombre}_espera_segundos', time.monotonic() - inicio)
+
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._activas -= 1
+                self._condicion.notify_all()
+
+    def _esperar(self, ticket, inicio, al_esperar):
+        try:
+            self._esperar_turno(ticket, inicio, al_esperar)
+        except BaseException:
+            # El aviso puede lanzar (Streamlit interrumpe el script con
+            # RerunException/StopException): el ticket no debe quedar en la
+            # cola bloqueando a los que vienen detrás
+            with self._condicion:
+                if ticket in self._cola:
+                    self._cola.remove(ticket)
+                    self._condicion.notify_all()
+            raise
+
+    def _esperar_turno(self, ticket, inicio, al_esperar):
+        limite_tiempo = inicio + self.espera_maxima
+        avisada = None
+        while True:
+            with self._condicion:
+                if self._puede_entrar(ticket):
+                    self._cola.pop(0)
+                    self._activas += 1
+                    # El siguiente de la cola puede entrar si queda cupo
+                    self._condicion.notify_all()
+                    return
+                restante = limite_tiempo - time.monotonic()
+                if restante <= 0:
+                    observar(f'cola_{self.nombre}_abandonos', 1)
+                    raise EsperaAgotada(
+                        f"No hubo turno para '{self.nombre}' en {self.espera_maxima:g} s"
+                    )
+                posicion = self._cola.index(ticket) + 1
+                if posicion == avisada or al_esperar is None:
+                    self._condicion.wait(min(restante, INTERVALO_AVISO))
+                    continue
+            # El aviso se hace sin la condición tomada: puede escribir en la UI
+            avisada = posicion
+            al_esperar(posicion)
+
+    def estado(self):
+        """
+        Returns:
+            dict: Ejecuciones activas, solicitudes en cola y límite
+        """
+        with self._condicion:
+            return {'activas': self._activas, 'en_cola': len(self._cola), 'limite': self.limite}
+
+
+@lru_cache(maxsize=None)
+def obtener_etapa(nombre):
+    """Etapa compartida por el proceso (``firma``, ``tdr`` o ``documentos``)."""
+    return Etapa(nombre, LIMITES[nombre])
+
+
+def estado():
+    """
+    Returns:
+        dict: Nombre de la etapa -> ``Etapa.estado()``
+    """
+    return {nombre: obtener_etapa(nombre).estado() for nombre in LIMITES}
+
+
+def _colector():
+    for nombre, valores in estado().items():
+        yield 'cola_activas', {'etapa': nombre}, valores['activas']
+        yield 'cola_en_espera', {'etapa': nombre}, valores['en_cola']
+
+
+registrar_colector(_colector)
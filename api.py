@@ -0,0 +1,397 @@
+# api.py
+"""
+Servicio HTTP para generar cotizaciones sin la interfaz de Streamlit.
+
+Endpoints:
+    POST /cotizaciones  multipart/form-data con ``tdr`` (PDF), ``firma``
+                        (imagen) y ``datos`` (JSON); responde el ZIP
+    POST /tdr/extract   multipart/form-data con ``tdr``, o el PDF como
+                        cuerpo ``application/pdf``; responde los campos
+                        extraídos en JSON
+    GET  /salud         estado del servicio y de la cola
+    GET  /metricas      métricas por etapa en formato de texto de Prometheus
+
+Campos de ``datos``:
+    dni, telefono, correo, banco, cuenta, oferta y ``direccion`` (o ``lat`` y
+    ``lon`` para obtenerla por geocodificación inversa)
+    Opcionales: cci (se calcula del banco y la cuenta), nombres y ruc (si
+    faltan se consultan en SUNAT), remover_fondo
+
+Cada conexión se atiende en su propio hilo y admite keep-alive, pero el
+trabajo pesado (firma, TDR, plantillas y ZIP) pasa por un pool de
+``--hilos`` trabajadores con una cola de ``--cola`` solicitudes en espera.
+Con la cola llena el servicio responde 503 con ``Retry-After`` en lugar de
+acumular trabajo. Las plantillas (y la sesión de rembg con
+``--precargar-rembg``) se cargan una vez al iniciar.
+
+Uso:
+    python api.py [--host 127.0.0.1] [--puerto 8000] [--hilos 4] [--cola 16] [--token-sunat CLAVE]
+"""
+import argparse
+import dataclasses
+import json
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bancos import generar_cci
+from firma import ErrorImagenFirma, procesar_firma
+from generacion import ErrorEtapa, formatear_fecha, generar_paquete, precargar
+from metricas import exportar_prometheus, iniciar_exportacion
+from sunat import DatosSunat, DniNoEncontrado, ErrorSunat, SunatNoDisponible, obtener_cliente_sunat
+from tdr import ErrorLecturaTDR, extraer_datos_tdr
+
+MAX_CUERPO = int(float(os.environ.get('COTIZACION_API_MAX_MB', '20')) * 1024 * 1024)
+# Segundos que una conexión keep-alive puede quedar inactiva
+TIMEOUT_INACTIVIDAD = 15
+# Segundos sugeridos al cliente cuando la cola está llena
+REINTENTAR_EN = 2
+
+CAMPOS_REQUERIDOS = ('dni', 'telefono', 'correo', 'banco', 'cuenta', 'oferta')
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+
+
+class ErrorSolicitud(Exception):
+    """La solicitud no se puede atender; lleva el código HTTP a responder."""
+
+    def __init__(self, estado, mensaje, cabeceras=None):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.cabeceras = cabeceras
+
+
+def leer_multipart(tipo, cuerpo):
+    """
+    Separa las partes de un cuerpo ``multipart/form-data``.
+
+    Args:
+        tipo: Cabecera Content-Type completa (con el ``boundary``)
+        cuerpo: Bytes del cuerpo
+
+    Returns:
+        dict: Nombre del campo -> bytes de su contenido
+
+    Raises:
+        ErrorSolicitud: Si el cuerpo no es multipart
+    """
+    mensaje = BytesParser(policy=policy.default).parsebytes(
+        b'Content-Type: ' + tipo.encode('latin-1') + b'\r\n\r\n' + cuerpo
+    )
+    if not mensaje.is_multipart():
+        raise ErrorSolicitud(400, "Se esperaba multipart/form-data")
+    partes = {}
+    for parte in mensaje.iter_parts():
+        nombre = parte.get_param('name', header='content-disposition')
+        if nombre:
+            partes[nombre] = parte.get_payload(decode=True) or b''
+    return partes
+
+
+def resolver_direccion(datos):
+    """Dirección del proveedor, geocodificando ``lat``/``lon`` si hace falta."""
+    if datos.get('direccion'):
+        return str(datos['direccion'])
+    if datos.get('lat') is None or datos.get('lon') is None:
+        raise ErrorSolicitud(422, "Falta direccion (o lat y lon)")
+
+    lat, lon = float(datos['lat']), float(datos['lon'])
+
+    from geocodificacion import ErrorGeocodificacion, obtener_servicio_geocodificacion
+    from ubigeo import direccion_aproximada
+
+    try:
+        direccion = obtener_servicio_geocodificacion().direccion(lat, lon)
+    except ErrorGeocodificacion:
+        direccion = None
+    direccion = direccion or direccion_aproximada(lat, lon)
+    if not direccion:
+        raise ErrorSolicitud(422, "No se pudo obtener la dirección de las coordenadas")
+    return direccion
+
+
+def generar_cotizacion(partes, token_sunat):
+    """
+    Genera el ZIP de una solicitud a ``/cotizaciones``.
+
+    Returns:
+        Paquete: ZIP generado
+
+    Raises:
+        ErrorSolicitud: Si faltan datos o alguna etapa falla
+    """
+    faltantes = [campo for campo in ('tdr', 'firma', 'datos') if not partes.get(campo)]
+    if faltantes:
+        raise ErrorSolicitud(400, f"Faltan partes: {', '.join(faltantes)}")
+    try:
+        datos = json.loads(partes['datos'])
+    except ValueError as e:
+        raise ErrorSolicitud(400, f"datos no es un JSON válido: {e}") from e
+    if not isinstance(datos, dict):
+        raise ErrorSolicitud(400, "datos debe ser un objeto JSON")
+    faltantes = [campo for campo in CAMPOS_REQUERIDOS if not datos.get(campo)]
+    if faltantes:
+        raise ErrorSolicitud(422, f"Faltan campos: {', '.join(faltantes)}")
+
+    remover_fondo = str(datos.get('remover_fondo', '')).strip().lower() in VALORES_VERDADEROS
+    try:
+        firma = procesar_firma(partes['firma'], remover_fondo)
+    except ErrorImagenFirma as e:
+        raise ErrorSolicitud(422, str(e)) from e
+
+    fecha = datetime.now()
+    fecha_formateada, mes = formatear_fecha(fecha)
+    try:
+        campos = {
+            'dni': str(datos['dni']),
+            'telefono': str(datos['telefono']),
+            'correo': str(datos['correo']),
+            'direccion': resolver_direccion(datos),
+            'banco': datos['banco'],
+            'cuenta': str(datos['cuenta']),
+            'cci': str(datos.get('cci') or generar_cci(datos['banco'], str(datos['cuenta']))),
+            'oferta': float(datos['oferta']),
+            'fecha': fecha_formateada,
+            'mes': mes,
+            'year': fecha.year,
+        }
+    except (TypeError, ValueError) as e:
+        # Valores no escalares (listas, objetos) en campos numéricos o de texto
+        raise ErrorSolicitud(422, str(e)) from e
+
+    datos_sunat = None
+    if datos.get('nombres') and datos.get('ruc'):
+        datos_sunat = DatosSunat(datos['nombres'], str(datos['ruc']))
+    elif not token_sunat:
+        raise ErrorSolicitud(422, "Faltan nombres y ruc, y el servicio no tiene token de SUNAT")
+
+    def consultar_dni(dni):
+        return obtener_cliente_sunat(token_sunat).consultar(dni)
+
+    try:
+        return generar_paquete(partes['tdr'], firma, campos, consultar_dni, datos_sunat=datos_sunat)
+    except ErrorEtapa as e:
+        if isinstance(e.causa, DniNoEncontrado):
+            raise ErrorSolicitud(422, "No se pudo obtener datos de SUNAT para el DNI") from e
+        if isinstance(e.causa, (ErrorLecturaTDR, ErrorImagenFirma)):
+            # El TDR o la firma enviados no se pueden leer: es un error de la
+            # solicitud, no del servicio
+            raise ErrorSolicitud(422, str(e.causa)) from e
+        if isinstance(e.causa, SunatNoDisponible):
+            raise ErrorSolicitud(503, str(e), {'Retry-After': str(REINTENTAR_EN)}) from e
+        if e.etapa == 'sunat' or isinstance(e.causa, ErrorSunat):
+            raise ErrorSolicitud(502, str(e)) from e
+        raise ErrorSolicitud(500, str(e)) from e
+
+
+def extraer_tdr(contenido):
+    """
+    Campos de un TDR para ``/tdr/extract``.
+
+    Returns:
+        dict: Campos de ``TDRDocument`` sin el texto completo
+    """
+    try:
+        documento = extraer_datos_tdr(contenido)
+    except ErrorLecturaTDR as e:
+        raise ErrorSolicitud(422, str(e)) from e
+    campos = dataclasses.asdict(documento)
+    del campos['texto']
+    return campos
+
+
+class ServidorCotizaciones(ThreadingHTTPServer):
+    """
+    Servidor HTTP con un pool acotado para el trabajo pesado.
+
+    Args:
+        direccion: Tupla (host, puerto)
+        hilos: Trabajadores que generan cotizaciones a la vez
+        cola: Solicitudes que pueden esperar turno; más allá se responde 503
+        token_sunat: Clave de apis.net.pe para los proveedores sin nombres/ruc
+    """
+    daemon_threads = True
+
+    def __init__(self, direccion, hilos, cola, token_sunat=None):
+        super().__init__(direccion, ManejadorCotizaciones)
+        self.hilos = hilos
+        self.cola = cola
+        self.token_sunat = token_sunat
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='api')
+        self._cupos = threading.BoundedSemaphore(hilos + cola)
+        self._lock = threading.Lock()
+        self._admitidas = 0
+
+    def admitir(self):
+        """Reserva un lugar en el pool o en la cola; ``False`` si están llenos."""
+        if not self._cupos.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._admitidas += 1
+        return True
+
+    def liberar(self):
+        with self._lock:
+            self._admitidas -= 1
+        self._cupos.release()
+
+    def ejecutar(self, funcion, *args):
+        """Ejecuta ``funcion`` en el pool y espera su resultado."""
+        return self.ejecutor.submit(funcion, *args).result()
+
+    def estado(self):
+        with self._lock:
+            admitidas = self._admitidas
+        return {
+            'estado': 'ok',
+            'hilos': self.hilos,
+            'en_proceso': min(admitidas, self.hilos),
+            'en_cola': max(admitidas - self.hilos, 0),
+            'capacidad_cola': self.cola,
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+class ManejadorCotizaciones(BaseHTTPRequestHandler):
+    """Atiende una conexión; con HTTP/1.1 la conexión se reutiliza."""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'Cotizacion/1.0'
+    timeout = TIMEOUT_INACTIVIDAD
+
+    def do_GET(self):
+        if self.path == '/salud':
+            self.responder_json(200, self.server.estado())
+        elif self.path == '/metricas':
+            self.responder(200, exportar_prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self.responder_json(404, {'error': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        rutas = {
+            '/cotizaciones': self.atender_cotizacion,
+            '/tdr/extract': self.atender_extraccion,
+        }
+        atender = rutas.get(self.path)
+        if atender is None:
+            self.descartar_cuerpo()
+            self.responder_json(404, {'error': 'Ruta no encontrada'})
+            return
+        if not self.server.admitir():
+            # No se lee el cuerpo: se cierra la conexión tras responder
+            self.close_connection = True
+            self.responder_json(503, {'error': 'Servicio ocupado, intenta de nuevo'},
+                                {'Retry-After': str(REINTENTAR_EN), 'Connection': 'close'})
+            return
+        try:
+            atender(self.leer_cuerpo())
+        except ErrorSolicitud as e:
+            self.responder_json(e.estado, {'error': str(e)}, e.cabeceras)
+        except Exception as e:
+            self.log_error("Error inesperado en %s: %r", self.path, e)
+            self.close_connection = True
+            self.responder_json(500, {'error': 'Error interno'})
+        finally:
+            self.server.liberar()
+
+    def atender_cotizacion(self, cuerpo):
+        partes = leer_multipart(self.headers.get('Content-Type', ''), cuerpo)
+        paquete = self.server.ejecutar(generar_cotizacion, partes, self.server.token_sunat)
+        # El ZIP se envía desde este hilo para no ocupar un trabajador
+        # mientras el cliente lo descarga
+        with paquete.archivo:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/zip')
+            self.send_header('Content-Length', str(paquete.tamano))
+            self.send_header('Content-Disposition', 'attachment; filename="cotizacion.zip"')
+            self.end_headers()
+            shutil.copyfileobj(paquete.archivo, self.wfile, 1024 * 1024)
+
+    def atender_extraccion(self, cuerpo):
+        tipo = self.headers.get_content_type()
+        if tipo == 'multipart/form-data':
+            contenido = leer_multipart(self.headers['Content-Type'], cuerpo).get('tdr')
+        elif tipo == 'application/pdf':
+            contenido = cuerpo
+        else:
+            raise ErrorSolicitud(415, "Envía el TDR como multipart/form-data o application/pdf")
+        if not contenido:
+            raise ErrorSolicitud(400, "Falta el TDR")
+        self.responder_json(200, self.server.ejecutar(extraer_tdr, contenido))
+
+    def leer_cuerpo(self):
+        try:
+            longitud = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.close_connection = True
+            raise ErrorSolicitud(411, "Falta Content-Length") from None
+        if longitud > MAX_CUERPO:
+            self.close_connection = True
+            raise ErrorSolicitud(413, f"El cuerpo supera {MAX_CUERPO // (1024 * 1024)} MB")
+        return self.rfile.read(longitud)
+
+    def descartar_cuerpo(self):
+        try:
+            longitud = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            longitud = 0
+        if 0 < longitud <= MAX_CUERPO:
+            self.rfile.read(longitud)
+        elif longitud:
+            self.close_connection = True
+
+    def responder_json(self, estado, datos, cabeceras=None):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.responder(estado, cuerpo, 'application/json; charset=utf-8', cabeceras)
+
+    def responder(self, estado, cuerpo, tipo, cabeceras=None):
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Servicio HTTP de cotizaciones.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--hilos', type=int, default=os.cpu_count() or 1,
+                        help='Solicitudes que se procesan a la vez')
+    parser.add_argument('--cola', type=int, help='Solicitudes en espera antes de responder 503 (por defecto 4 x hilos)')
+    parser.add_argument('--token-sunat', default=os.environ.get('COTIZACION_SUNAT_TOKEN'),
+                        help='Clave de apis.net.pe para los proveedores sin nombres/ruc')
+    parser.add_argument('--precargar-rembg', action='store_true',
+                        help='Carga el modelo de rembg al iniciar')
+    args = parser.parse_args(argv)
+
+    precargar(rembg=args.precargar_rembg)
+    iniciar_exportacion()
+    cola = args.cola if args.cola is not None else 4 * args.hilos
+    servidor = ServidorCotizaciones((args.host, args.puerto), args.hilos, cola, args.token_sunat)
+    print(f"Escuchando en http://{args.host}:{servidor.server_address[1]} "
+          f"({args.hilos} hilos, cola de {cola})", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
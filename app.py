@@ -1,122 +1,217 @@
 # app.py
 import streamlit as st
-import requests
-from rembg import remove
 from PIL import Image
 import os
-from geopy.geocoders import Nominatim
 from streamlit_js_eval import get_geolocation
-import folium
-from streamlit_folium import st_folium
-import pdfplumber
-from docx import Document
-from docx.shared import Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-import re
 from datetime import datetime
+import hashlib
+import hmac
+import json
+import threading
+import time
+from contextlib import contextmanager
 from io import BytesIO
-import zipfile
-import pyperclip
 from st_copy_to_clipboard import st_copy_to_clipboard
-from streamlit_image_comparison import image_comparison
+from admision import ErrorAdmision, estado as estado_colas, obtener_etapa
+from arranque import precalentar
+from bancos import BANCOS, generar_cci
+from cache_memoria import CacheLRU
+from metricas import exportar_prometheus, iniciar_exportacion, observar, resumen_etapas
+from recursos import imagen_reducida, obtener_recurso
+from sunat import DatosSunat, DniNoEncontrado, ErrorSunat, obtener_cliente_sunat
+
+# rembg, python-docx, pdfplumber, folium y geopy se importan en la función
+# que los usa (ver arranque.py) para no retrasar el primer renderizado
 
 # Determinar la ruta base de la aplicación
 base_dir = os.path.dirname(os.path.abspath(__file__))
 
+# ZIP generados que se conservan en memoria para servir las descargas
+MAX_PAQUETES_EN_CACHE = 32
+MAX_BYTES_PAQUETES_EN_CACHE = int(os.environ.get('COTIZACION_CACHE_PAQUETES_MAX_MB', '128')) * 1024 * 1024
+
+COORDENADAS_LIMA = (-12.0464, -77.0428)
+ZOOM_INICIAL = 13
+
+# Carpeta que Streamlit sirve en app/static/ (server.enableStaticServing)
+DIR_ESTATICOS = os.path.join(base_dir, 'static')
+URL_CONSTANCIA = "https://drive.usercontent.google.com/download?id=1084eOd4CSqMQ323U1-walYGELyvo6yei&export=download&confirm=t&uuid=5acc3199-ccbb-4fe3-86fd-62de9bddfca7"
+# Las imágenes de donación se muestran a 300 px; se sirven al doble para pantallas HiDPI
+ANCHO_IMAGENES_DONACION = 600
+# El panel de métricas se muestra con ?admin=<token>; vacío lo desactiva
+TOKEN_ADMIN = os.environ.get('COTIZACION_ADMIN_TOKEN', '')
+
 def obtener_datos_sunat(dni):
-    apisnet_key = st.secrets["APISNET"]["key"]
-    url = f"https://api.apis.net.pe/v2/sunat/dni?numero={dni}&token={apisnet_key}"
+    # Cliente compartido: sesión keep-alive, reintentos y cache por DNI
+    cliente = obtener_cliente_sunat(st.secrets["APISNET"]["key"])
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            nombres = f"{data.get('nombres', '')} {data.get('apellidoPaterno', '')} {data.get('apellidoMaterno', '')}".strip()
-            ruc = data.get("ruc", "")
-            return nombres, ruc
-        else:
-            st.error("Error al obtener datos de SUNAT. Verifica el DNI ingresado.")
-            return None, None
-    except Exception as e:
+        datos = cliente.consultar(dni)
+        return datos.nombres, datos.ruc
+    except DniNoEncontrado:
+        st.error("Error al obtener datos de SUNAT. Verifica el DNI ingresado.")
+        return None, None
+    except ErrorSunat as e:
         st.error(f"Error al conectar con la API de SUNAT: {e}")
         return None, None
 
 def obtener_direccion_desde_coordenadas(lat, lon):
-    geolocator = Nominatim(user_agent="my_streamlit_app")
+    from geocodificacion import ErrorGeocodificacion, obtener_servicio_geocodificacion
+    from ubigeo import direccion_aproximada
+
+    # Servicio compartido: cache por celda geohash y límite de 1 consulta/s
+    servicio = obtener_servicio_geocodificacion()
+    celda = servicio.celda(lat, lon)
+    # Cada celda se geocodifica como máximo una vez por sesión
+    direcciones = st.session_state.setdefault('direcciones_por_celda', {})
+    if celda in direcciones:
+        return direcciones[celda]
     try:
-        location = geolocator.reverse((lat, lon))
-        return location.address
-    except Exception as e:
-        st.error(f"Error al obtener la dirección: {e}")
+        direccion = servicio.direccion(lat, lon)
+    except ErrorGeocodificacion as e:
+        # Respaldo sin conexión; no se guarda para reintentar la consulta precisa
+        aproximada = direccion_aproximada(lat, lon)
+        if aproximada:
+            st.warning(f"No se pudo obtener la dirección exacta ({e}). Se usó una aproximada, puedes completarla.")
+            return aproximada
+        st.error(
+            f"Error al obtener la dirección: {e}. La dirección aproximada sin conexión sólo cubre "
+            "Lima Metropolitana y las capitales de departamento; escríbela manualmente."
+        )
         return None
+    direcciones[celda] = direccion
+    return direccion
+
+def actualizar_direccion(lat, lon):
+    """
+    Actualiza la dirección del formulario si las coordenadas cambiaron de celda.
+
+    Returns:
+        bool: True si se actualizó la dirección
+    """
+    from geocodificacion import obtener_servicio_geocodificacion
+
+    celda = obtener_servicio_geocodificacion().celda(lat, lon)
+    if st.session_state.get('celda_direccion') == celda:
+        return False
+    direccion = obtener_direccion_desde_coordenadas(lat, lon)
+    if not direccion:
+        return False
+    st.session_state['celda_direccion'] = celda
+    st.session_state['direccion'] = direccion
+    return True
+
+def crear_mapa(lat=None, lon=None, zoom=ZOOM_INICIAL):
+    import folium
 
-def crear_mapa(lat=None, lon=None, zoom=13):
     # Usar coordenadas proporcionadas o predeterminadas de Lima, Perú
     if lat is None or lon is None:
-        lat, lon = -12.0464, -77.0428  # Coordenadas de Lima
+        lat, lon = COORDENADAS_LIMA
 
     # Crear el mapa centrado en la ubicación y usando el zoom proporcionado
-    m = folium.Map(location=[lat, lon], zoom_start=zoom)
+    return folium.Map(location=[lat, lon], zoom_start=zoom)
+
+def crear_marcador(lat, lon):
+    import folium
 
-    # Agregar marcador si hay coordenadas específicas
+    grupo = folium.FeatureGroup(name="Ubicación")
     folium.Marker(
         [lat, lon],
         popup="Ubicación actual",
         icon=folium.Icon(color='red', icon='info-sign'),
         draggable=False
-    ).add_to(m)
+    ).add_to(grupo)
+    return grupo
 
-    return m
-
-def extraer_nombre_servicio(pdf_file):
-    texto_completo = ""
-    with pdfplumber.open(pdf_file) as pdf:
-        for pagina in pdf.pages:
-            texto_completo += pagina.extract_text()
+@st.cache_resource
+def obtener_mapa_base():
+    """
+    Mapa base compartido por todas las sesiones.
 
-    texto_unido = ' '.join(texto_completo.split())
+    Siempre tiene el mismo centro y zoom iniciales; el marcador de cada
+    sesión va aparte. folium modifica el mapa al renderizarlo, así que el
+    candado devuelto serializa su uso.
 
-    patron = r'2\.\s*OBJETO\s*DE\s*LA\s*CONTRATACION\s*(.*?)\s*3\.\s*FINALIDAD\s*PUBLICA'
+    Returns:
+        tuple: (mapa, candado)
+    """
+    inicio = time.perf_counter()
+    mapa = crear_mapa(zoom=ZOOM_INICIAL)
+    observar('mapa_construccion_segundos', time.perf_counter() - inicio)
+    return mapa, threading.Lock()
 
-    match = re.search(patron, texto_unido, re.DOTALL | re.IGNORECASE)
+def mostrar_mapa(lat, lon, zoom):
+    """
+    Muestra el mapa con el marcador en la ubicación indicada.
 
-    if match:
-        servicio = ' '.join(match.group(1).split())
-        return servicio
-    return "Servicio no encontrado"
+    El mapa base no cambia, así que su script tampoco y el componente no se
+    vuelve a montar: una nueva ubicación sólo mueve el centro y reemplaza la
+    capa del marcador, que se construye en cada llamada.
 
-def extraer_forma_pago(pdf_file):
-    texto_completo = ""
-    with pdfplumber.open(pdf_file) as pdf:
-        for pagina in pdf.pages:
-            texto_completo += pagina.extract_text()
+    Returns:
+        dict: Datos devueltos por el mapa (``last_clicked`` y ``zoom``)
+    """
+    from streamlit_folium import st_folium
 
-    texto_unido = ' '.join(texto_completo.split())
+    centro = (lat, lon) if lat is not None and lon is not None else COORDENADAS_LIMA
+    mapa, lock = obtener_mapa_base()
+    marcador = crear_marcador(*centro)
 
-    patron = r'El pago se realizará en\s*(.*?)\s*luego de la emisión de la conformidad del servicio,'
+    inicio = time.perf_counter()
+    with lock:
+        mapa_data = st_folium(
+            mapa,
+            key="mapa_ubicacion",
+            height=300,
+            width=None,
+            center=centro,
+            zoom=zoom,
+            feature_group_to_add=marcador,
+            returned_objects=["last_clicked", "zoom"]
+        )
+    observar('mapa_render_segundos', time.perf_counter() - inicio)
+    return mapa_data
 
-    match = re.search(patron, texto_unido, re.DOTALL | re.IGNORECASE)
+@contextmanager
+def turno_etapa(nombre):
+    """
+    Espera turno en una etapa pesada compartida por todas las sesiones,
+    mostrando la posición en la cola mientras tanto.
 
-    if match:
-        forma_pago = ' '.join(match.group(1).split()).upper()
-        return forma_pago
-    return "FORMA DE PAGO NO ENCONTRADA"
+    Raises:
+        ErrorAdmision: Si la cola está llena o se agota la espera
+    """
+    aviso = st.empty()
 
-def extraer_dias(pdf_file):
-    texto_completo = ""
-    with pdfplumber.open(pdf_file) as pdf:
-        for pagina in pdf.pages:
-            texto_completo += pagina.extract_text()
+    def al_esperar(posicion):
+        aviso.info(f"Hay otras solicitudes en proceso. Tu posición en la cola: {posicion}")
 
-    texto_unido = ' '.join(texto_completo.split())
+    try:
+        with obtener_etapa(nombre).turno(al_esperar):
+            aviso.empty()
+            yield
+    finally:
+        aviso.empty()
+
+def obtener_documento_tdr(pdf_file):
+    from tdr import buscar_documento, extraer_datos_tdr
+
+    # Sólo la primera lectura de cada TDR pasa por la cola; un TDR ya
+    # analizado (en memoria o en el cache persistente) no espera turno
+    sha256 = huella_tdr(pdf_file)
+    documento = buscar_documento(sha256)
+    if documento is not None:
+        return documento
+    with turno_etapa('tdr'):
+        return extraer_datos_tdr(pdf_file, sha256, persistente_consultado=True)
 
-    patron = r'El plazo de ejecución del servicio es de hasta\s*(\d+)\s*días calendario'
+def extraer_nombre_servicio(pdf_file):
+    return obtener_documento_tdr(pdf_file).servicio
 
-    match = re.search(patron, texto_unido, re.DOTALL | re.IGNORECASE)
+def extraer_forma_pago(pdf_file):
+    return obtener_documento_tdr(pdf_file).forma_pago
 
-    if match:
-        dias = match.group(1)
-        return dias
-    return "DÍAS NO ENCONTRADOS"
+def extraer_dias(pdf_file):
+    return obtener_documento_tdr(pdf_file).dias
 
 def procesar_firma(firma_file, remover_fondo=False):
     """
@@ -127,27 +222,25 @@ def procesar_firma(firma_file, remover_fondo=False):
         remover_fondo: Boolean indicando si se debe remover el fondo
     
     Returns:
-        BytesIO: Imagen procesada en formato BytesIO
+        BytesIO: Imagen procesada en formato BytesIO, o None si no es válida
     """
-    # Abrir la imagen
-    image = Image.open(firma_file)
-    
-    if remover_fondo:
-        with st.spinner('Removiendo fondo de la firma...'):
-            # Remover fondo
-            imagen_procesada = remove(image)
-            # Convertir a modo RGBA si no lo está ya
-            if imagen_procesada.mode != 'RGBA':
-                imagen_procesada = imagen_procesada.convert('RGBA')
-    else:
-        imagen_procesada = image
-        
-    # Convertir a BytesIO
-    img_byte_arr = BytesIO()
-    imagen_procesada.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-    
-    return img_byte_arr
+    from firma import ErrorImagenFirma, firma_en_cache, procesar_firma as procesar_imagen_firma
+
+    contenido = firma_file.getvalue()
+    try:
+        # La segmentación sólo se ejecuta la primera vez para cada imagen y opción
+        if remover_fondo and not firma_en_cache(contenido, remover_fondo):
+            with turno_etapa('firma'), st.spinner('Removiendo fondo de la firma...'):
+                png = procesar_imagen_firma(contenido, remover_fondo)
+        else:
+            png = procesar_imagen_firma(contenido, remover_fondo)
+    except ErrorImagenFirma as e:
+        st.error(str(e))
+        return None
+    except ErrorAdmision as e:
+        st.error(f"{e}. Intenta de nuevo en unos momentos.")
+        return None
+    return BytesIO(png)
 
 def mostrar_seccion_firma():
     """
@@ -172,6 +265,9 @@ def mostrar_seccion_firma():
     if firma_file is not None:
         # Procesar firma
         firma_procesada = procesar_firma(firma_file, remover_fondo)
+        if firma_procesada is None:
+            return None, False
+        huella_subida('huella_firma', (firma_file.file_id, remover_fondo), firma_procesada.getvalue)
         
         if remover_fondo:
             # Mostrar comparación antes/después
@@ -184,10 +280,11 @@ def mostrar_seccion_firma():
                 st.image(firma_procesada, width=300)
                 
             # Opcionalmente mostrar comparador deslizante
+            from streamlit_image_comparison import image_comparison
             st.write("Comparador deslizante")
             image_comparison(
-                img1=Image.open(firma_file),
-                img2=Image.open(firma_procesada),
+                img1=Image.open(BytesIO(firma_file.getvalue())),
+                img2=Image.open(BytesIO(firma_procesada.getvalue())),
                 label1="Original",
                 label2="Sin fondo"
             )
@@ -199,133 +296,48 @@ def mostrar_seccion_firma():
     
     return None, False
 
-def generar_cotizacion(pdf_file, data):
-    # Extraer datos del PDF
-    servicio = extraer_nombre_servicio(pdf_file)
-    forma_pago = extraer_forma_pago(pdf_file)
-    dias = extraer_dias(pdf_file)
-
-    # Actualizar data con los datos extraídos
-    data['servicio'] = servicio
-    data['armada'] = forma_pago
-    data['dias'] = dias
-
-    # Cargar el documento
-    template_path = os.path.join(base_dir, 'FormatoCotizacion.docx')
-    doc = Document(template_path)
-
-    # Diccionario de reemplazos
-    reemplazos = {
-        '{{fecha}}': data['fecha'],
-        '{{servicio}}': data['servicio'],
-        '{{dias}}': data['dias'],
-        '{{oferta}}': "{:.2f}".format(data['oferta']),
-        '{{armada}}': data['armada'],
-        '{{MES}}': data['mes'],
-        '{{dni}}': data['dni'],
-        '{{nombres}}': data['nombres'],
-        '{{ruc}}': data['ruc'],
-        '{{telefono}}': data['telefono'],
-        '{{correo}}': data['correo'],
-        '{{direccion}}': data['direccion'],
-        '{{banco}}': data['banco'],
-        '{{cuenta}}': data['cuenta'],
-        '{{cci}}': data['cci'],
-        '{{year}}': str(data['year']),
-    }
+def huella_subida(nombre, clave, contenido):
+    """
+    SHA-256 de un archivo subido, calculado una sola vez por ``clave`` y
+    guardado en ``st.session_state[nombre]``: los reruns de las secciones
+    no vuelven a leer el archivo.
 
-    def reemplazar_texto(texto, reemplazos):
-        for key, value in reemplazos.items():
-            texto = texto.replace(key, str(value))
-        return texto
-
-    def procesar_parrafo(paragraph):
-        if '{{firma}}' in paragraph.text:
-            # Manejar la firma como antes
-            p = paragraph._element
-            p.clear_content()
-            run = paragraph.add_run()
-            data['firma'].seek(0)
-            run.add_picture(BytesIO(data['firma'].read()), height=Cm(1.91))
-        else:
-            # Concatenar todo el texto de los runs en el párrafo
-            full_text = ''
-            formatting = []
-            for run in paragraph.runs:
-                full_text += run.text
-                formatting.append({
-                    'bold': run.bold,
-                    'italic': run.italic,
-                    'underline': run.underline,
-                    # No guardamos font_name ni font_size
-                    'font_color': run.font.color.rgb
-                })
-
-            # Reemplazar los marcadores de posición en el texto completo
-            new_full_text = reemplazar_texto(full_text, reemplazos)
-
-            # Borrar los runs existentes
-            for run in paragraph.runs:
-                run.text = ''
-
-            # Crear un nuevo run con el texto reemplazado
-            run = paragraph.add_run(new_full_text)
-            # Aplicar el formato del primer run original
-            if formatting:
-                fmt = formatting[0]
-                run.bold = fmt['bold']
-                run.italic = fmt['italic']
-                run.underline = fmt['underline']
-                run.font.color.rgb = fmt['font_color']
-            else:
-                # Valores por defecto si no hay formato original
-                run.bold = False
-                run.italic = False
-                run.underline = False
-
-            # Establecer la fuente a Arial 11
-            run.font.name = 'Arial'
-            run.font.size = Pt(11)
-
-    # Procesar todos los párrafos en el documento principal
-    for paragraph in doc.paragraphs:
-        procesar_parrafo(paragraph)
-
-    # Función recursiva para procesar tablas anidadas
-    def procesar_tabla(tabla):
-        for row in tabla.rows:
-            for cell in row.cells:
-                # Procesar párrafos dentro de la celda
-                for paragraph in cell.paragraphs:
-                    procesar_parrafo(paragraph)
-
-                # Procesar tablas anidadas dentro de la celda
-                for tabla_anidada in cell.tables:
-                    procesar_tabla(tabla_anidada)
-
-    # Procesar todas las tablas en el documento
-    for tabla in doc.tables:
-        procesar_tabla(tabla)
-
-    # Guardar el documento modificado en un BytesIO
-    doc_io = BytesIO()
-    doc.save(doc_io)
-    doc_io.seek(0)
-    return doc_io
-
-def generar_cci(banco, cuenta):
-    if not banco or not cuenta or banco == "Otros":
-        return ""
-    
-    cuenta_limpia = cuenta.replace("-", "")
-    cci_map = {
-        "BCP": "002" + cuenta_limpia + "13",
-        "Interbank": "003" + cuenta_limpia + "43",
-        "Scotiabank": "00936020" + cuenta_limpia + "95",
-        "Banco de la Nación": "0187810" + cuenta_limpia + "55",
-        "BanBif": "0386501" + cuenta_limpia + "83"
-    }
-    return cci_map.get(banco, "")
+    Args:
+        nombre: Clave de ``session_state`` donde se guarda la huella
+        clave: Identifica la subida (``file_id`` y opciones que la afectan)
+        contenido: Función sin argumentos que devuelve los bytes a resumir
+
+    Returns:
+        str: Hash hexadecimal del contenido
+    """
+    guardada = st.session_state.get(nombre)
+    if guardada is not None and guardada[0] == clave:
+        return guardada[1]
+    huella = hashlib.sha256(contenido()).hexdigest()
+    st.session_state[nombre] = (clave, huella)
+    return huella
+
+def huella_tdr(pdf_file):
+    return huella_subida('huella_tdr', pdf_file.file_id, pdf_file.getvalue)
+
+def clave_paquete(huella_pdf, huella_firma, campos, fecha):
+    """
+    Hash de todas las entradas que determinan el ZIP generado: huellas del
+    TDR y de la firma procesada, campos del formulario (incluida la oferta)
+    y el día de la fecha.
+    """
+    h = hashlib.sha256()
+    h.update(huella_pdf.encode('ascii'))
+    h.update(huella_firma.encode('ascii'))
+    h.update(json.dumps(campos, sort_keys=True, default=str).encode('utf-8'))
+    h.update(fecha.date().isoformat().encode('ascii'))
+    return h.hexdigest()
+
+@st.cache_resource
+def obtener_cache_paquetes():
+    # Compartido por todas las sesiones del proceso y acotado en entradas y
+    # en bytes: cada entrada es un ZIP completo en memoria
+    return CacheLRU(MAX_PAQUETES_EN_CACHE, max_bytes=MAX_BYTES_PAQUETES_EN_CACHE)
 
 def crear_donation_footer(base_dir):
     footer = st.container()
@@ -344,7 +356,7 @@ def crear_donation_footer(base_dir):
             with col1:
                 yape_image_path = os.path.join(base_dir, "yape.png")
                 if os.path.exists(yape_image_path):
-                    st.image(yape_image_path, width=300)
+                    st.image(imagen_reducida(yape_image_path, ANCHO_IMAGENES_DONACION), width=300)
                 else:
                     st.error(f"No se encontró la imagen en: {yape_image_path}")
             with col2:
@@ -430,52 +442,73 @@ def crear_donation_footer(base_dir):
             with col1:
                 binance_image_path = os.path.join(base_dir, "binance.png")
                 if os.path.exists(binance_image_path):
-                    st.image(binance_image_path, width=300)
+                    st.image(imagen_reducida(binance_image_path, ANCHO_IMAGENES_DONACION), width=300)
                 else:
                     st.error(f"No se encontró la imagen en: {binance_image_path}")
             
             with col2:
                 st.link_button("Donar con Binance", "https://app.binance.com/qr/dplkbb7f88c5329c4692adf278670d1b37ab")
                 
-def main():
-    st.set_page_config(
-        page_title="Genera tu Cotización",
-        page_icon="🎣",
-        layout="wide"
-    )
-    # Inicializar variables de estado para la ubicación
-    if 'zoom' not in st.session_state:
-        st.session_state['zoom'] = 13
-    if 'lat' not in st.session_state:
-        st.session_state['lat'] = None
-    if 'lon' not in st.session_state:
-        st.session_state['lon'] = None
-    if 'direccion' not in st.session_state:
-        st.session_state['direccion'] = ''
+def campos_formulario():
+    """
+    Campos del formulario que determinan el contenido del paquete, leídos
+    de los widgets de cada sección. Es barato: se evalúa en cada rerun.
+    """
+    estado = st.session_state
+    return {
+        'dni': estado.get('dni_input', ''),
+        'telefono': estado.get('telefono_input', ''),
+        'correo': estado.get('correo_input', ''),
+        'direccion': estado.get('direccion', ''),
+        'banco': estado.get('banco_input'),
+        'cuenta': estado.get('cuenta_input', ''),
+        'cci': estado.get('cci_input', ''),
+        'oferta': estado.get('oferta_input', 0.0),
+    }
 
-    # Sección de carga de TDR
-    st.header("Sube tu TDR (PDF)")
-    pdf_file = st.file_uploader("Selecciona tu archivo PDF", type=["pdf"])
+def descartar_paquete_desactualizado():
+    """
+    Llamada al final de cada sección del formulario: si el paquete generado
+    ya no corresponde a los datos actuales, lo descarta y vuelve a ejecutar
+    la página completa para quitar el botón de descarga, que está en otro
+    fragmento. Sólo compara huellas ya calculadas y valores de los widgets:
+    no vuelve a leer el TDR ni la firma.
+    """
+    estado = st.session_state
+    clave_generada = estado.get('clave_paquete')
+    if not clave_generada:
+        return
+    pdf_file = estado.get('pdf_tdr')
+    firma_procesada = estado.get('firma_procesada')
+    if (
+        not pdf_file
+        or firma_procesada is None
+        or clave_generada != clave_paquete(
+            huella_tdr(pdf_file), estado['huella_firma'][1], campos_formulario(), datetime.now()
+        )
+    ):
+        estado['clave_paquete'] = None
+        st.rerun()
+
+@st.fragment
+def seccion_firma():
+    """
+    Carga y procesamiento de la firma.
 
-    # Sección de firma
+    Escribe: ``firma_procesada``, ``firma_cargada`` y ``huella_firma``.
+    """
     firma_procesada, firma_cargada = mostrar_seccion_firma()
+    st.session_state['firma_procesada'] = firma_procesada
+    st.session_state['firma_cargada'] = firma_cargada
+    descartar_paquete_desactualizado()
 
-    # Inicializar variables de estado si no existen
-    if 'form_data' not in st.session_state:
-        st.session_state.form_data = {
-            'dni': '',
-            'nombres': '',
-            'ruc': '',
-            'telefono': '',
-            'correo': '',
-            'direccion': '',
-            'banco': '',
-            'cuenta': '',
-            'cci': '',
-            'oferta': 0.0
-        }
+@st.fragment
+def seccion_datos_personales():
+    """
+    DNI y consulta a SUNAT.
 
-    # Sección de datos personales
+    Escribe: ``dni_input`` y ``form_data`` (dni, nombres, ruc).
+    """
     st.header("Datos Personales")
 
     # DNI y datos de SUNAT
@@ -491,8 +524,15 @@ def main():
                 'nombres': nombres,
                 'ruc': ruc
             })
+    descartar_paquete_desactualizado()
+
+@st.fragment
+def seccion_contacto():
+    """
+    Teléfono y correo.
 
-    # Información de contacto
+    Escribe: ``telefono_input``, ``correo_input`` y ``form_data``.
+    """
     col1, col2 = st.columns(2)
 
     with col1:
@@ -504,7 +544,15 @@ def main():
         correo = st.text_input("Correo electrónico", key='correo_input')
         if correo:
             st.session_state.form_data['correo'] = correo
+    descartar_paquete_desactualizado()
+
+@st.fragment
+def seccion_direccion():
+    """
+    Dirección, ubicación actual y mapa.
 
+    Escribe: ``direccion``, ``lat``, ``lon`` y ``zoom``.
+    """
     st.subheader("Dirección")
     col1, col2 = st.columns([1, 1])
 
@@ -519,12 +567,7 @@ def main():
         if loc and 'coords' in loc:
             st.session_state.lat = loc['coords']['latitude']
             st.session_state.lon = loc['coords']['longitude']
-            direccion = obtener_direccion_desde_coordenadas(
-                st.session_state.lat,
-                st.session_state.lon
-            )
-            if direccion:
-                st.session_state.direccion = direccion
+            actualizar_direccion(st.session_state.lat, st.session_state.lon)
 
     # Un solo campo de dirección fuera de las columnas
     direccion_input = st.text_input(
@@ -537,16 +580,10 @@ def main():
 
     with col2:
         # Mostrar el mapa con la ubicación si está disponible y el zoom actual
-        mapa = crear_mapa(
-            lat=st.session_state['lat'],
-            lon=st.session_state['lon'],
-            zoom=st.session_state['zoom']
-        )
-        mapa_data = st_folium(
-            mapa,
-            height=300,
-            width=None,
-            returned_objects=["last_clicked", "zoom"]
+        mapa_data = mostrar_mapa(
+            st.session_state['lat'],
+            st.session_state['lon'],
+            st.session_state['zoom']
         )
 
         # Actualizar ubicación cuando se hace clic en el mapa
@@ -561,19 +598,25 @@ def main():
             # Actualizar estado
             st.session_state['lat'] = clicked_lat
             st.session_state['lon'] = clicked_lng
-            nueva_direccion = obtener_direccion_desde_coordenadas(clicked_lat, clicked_lng)
-            if nueva_direccion:
-                st.session_state['direccion'] = nueva_direccion
-                st.rerun()
+            if actualizar_direccion(clicked_lat, clicked_lng):
+                # Sólo se vuelve a pintar esta sección con la nueva dirección
+                st.rerun(scope="fragment")
         # Actualizar el zoom incluso si no se hace clic
         elif mapa_data.get("zoom"):
             st.session_state['zoom'] = mapa_data["zoom"]
+    descartar_paquete_desactualizado()
 
-    # Información bancaria
+@st.fragment
+def seccion_bancaria():
+    """
+    Banco, cuenta y CCI.
+
+    Escribe: ``banco_input``, ``cuenta_input``, ``cci_input`` y ``form_data``.
+    """
     st.header("Información Bancaria")
     banco_seleccionado = st.selectbox(
         "Selecciona tu banco",
-        ["BCP", "Interbank", "Scotiabank", "Banco de la Nación", "BanBif", "Otros"],
+        BANCOS,
         key='banco_input'
     )
     if banco_seleccionado:
@@ -587,14 +630,24 @@ def main():
     cci = st.text_input("CCI (editable)", value=generar_cci(banco_seleccionado, cuenta), key='cci_input')
     if cci:
         st.session_state.form_data['cci'] = cci
-        
-    # Sección de oferta económica
+    descartar_paquete_desactualizado()
+
+@st.fragment
+def seccion_oferta():
+    """
+    Oferta económica, con el monto sugerido según los días del TDR.
+
+    Lee: ``pdf_tdr``. Escribe: ``oferta_input``.
+    """
     st.header("Oferta Económica")
-    
-    # Extraer días del PDF si está disponible
+    pdf_file = st.session_state.get('pdf_tdr')
+    # Extraer días del PDF si está disponible (reutiliza el análisis memorizado)
     dias = "30"  # Valor por defecto
     if pdf_file:
-        dias = extraer_dias(pdf_file)
+        try:
+            dias = extraer_dias(pdf_file)
+        except ErrorAdmision as e:
+            st.warning(f"{e}. Se usa el plazo por defecto de {dias} días.")
     
     # Obtener el valor sugerido basado en los días
     try:
@@ -611,6 +664,7 @@ def main():
             value=valor_sugerido,  # Valor sugerido dinámico
             step=10.0,
             format="%.2f",
+            key='oferta_input',
             help=f"Valor sugerido: S/ {valor_sugerido:,.2f} para {dias} días. Puedes ajustar el monto usando las flechas (±10) o ingresando directamente el valor deseado."
         )
     
@@ -632,71 +686,170 @@ def main():
     # Mostrar el valor ingresado con formato de moneda
     if oferta_total > 0:
         st.write(f"Monto ingresado: S/ {oferta_total:,.2f}")
+    descartar_paquete_desactualizado()
+
+@st.fragment
+def seccion_generacion():
+    """
+    Generación y descarga del paquete.
+
+    Lee: ``pdf_tdr``, ``firma_procesada``, ``firma_cargada``,
+    ``huella_firma``, los widgets de las demás secciones, ``direccion`` y
+    ``form_data``.
+    """
+    from generacion import ErrorEtapa, formatear_fecha, generar_paquete
+
+    estado = st.session_state
+    pdf_file = estado.get('pdf_tdr')
+    firma_procesada = estado.get('firma_procesada')
+    firma_cargada = estado.get('firma_cargada', False)
+
+    fecha_actual = datetime.now()
+    fecha_formateada, mes_actual = formatear_fecha(fecha_actual)
+    campos_paquete = campos_formulario()
+    dni = campos_paquete['dni']
+    telefono = campos_paquete['telefono']
+    correo = campos_paquete['correo']
+    banco_seleccionado = campos_paquete['banco']
+    cuenta = campos_paquete['cuenta']
+    cci = campos_paquete['cci']
+    oferta_total = campos_paquete['oferta']
+    cache_paquetes = obtener_cache_paquetes()
 
     # Botón de envío
     if st.button("Generar cotizacion"):
         if not all([pdf_file, firma_cargada, dni, st.session_state.direccion, telefono, correo, banco_seleccionado, cuenta, cci, oferta_total]):
             st.error("Por favor, complete todos los campos requeridos.")
         else:
-            # Obtener datos de SUNAT
-            nombres, ruc = obtener_datos_sunat(dni)
-            if not nombres:
-                st.error("No se pudo obtener datos de SUNAT. Verifica el DNI ingresado.")
-            else:
-                # Formatear la fecha actual en español
-                meses = {
-                    "January": "enero", "February": "febrero", "March": "marzo", "April": "abril",
-                    "May": "mayo", "June": "junio", "July": "julio", "August": "agosto",
-                    "September": "setiembre", "October": "octubre", "November": "noviembre", "December": "diciembre"
-                }
-                fecha_actual = datetime.now()
-                mes_actual = meses[fecha_actual.strftime("%B")].upper()
-                fecha_formateada = f"{fecha_actual.day} de {meses[fecha_actual.strftime('%B')]} de {fecha_actual.year}"
-
-                # Preparar datos para generar la cotización
-                data = {
-                    'dni': dni,
-                    'nombres': nombres,
-                    'ruc': ruc,
-                    'telefono': telefono,
-                    'correo': correo,
-                    'direccion': st.session_state.direccion,
-                    'banco': banco_seleccionado,
-                    'cuenta': cuenta,
-                    'cci': cci,
-                    'oferta': oferta_total,
-                    'fecha': fecha_formateada,
-                    'year': fecha_actual.year,
-                    'mes': mes_actual,
-                    'firma': firma_procesada,  # Usar la firma procesada
-                }
-
-                # Generar la cotización
-                doc_io = generar_cotizacion(pdf_file, data)
-
-                # Crear un archivo ZIP en memoria
-                zip_io = BytesIO()
-                with zipfile.ZipFile(zip_io, mode='w', compression=zipfile.ZIP_DEFLATED) as zipf:
-                    # Agregar el documento de cotización
-                    zipf.writestr('Formato de Cotización.docx', doc_io.getvalue())
-                    # Agregar la firma
-                    firma_procesada.seek(0)  # Reiniciar el puntero del archivo
-                    zipf.writestr('Firma.png', firma_procesada.getvalue())
-                    # Agregar el TDR original
-                    pdf_file.seek(0)  # Reiniciar el puntero del archivo
-                    zipf.writestr('6. Copia de Terminos de Referencia.pdf', pdf_file.getvalue())
-
-                zip_io.seek(0)
+            clave = clave_paquete(huella_tdr(pdf_file), estado['huella_firma'][1], campos_paquete, fecha_actual)
+            if clave not in cache_paquetes:
+                # Reutilizar la consulta a SUNAT hecha al ingresar el DNI
+                form_data = st.session_state.form_data
+                datos_sunat = None
+                if form_data.get('dni') == dni and form_data.get('nombres'):
+                    datos_sunat = DatosSunat(form_data['nombres'], form_data['ruc'])
+
+                # SUNAT, TDR y firma en paralelo; luego plantillas y ZIP
+                cliente_sunat = obtener_cliente_sunat(st.secrets["APISNET"]["key"])
+                try:
+                    with turno_etapa('documentos'), st.spinner("Generando cotización..."):
+                        paquete = generar_paquete(
+                            pdf_file,
+                            firma_procesada,
+                            {**campos_paquete, 'fecha': fecha_formateada, 'year': fecha_actual.year, 'mes': mes_actual},
+                            consultar_dni=cliente_sunat.consultar,
+                            datos_sunat=datos_sunat,
+                        )
+                except ErrorAdmision as e:
+                    st.error(f"{e}. Intenta de nuevo en unos momentos.")
+                except ErrorEtapa as e:
+                    if isinstance(e.causa, DniNoEncontrado):
+                        st.error("No se pudo obtener datos de SUNAT. Verifica el DNI ingresado.")
+                    else:
+                        st.error(f"No se pudo generar la cotización. {e}")
+                else:
+                    # Única copia del ZIP: la que se guarda y se descarga
+                    with paquete.archivo:
+                        cache_paquetes.guardar(clave, paquete.archivo.read())
+                    st.caption(
+                        f"Paquete de {len(paquete.entradas)} archivos: "
+                        f"{paquete.tamano / 1024:,.0f} KB en {paquete.duracion * 1000:.0f} ms"
+                    )
+
+            if clave in cache_paquetes:
+                st.session_state['clave_paquete'] = clave
                 st.success("¡Cotización generada correctamente!")
 
-                # Botón para descargar el ZIP
-                st.download_button(
-                    label="Descargar Todos los Archivos Generados (ZIP)",
-                    data=zip_io.getvalue(),
-                    file_name="cotizacion.zip",
-                    mime="application/zip",
-                )
-                
+    # Botón para descargar el ZIP: se sirve desde el cache en cada rerun
+    # mientras el formulario no cambie
+    clave_generada = st.session_state.get('clave_paquete')
+    if clave_generada and pdf_file and firma_cargada:
+        zip_bytes = cache_paquetes.obtener(clave_generada)
+        if zip_bytes is not None and clave_generada == clave_paquete(
+            huella_tdr(pdf_file), estado['huella_firma'][1], campos_paquete, fecha_actual
+        ):
+            st.download_button(
+                label="Descargar Todos los Archivos Generados (ZIP)",
+                data=zip_bytes,
+                file_name="cotizacion.zip",
+                mime="application/zip",
+            )
+
+def es_admin():
+    token = st.query_params.get('admin', '')
+    return bool(TOKEN_ADMIN) and hmac.compare_digest(token.encode('utf-8'), TOKEN_ADMIN.encode('utf-8'))
+
+def mostrar_panel_metricas():
+    """
+    Panel de depuración en la barra lateral: p50/p95 por etapa, aciertos de
+    cache y estado de las colas del proceso.
+    """
+    with st.sidebar:
+        st.header("Métricas del proceso")
+        filas = resumen_etapas()
+        if filas:
+            st.dataframe(filas, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Todavía no hay llamadas registradas.")
+        st.subheader("Colas")
+        st.dataframe(
+            [{'etapa': nombre, **valores} for nombre, valores in estado_colas().items()],
+            hide_index=True,
+            use_container_width=True,
+        )
+        st.download_button(
+            "Descargar en formato Prometheus",
+            exportar_prometheus(),
+            file_name="metricas.prom",
+            mime="text/plain",
+        )
+
+def main():
+    st.set_page_config(
+        page_title="Genera tu Cotización",
+        page_icon="🎣",
+        layout="wide"
+    )
+    # Inicializar variables de estado para la ubicación
+    if 'zoom' not in st.session_state:
+        st.session_state['zoom'] = ZOOM_INICIAL
+    if 'lat' not in st.session_state:
+        st.session_state['lat'] = None
+    if 'lon' not in st.session_state:
+        st.session_state['lon'] = None
+    if 'direccion' not in st.session_state:
+        st.session_state['direccion'] = ''
+
+    # Sección de carga de TDR. Cambiar el TDR vuelve a ejecutar toda la
+    # página: la oferta sugerida y el paquete dependen de él
+    st.header("Sube tu TDR (PDF)")
+    st.file_uploader("Selecciona tu archivo PDF", type=["pdf"], key='pdf_tdr')
+
+    # Inicializar variables de estado si no existen
+    if 'form_data' not in st.session_state:
+        st.session_state.form_data = {
+            'dni': '',
+            'nombres': '',
+            'ruc': '',
+            'telefono': '',
+            'correo': '',
+            'direccion': '',
+            'banco': '',
+            'cuenta': '',
+            'cci': '',
+            'oferta': 0.0
+        }
+
+    # Cada sección es un fragmento: sus widgets sólo vuelven a ejecutar la
+    # propia sección y comparten sus resultados por st.session_state
+    seccion_firma()
+    seccion_datos_personales()
+    seccion_contacto()
+    seccion_direccion()
+    seccion_bancaria()
+    seccion_oferta()
+    seccion_generacion()
+
     st.markdown("""
         <h3 style='text-align: center; margin-bottom: 2rem;'>
             Descarga ahora el generador de constancias RNP, RUC, RNSSC
@@ -739,16 +892,35 @@ def main():
         
         st.info("🔒 Aplicación verificada y segura")
         
-        file_url = "https://drive.usercontent.google.com/download?id=1084eOd4CSqMQ323U1-walYGELyvo6yei&export=download&confirm=t&uuid=5acc3199-ccbb-4fe3-86fd-62de9bddfca7"
-        st.download_button(
-            label="📥 Descargar Generador de Constancias",
-            data=requests.get(file_url).content,
-            file_name="constancia.exe",
-            mime="application/x-msdownload",
-            use_container_width=True,
-        )
+        # Se descarga una sola vez por proceso a la carpeta de estáticos y el
+        # navegador la pide directamente, sin pasar los bytes por cada rerun;
+        # mientras tanto se enlaza al origen
+        constancia = obtener_recurso("constancia.exe", URL_CONSTANCIA, DIR_ESTATICOS)
+        if constancia.disponible():
+            # Streamlit sirve los .exe como text/plain: el atributo download
+            # (mismo origen) hace que el navegador lo guarde
+            st.markdown(
+                '<a href="app/static/constancia.exe" download="constancia.exe" '
+                'style="display:block;text-align:center;padding:0.5rem;border:1px solid #ccc;'
+                'border-radius:0.5rem;text-decoration:none;">'
+                '📥 Descargar Generador de Constancias</a>',
+                unsafe_allow_html=True,
+            )
+        else:
+            st.link_button(
+                "📥 Descargar Generador de Constancias",
+                URL_CONSTANCIA,
+                use_container_width=True,
+            )
         
     crear_donation_footer(base_dir)
+
+    if es_admin():
+        mostrar_panel_metricas()
+
+    # Con la página ya pintada, cargar en segundo plano lo que falta
+    precalentar()
+    iniciar_exportacion()
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1,59 @@
+# arranque.py
+"""
+Precalentamiento de dependencias pesadas.
+
+``app.py`` importa rembg, python-docx, pdfplumber, folium, geopy y los
+componentes de Streamlit recién en la función que los usa, de modo que un
+proceso nuevo pinta la página sin pagar por funciones que quizá nadie use.
+Después del primer renderizado, ``precalentar`` importa esos módulos en un
+hilo en segundo plano para que la primera acción del usuario no tenga que
+esperarlos. Se desactiva con ``COTIZACION_PRECALENTAR=0``.
+"""
+import importlib
+import os
+import threading
+
+PRECALENTAR = os.environ.get('COTIZACION_PRECALENTAR', '1') != '0'
+
+# Módulos en el orden en que suele necesitarlos el usuario
+MODULOS_DIFERIDOS = (
+    'folium',
+    'streamlit_folium',
+    'geocodificacion',
+    'tdr',
+    'firma',
+    'streamlit_image_comparison',
+    'generacion',
+    'rembg',
+)
+
+_hilo = None
+_lock = threading.Lock()
+
+
+def _importar(modulos):
+    for nombre in modulos:
+        try:
+            importlib.import_module(nombre)
+        except Exception:
+            # Un módulo que no carga no debe impedir precalentar el resto;
+            # el error se verá cuando la función que lo usa lo importe
+            continue
+
+
+def precalentar(modulos=MODULOS_DIFERIDOS):
+    """
+    Importa ``modulos`` en segundo plano, una sola vez por proceso.
+
+    Returns:
+        threading.Thread: Hilo del precalentamiento, o ``None`` si está
+        desactivado
+    """
+    global _hilo
+    if not PRECALENTAR:
+        return None
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_importar, args=(modulos,), name='precalentar', daemon=True)
+            _hilo.start()
+        return _hilo
@@ -0,0 +1,19 @@
+# bancos.py
+"""Bancos admitidos y cálculo del CCI a partir del número de cuenta."""
+
+BANCOS = ["BCP", "Interbank", "Scotiabank", "Banco de la Nación", "BanBif", "Otros"]
+
+
+def generar_cci(banco, cuenta):
+    if not banco or not cuenta or banco == "Otros":
+        return ""
+
+    cuenta_limpia = cuenta.replace("-", "")
+    cci_map = {
+        "BCP": "002" + cuenta_limpia + "13",
+        "Interbank": "003" + cuenta_limpia + "43",
+        "Scotiabank": "00936020" + cuenta_limpia + "95",
+        "Banco de la Nación": "0187810" + cuenta_limpia + "55",
+        "BanBif": "0386501" + cuenta_limpia + "83"
+    }
+    return cci_map.get(banco, "")
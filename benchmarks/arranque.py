@@ -0,0 +1,89 @@
+# benchmarks/arranque.py
+"""
+Mide el arranque de la aplicación.
+
+Cada medición corre en un intérprete nuevo, como un proceso de Streamlit
+recién iniciado:
+
+- importación: tiempo de ``import app`` (incluye Streamlit)
+- primer renderizado: tiempo de la primera ejecución completa del script
+  con ``streamlit.testing.v1.AppTest``, sin precalentamiento
+
+Con ``--max-importacion`` y ``--max-render`` termina con código 1 si la
+mediana supera el presupuesto indicado (en segundos).
+
+Uso:
+    python benchmarks/arranque.py [--repeticiones 5] [--max-importacion 1.0] [--max-render 5.0]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT_IMPORTACION = """
+import sys, time
+sys.path.insert(0, {raiz!r})
+inicio = time.perf_counter()
+import app  # noqa: F401
+print(time.perf_counter() - inicio)
+"""
+
+SCRIPT_RENDER = """
+import os, sys, time
+sys.path.insert(0, {raiz!r})
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(os.path.join({raiz!r}, 'app.py'), default_timeout=300)
+at.secrets['APISNET'] = {{'key': 'benchmark'}}
+inicio = time.perf_counter()
+at.run()
+duracion = time.perf_counter() - inicio
+print(duracion if not at.exception else -1, flush=True)
+# Los hilos de Streamlit no terminan solos
+os._exit(0)
+"""
+
+
+def medir(script, repeticiones):
+    entorno = {**os.environ, 'COTIZACION_PRECALENTAR': '0'}
+    tiempos = []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, '-c', script.format(raiz=RAIZ)],
+            capture_output=True, text=True, env=entorno, cwd=RAIZ, check=True,
+        )
+        tiempo = float(salida.stdout.strip().splitlines()[-1])
+        if tiempo < 0:
+            raise RuntimeError('El script de la aplicación lanzó una excepción')
+        tiempos.append(tiempo)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--max-importacion', type=float, help='Presupuesto en segundos para importar app.py')
+    parser.add_argument('--max-render', type=float, help='Presupuesto en segundos para el primer renderizado')
+    args = parser.parse_args()
+
+    excedido = False
+    for nombre, script, presupuesto in (
+        ('importación', SCRIPT_IMPORTACION, args.max_importacion),
+        ('primer renderizado', SCRIPT_RENDER, args.max_render),
+    ):
+        tiempos = medir(script, args.repeticiones)
+        mediana = statistics.median(tiempos)
+        linea = f"{nombre:<20} mediana {mediana:6.3f} s   mín {min(tiempos):6.3f} s   máx {max(tiempos):6.3f} s"
+        if presupuesto is not None:
+            ok = mediana <= presupuesto
+            excedido |= not ok
+            linea += f"   presupuesto {presupuesto:.3f} s {'OK' if ok else 'EXCEDIDO'}"
+        print(linea)
+
+    sys.exit(1 if excedido else 0)
+
+
+if __name__ == '__main__':
+    main()
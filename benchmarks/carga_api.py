@@ -0,0 +1,156 @@
+# benchmarks/carga_api.py
+"""
+Prueba de carga de ``api.py``.
+
+Lanza ``--clientes`` clientes concurrentes, cada uno con su conexión
+keep-alive, que envían ``--solicitudes`` solicitudes en total a
+``/cotizaciones`` (o a ``/tdr/extract`` con ``--extraer``). Reporta
+latencias p50/p95/máx de las respuestas 200, el rendimiento y cuántas
+solicitudes se rechazaron con 503.
+
+Cada solicitud usa un DNI distinto para que no la resuelva el cache de
+SUNAT; con ``servidores_stub.py`` se prueba sin salir de la máquina.
+
+Uso:
+    python benchmarks/carga_api.py TDR.pdf FIRMA.png [--url http://127.0.0.1:8000] [--clientes 8] [--solicitudes 100]
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlparse
+
+
+def cuerpo_multipart(partes):
+    """
+    Arma un cuerpo ``multipart/form-data``.
+
+    Args:
+        partes: Tuplas (nombre, nombre de archivo o None, tipo, bytes)
+
+    Returns:
+        tuple: (Content-Type, bytes del cuerpo)
+    """
+    limite = uuid.uuid4().hex
+    bloques = []
+    for nombre, archivo, tipo, contenido in partes:
+        disposicion = f'form-data; name="{nombre}"'
+        if archivo:
+            disposicion += f'; filename="{archivo}"'
+        bloques.append(
+            f'--{limite}\r\nContent-Disposition: {disposicion}\r\nContent-Type: {tipo}\r\n\r\n'.encode()
+            + contenido + b'\r\n'
+        )
+    bloques.append(f'--{limite}--\r\n'.encode())
+    return f'multipart/form-data; boundary={limite}', b''.join(bloques)
+
+
+def solicitud_cotizacion(tdr, firma, indice):
+    datos = {
+        'dni': f'{10000000 + indice:08d}',
+        'telefono': '987654321',
+        'correo': 'proveedor@example.com',
+        'lat': -12.0464 + indice * 1e-3,
+        'lon': -77.0428,
+        'banco': 'BCP',
+        'cuenta': '19112345678012',
+        'oferta': 1500,
+    }
+    return cuerpo_multipart([
+        ('tdr', 'tdr.pdf', 'application/pdf', tdr),
+        ('firma', 'firma.png', 'image/png', firma),
+        ('datos', None, 'application/json', json.dumps(datos).encode()),
+    ])
+
+
+def cliente(url, ruta, generar, indices, resultados, lock):
+    conexion = None
+    for indice in indices:
+        if conexion is None:
+            conexion = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=300)
+        tipo, cuerpo = generar(indice)
+        inicio = time.perf_counter()
+        try:
+            conexion.request('POST', ruta, body=cuerpo, headers={'Content-Type': tipo})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            estado = respuesta.status
+            if respuesta.will_close:
+                conexion.close()
+                conexion = None
+        except (OSError, http.client.HTTPException):
+            estado = 'error'
+            conexion.close()
+            conexion = None
+        with lock:
+            resultados.append((estado, time.perf_counter() - inicio))
+    if conexion is not None:
+        conexion.close()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tdr', help='PDF del TDR')
+    parser.add_argument('firma', help='Imagen de la firma')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--solicitudes', type=int, default=100)
+    parser.add_argument('--extraer', action='store_true', help='Mide /tdr/extract en lugar de /cotizaciones')
+    args = parser.parse_args()
+
+    with open(args.tdr, 'rb') as f:
+        tdr = f.read()
+    with open(args.firma, 'rb') as f:
+        firma = f.read()
+
+    if args.extraer:
+        ruta = '/tdr/extract'
+        def generar(indice):
+            return 'application/pdf', tdr
+    else:
+        ruta = '/cotizaciones'
+        def generar(indice):
+            return solicitud_cotizacion(tdr, firma, indice)
+
+    url = urlparse(args.url)
+    resultados = []
+    lock = threading.Lock()
+    hilos = [
+        threading.Thread(
+            target=cliente,
+            args=(url, ruta, generar, range(i, args.solicitudes, args.clientes), resultados, lock),
+        )
+        for i in range(args.clientes)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    estados = Counter(estado for estado, _ in resultados)
+    exitosas = [duracion for estado, duracion in resultados if estado == 200]
+    print(f"{len(resultados)} solicitudes a {ruta} en {transcurrido:.1f} s con {args.clientes} clientes")
+    print("Respuestas: " + ", ".join(f"{estado}: {cantidad}" for estado, cantidad in sorted(estados.items(), key=str)))
+    if exitosas:
+        print(
+            f"Latencia 200: p50 {statistics.median(exitosas) * 1000:.0f} ms   "
+            f"p95 {percentil(exitosas, 95) * 1000:.0f} ms   máx {max(exitosas) * 1000:.0f} ms"
+        )
+        print(f"Rendimiento: {len(exitosas) / transcurrido:.2f} solicitudes/s")
+    sys.exit(0 if exitosas else 1)
+
+
+if __name__ == '__main__':
+    main()
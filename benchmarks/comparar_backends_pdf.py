@@ -0,0 +1,100 @@
+# benchmarks/comparar_backends_pdf.py
+"""
+Compara los backends de texto de PDF sobre un corpus de TDR.
+
+Para cada PDF de la carpeta indicada mide el tiempo de extracción con cada
+backend y verifica que todos obtengan el mismo servicio, días y forma de
+pago que pdfplumber (el backend de referencia). Sin carpeta usa el corpus
+sintético de ``generar_corpus_tdr.py`` (se genera si no existe) y además
+compara cada backend con los campos esperados de cada PDF. Termina con
+código 1 si algún campo difiere.
+
+Uso:
+    python benchmarks/comparar_backends_pdf.py [carpeta_con_tdrs/] [--repeticiones 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generar_corpus_tdr import CARPETA_CORPUS, ESPERADOS, generar  # noqa: E402
+from tdr import BACKENDS, BACKEND_RESPALDO, analizar_contenido  # noqa: E402
+
+CAMPOS_COMPARADOS = ('servicio', 'dias', 'forma_pago')
+
+
+def medir(contenido, backend, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        encontrados, _, leidas = analizar_contenido(contenido, backend)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return encontrados, len(leidas), mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('carpeta', nargs='?',
+                        help="Carpeta con los PDF de TDR (por defecto el corpus sintético)")
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help="Ejecuciones por PDF y backend; se reporta la mejor")
+    args = parser.parse_args()
+
+    esperados = {}
+    if args.carpeta is None:
+        args.carpeta = CARPETA_CORPUS
+        esperados = ESPERADOS
+        if not os.path.isdir(CARPETA_CORPUS):
+            generar(CARPETA_CORPUS)
+
+    archivos = sorted(
+        os.path.join(args.carpeta, nombre)
+        for nombre in os.listdir(args.carpeta)
+        if nombre.lower().endswith('.pdf')
+    )
+    if not archivos:
+        sys.exit(f"No hay archivos PDF en {args.carpeta}")
+
+    backends = [BACKEND_RESPALDO] + [b for b in BACKENDS if b != BACKEND_RESPALDO]
+    totales = dict.fromkeys(backends, 0.0)
+    diferencias = 0
+
+    print(f"{'archivo':40} {'backend':12} {'págs':>5} {'segundos':>9}")
+    for ruta in archivos:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+
+        referencia = None
+        for backend in backends:
+            encontrados, paginas, duracion = medir(contenido, backend, args.repeticiones)
+            totales[backend] += duracion
+            print(f"{os.path.basename(ruta)[:40]:40} {backend:12} {paginas:5d} {duracion:9.3f}")
+
+            for campo, valor in esperados.get(os.path.basename(ruta), {}).items():
+                if encontrados.get(campo) != valor:
+                    diferencias += 1
+                    print(f"  DIFERENCIA en {campo}: esperado={valor!r} {backend}={encontrados.get(campo)!r}")
+
+            if referencia is None:
+                referencia = encontrados
+                continue
+            for campo in CAMPOS_COMPARADOS:
+                if encontrados.get(campo) != referencia.get(campo):
+                    diferencias += 1
+                    print(f"  DIFERENCIA en {campo}: "
+                          f"{BACKEND_RESPALDO}={referencia.get(campo)!r} "
+                          f"{backend}={encontrados.get(campo)!r}")
+
+    print()
+    for backend in backends:
+        aceleracion = totales[BACKEND_RESPALDO] / totales[backend] if totales[backend] else 0
+        print(f"{backend:12} total {totales[backend]:8.3f} s  (x{aceleracion:.1f})")
+    print(f"{len(archivos)} PDF, {diferencias} diferencias")
+    sys.exit(1 if diferencias else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# benchmarks/generar_corpus_tdr.py
+"""
+Genera un corpus sintético de TDR para los benchmarks de extracción.
+
+Los PDF se escriben a mano (texto Helvetica, sin dependencias) e imitan la
+estructura de los TDR reales: secciones numeradas, un índice con secciones
+vacías, armadas en dígitos o en letras y campos al inicio o al final de
+documentos extensos. Cada PDF lleva en ``ESPERADOS`` los campos que debe
+encontrar cualquier backend, para detectar regresiones además de medir.
+
+Uso:
+    python benchmarks/generar_corpus_tdr.py [carpeta]   (por defecto benchmarks/corpus_tdr)
+"""
+import os
+import sys
+
+CARPETA_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus_tdr')
+
+LINEAS_POR_PAGINA = 48
+RELLENO = (
+    "El contratista ejecutará las actividades conforme a las normas vigentes y a las "
+    "indicaciones del área usuaria, cautelando la calidad del servicio."
+)
+
+# Campos que deben encontrarse en cada PDF del corpus
+ESPERADOS = {
+    'tdr_corto.pdf': {
+        'servicio': 'Contratar el servicio de apoyo administrativo para la Oficina de Abastecimiento',
+        'dias': '90',
+        'forma_pago': 'TRES (03) ARMADAS,',
+    },
+    'tdr_armada_en_letras.pdf': {
+        'servicio': 'Contratar el servicio de digitación de expedientes del archivo central',
+        'dias': '60',
+        'forma_pago': 'UNA ARMADA,',
+    },
+    'tdr_con_indice.pdf': {
+        'servicio': 'Contratar el servicio de mantenimiento de equipos de cómputo',
+        'dias': '45',
+        'forma_pago': 'DOS (02) ARMADAS,',
+        'entregables': (
+            'Primer entregable: informe de actividades a los 30 días calendario. '
+            'Segundo entregable: informe final al término del servicio.'
+        ),
+        'penalidades': (
+            'Si el contratista incurre en retraso injustificado se aplicará una penalidad '
+            'por cada día de atraso conforme a la normativa de contrataciones.'
+        ),
+    },
+    'tdr_extenso.pdf': {
+        'servicio': 'Contratar el servicio de consultoría para el inventario de bienes muebles',
+        'dias': '120',
+        'forma_pago': 'CUATRO (04) ARMADAS,',
+    },
+}
+
+
+def _secciones(servicio, plazo, pago):
+    return [
+        "TÉRMINOS DE REFERENCIA",
+        "1. ÁREA USUARIA",
+        "Oficina General de Administración",
+        "2. OBJETO DE LA CONTRATACION",
+        servicio,
+        "3. FINALIDAD PUBLICA",
+        "Contribuir al cumplimiento de los objetivos institucionales.",
+        "4. PLAZO",
+        plazo,
+        "contados desde el día siguiente de notificada la orden de servicio.",
+        "5. LUGAR DE PRESTACIÓN",
+        "El lugar de prestación del servicio es la sede central, Av. Arequipa 1234, Lima.",
+        "6. ENTREGABLES",
+        "Primer entregable: informe de actividades a los 30 días calendario.",
+        "Segundo entregable: informe final al término del servicio.",
+        "7. FORMA DE PAGO",
+        pago,
+        "luego de la emisión de la conformidad del servicio, previa presentación del",
+        "comprobante de pago.",
+        "8. PENALIDADES",
+        "Si el contratista incurre en retraso injustificado se aplicará una penalidad",
+        "por cada día de atraso conforme a la normativa de contrataciones.",
+        "9. REQUISITOS DEL PROVEEDOR",
+        "Persona natural con RUC activo y habido, sin impedimento para contratar",
+        "con el Estado. Experiencia mínima de un año en servicios similares.",
+        "10. CONFIDENCIALIDAD",
+        "El contratista guardará reserva de la información a la que tenga acceso.",
+    ]
+
+
+def _indice():
+    # Sólo encabezados de secciones opcionales: sus reglas descartan las
+    # capturas vacías del índice y siguen buscando en el cuerpo
+    return [
+        "ÍNDICE",
+        "5. LUGAR DE PRESTACIÓN",
+        "6. ENTREGABLES",
+        "8. PENALIDADES",
+        "9. REQUISITOS DEL PROVEEDOR",
+    ]
+
+
+def _relleno(paginas):
+    return [RELLENO[:90], RELLENO[90:]] * (LINEAS_POR_PAGINA // 2 * paginas)
+
+
+def _paginar(lineas):
+    return [lineas[i:i + LINEAS_POR_PAGINA] for i in range(0, len(lineas), LINEAS_POR_PAGINA)]
+
+
+def documentos():
+    """
+    Returns:
+        dict: Nombre del archivo -> lista de páginas (cada una, lista de líneas)
+    """
+    esperado = ESPERADOS['tdr_corto.pdf']
+    corto = _secciones(
+        esperado['servicio'],
+        "El plazo de ejecución del servicio es de hasta 90 días calendario,",
+        "El pago se realizará en TRES (03) ARMADAS,",
+    )
+    esperado = ESPERADOS['tdr_armada_en_letras.pdf']
+    en_letras = _secciones(
+        esperado['servicio'],
+        "El plazo de ejecución será de sesenta (60) días calendario,",
+        "El pago se realizará en UNA ARMADA,",
+    )
+    esperado = ESPERADOS['tdr_con_indice.pdf']
+    con_indice = _indice() + _secciones(
+        esperado['servicio'],
+        "El plazo de ejecución del servicio es de hasta 45 días calendario,",
+        "El pago se realizará en DOS (02) ARMADAS,",
+    )
+    esperado = ESPERADOS['tdr_extenso.pdf']
+    # Campos principales al final de un documento de 120 páginas: obliga a
+    # leerlo completo
+    extenso = _relleno(118) + _secciones(
+        esperado['servicio'],
+        "El plazo de ejecución del servicio es de hasta 120 días calendario,",
+        "El pago se realizará en CUATRO (04) ARMADAS,",
+    )
+    return {
+        'tdr_corto.pdf': _paginar(corto + _relleno(3)),
+        'tdr_armada_en_letras.pdf': _paginar(en_letras + _relleno(2)),
+        'tdr_con_indice.pdf': _paginar(con_indice + _relleno(6)),
+        'tdr_extenso.pdf': _paginar(extenso),
+    }
+
+
+def _escapar(linea):
+    return linea.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def escribir_pdf(ruta, paginas):
+    """
+    Escribe un PDF A4 con una línea de texto Helvetica por elemento.
+
+    Args:
+        ruta: Archivo de salida
+        paginas: Lista de páginas, cada una una lista de líneas
+    """
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Páginas, se completa al final
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    hijos = []
+    for lineas in paginas:
+        texto = ''.join(f'({_escapar(linea)}) Tj T*\n' for linea in lineas)
+        contenido = f'BT /F1 10 Tf 14 TL 50 800 Td\n{texto}ET'.encode('cp1252')
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(contenido) + contenido + b'\nendstream')
+        objetos.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objetos))
+        )
+        hijos.append(len(objetos))
+    objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % hijo for hijo in hijos), len(hijos)
+    )
+
+    salida = bytearray(b'%PDF-1.4\n')
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b'%d 0 obj\n' % numero + objeto + b'\nendobj\n'
+    inicio_xref = len(salida)
+    salida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    salida += b''.join(b'%010d 00000 n \n' % posicion for posicion in posiciones)
+    salida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objetos) + 1, inicio_xref
+    )
+    with open(ruta, 'wb') as f:
+        f.write(salida)
+
+
+def generar(carpeta=CARPETA_CORPUS):
+    """
+    Escribe el corpus en ``carpeta``.
+
+    Returns:
+        list: Rutas de los PDF generados
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = []
+    for nombre, paginas in documentos().items():
+        ruta = os.path.join(carpeta, nombre)
+        escribir_pdf(ruta, paginas)
+        rutas.append(ruta)
+    return rutas
+
+
+def main():
+    carpeta = sys.argv[1] if len(sys.argv) > 1 else CARPETA_CORPUS
+    for ruta in generar(carpeta):
+        print(ruta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/servidores_stub.py
+"""
+Servidores locales que imitan a SUNAT (apis.net.pe) y a Nominatim.
+
+Sirven para probar y medir ``api.py`` o la aplicación sin depender de los
+servicios reales ni de sus límites de uso. Cada respuesta puede demorarse
+``--latencia`` segundos para simular la red.
+
+- SUNAT: ``GET /?numero=DNI&token=...`` responde nombres y RUC de prueba;
+  el DNI ``00000000`` responde 404.
+- Nominatim: ``GET /reverse?lat=..&lon=..&format=json`` responde una
+  dirección construida con las coordenadas.
+
+Al iniciar imprime las variables de entorno que apuntan a los stubs.
+
+Uso:
+    python benchmarks/servidores_stub.py [--puerto-sunat 8101] [--puerto-nominatim 8102] [--latencia 0.05]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DNI_INEXISTENTE = '00000000'
+
+
+class ManejadorStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latencia = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parametros = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+        if self.latencia:
+            time.sleep(self.latencia)
+        estado, datos = self.responder(url.path, parametros)
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def responder(self, ruta, parametros):
+        raise NotImplementedError
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class StubSunat(ManejadorStub):
+    def responder(self, ruta, parametros):
+        dni = parametros.get('numero', '')
+        if not dni or dni == DNI_INEXISTENTE:
+            return 404, {'message': 'not found'}
+        return 200, {
+            'nombres': 'PRUEBA',
+            'apellidoPaterno': 'CARGA',
+            'apellidoMaterno': 'LOCAL',
+            'numeroDocumento': dni,
+            'ruc': f'10{dni}1',
+        }
+
+
+class StubNominatim(ManejadorStub):
+    def responder(self, ruta, parametros):
+        if ruta != '/reverse':
+            return 404, {'error': 'Ruta no encontrada'}
+        lat = float(parametros.get('lat', 0))
+        lon = float(parametros.get('lon', 0))
+        return 200, {
+            'lat': str(lat),
+            'lon': str(lon),
+            'display_name': f'Calle de prueba {abs(lat):.4f}, {abs(lon):.4f}, Lima, Perú',
+            'address': {'city': 'Lima', 'country': 'Perú'},
+        }
+
+
+def iniciar(manejador, puerto, latencia=0.0, host='127.0.0.1'):
+    """
+    Inicia un stub en un hilo en segundo plano.
+
+    Returns:
+        ThreadingHTTPServer: Servidor iniciado (``server_address`` tiene el
+        puerto asignado si ``puerto`` es 0)
+    """
+    clase = type(manejador.__name__, (manejador,), {'latencia': latencia})
+    servidor = ThreadingHTTPServer((host, puerto), clase)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto-sunat', type=int, default=8101)
+    parser.add_argument('--puerto-nominatim', type=int, default=8102)
+    parser.add_argument('--latencia', type=float, default=0.05, help='Segundos de demora por respuesta')
+    args = parser.parse_args()
+
+    sunat = iniciar(StubSunat, args.puerto_sunat, args.latencia, args.host)
+    nominatim = iniciar(StubNominatim, args.puerto_nominatim, args.latencia, args.host)
+    print(f"export COTIZACION_SUNAT_URL=http://{args.host}:{sunat.server_address[1]}/")
+    print(f"export COTIZACION_NOMINATIM_URL=http://{args.host}:{nominatim.server_address[1]}")
+    print("export COTIZACION_NOMINATIM_RPS=1000")
+    print("export COTIZACION_SUNAT_TOKEN=stub", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
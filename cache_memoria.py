@@ -0,0 +1,74 @@
+# cache_memoria.py
+"""Cache LRU en memoria, acotado por número de entradas (y opcionalmente bytes) y seguro entre hilos."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Diccionario acotado que descarta la entrada usada hace más tiempo.
+
+    Args:
+        max_entradas: Número máximo de entradas que se conservan
+        ttl: Segundos de vida de cada entrada (``None`` para no expirar)
+        max_bytes: Suma máxima de ``len(valor)`` de las entradas (``None``
+            para no acotar). La entrada más reciente se conserva aunque
+            por sí sola lo supere
+    """
+
+    def __init__(self, max_entradas, ttl=None, max_bytes=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tamano(self, valor):
+        return len(valor) if self.max_bytes is not None else 0
+
+    def _descartar(self, clave=None):
+        # Se llama con el candado tomado; sin clave descarta la más antigua
+        if clave is None:
+            _, (_, valor) = self._datos.popitem(last=False)
+        else:
+            _, valor = self._datos.pop(clave)
+        self.bytes -= self._tamano(valor)
+
+    def _vigente(self, clave):
+        # Se llama con el candado tomado
+        if clave not in self._datos:
+            return False
+        expira, _ = self._datos[clave]
+        if expira is not None and expira < time.monotonic():
+            self._descartar(clave)
+            return False
+        return True
+
+    def obtener(self, clave, por_defecto=None):
+        with self._lock:
+            if not self._vigente(clave):
+                return por_defecto
+            self._datos.move_to_end(clave)
+            return self._datos[clave][1]
+
+    def guardar(self, clave, valor):
+        expira = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if clave in self._datos:
+                self._descartar(clave)
+            self._datos[clave] = (expira, valor)
+            self.bytes += self._tamano(valor)
+            while len(self._datos) > self.max_entradas or (
+                self.max_bytes is not None and self.bytes > self.max_bytes and len(self._datos) > 1
+            ):
+                self._descartar()
+
+    def __contains__(self, clave):
+        with self._lock:
+            return self._vigente(clave)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
@@ -0,0 +1,208 @@
+# cache_tdr.py
+"""
+Cache persistente de TDR procesados, compartido entre sesiones y procesos.
+
+Muchos proveedores suben exactamente el mismo TDR para una convocatoria; el
+resultado de la extracción se guarda en SQLite indexado por el SHA-256 de
+los bytes del PDF, así que sólo el primero paga el costo de leer el PDF.
+La clave incluye además una versión (formato, catálogo de reglas y backend):
+al cambiar cualquiera de ellos las entradas anteriores dejan de usarse y se
+eliminan por antigüedad. Una entrada que no se puede decodificar se elimina
+y cuenta como fallo.
+
+La base usa el modo WAL y un ``busy_timeout`` para que varios procesos de
+Streamlit puedan leer y escribir a la vez. Las entradas se eliminan por
+antigüedad y, si el tamaño total supera el límite, por último acceso.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+RUTA_CACHE_TDR = os.environ.get(
+    'COTIZACION_CACHE_TDR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'tdr.sqlite3'),
+)
+MAX_BYTES_CACHE_TDR = int(os.environ.get('COTIZACION_CACHE_TDR_MAX_MB', '200')) * 1024 * 1024
+MAX_DIAS_CACHE_TDR = float(os.environ.get('COTIZACION_CACHE_TDR_MAX_DIAS', '30'))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tdr (
+    sha256 TEXT PRIMARY KEY,
+    campos TEXT NOT NULL,
+    texto BLOB NOT NULL,
+    tamano INTEGER NOT NULL,
+    creado REAL NOT NULL,
+    accedido REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tdr_accedido ON tdr (accedido);
+CREATE INDEX IF NOT EXISTS tdr_creado ON tdr (creado);
+"""
+
+
+def _clave(sha256, version):
+    return f'{sha256}:{version}' if version else sha256
+
+
+class CacheTDR:
+    """
+    Almacén SQLite de campos y texto normalizado de TDR.
+
+    Args:
+        ruta: Archivo de la base de datos
+        max_bytes: Tamaño máximo aproximado de los datos guardados
+        max_edad: Segundos que se conserva una entrada desde su creación
+    """
+
+    def __init__(self, ruta=RUTA_CACHE_TDR, max_bytes=MAX_BYTES_CACHE_TDR,
+                 max_edad=MAX_DIAS_CACHE_TDR * 86400):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.max_edad = max_edad
+        self.aciertos = 0
+        self.fallos = 0
+        self._local = threading.local()
+        self._contadores_lock = threading.Lock()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as con:
+            con.executescript(_ESQUEMA)
+
+    def _conexion(self):
+        # sqlite3 no permite compartir conexiones entre hilos
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+        return con
+
+    def _contar(self, acierto):
+        with self._contadores_lock:
+            if acierto:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+
+    def obtener(self, sha256, version=''):
+        """
+        Devuelve los datos guardados para un PDF o ``None``.
+
+        Args:
+            sha256: Hash del contenido del PDF
+            version: Versión de la extracción con que se guardó
+
+        Returns:
+            dict: Campos del ``TDRDocument`` (incluido ``texto``) o ``None``
+        """
+        clave = _clave(sha256, version)
+        ahora = time.time()
+        con = self._conexion()
+        fila = con.execute(
+            'SELECT campos, texto FROM tdr WHERE sha256 = ? AND creado >= ?',
+            (clave, ahora - self.max_edad),
+        ).fetchone()
+        if fila is None:
+            self._contar(False)
+            return None
+
+        try:
+            datos = json.loads(fila[0])
+            datos['texto'] = zlib.decompress(fila[1]).decode('utf-8')
+        except (ValueError, TypeError, zlib.error):
+            # Fila truncada o corrupta: se descarta como si no existiera
+            self.eliminar(sha256, version)
+            self._contar(False)
+            return None
+
+        with con:
+            con.execute('UPDATE tdr SET accedido = ? WHERE sha256 = ?', (ahora, clave))
+        self._contar(True)
+        return datos
+
+    def eliminar(self, sha256, version=''):
+        """Elimina la entrada de un PDF, por ejemplo si ya no es válida."""
+        con = self._conexion()
+        with con:
+            con.execute('DELETE FROM tdr WHERE sha256 = ?', (_clave(sha256, version),))
+
+    def guardar(self, sha256, datos, version=''):
+        """
+        Guarda los datos de un PDF y aplica la política de expulsión.
+
+        Args:
+            sha256: Hash del contenido del PDF
+            datos: Campos del ``TDRDocument`` (incluido ``texto``)
+            version: Versión de la extracción que produjo los datos
+        """
+        clave = _clave(sha256, version)
+        datos = dict(datos)
+        texto = zlib.compress(datos.pop('texto').encode('utf-8'))
+        campos = json.dumps(datos, ensure_ascii=False)
+        ahora = time.time()
+        con = self._conexion()
+        with con:
+            con.execute(
+                'INSERT OR REPLACE INTO tdr (sha256, campos, texto, tamano, creado, accedido) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (clave, campos, texto, len(campos) + len(texto), ahora, ahora),
+            )
+            self._purgar(con, ahora)
+
+    def _purgar(self, con, ahora):
+        con.execute('DELETE FROM tdr WHERE creado < ?', (ahora - self.max_edad,))
+        total = con.execute('SELECT COALESCE(SUM(tamano), 0) FROM tdr').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Elimina por último acceso hasta quedar por debajo del límite
+        exceso = total - self.max_bytes
+        liberado = 0
+        victimas = []
+        for sha256, tamano in con.execute('SELECT sha256, tamano FROM tdr ORDER BY accedido'):
+            victimas.append((sha256,))
+            liberado += tamano
+            if liberado >= exceso:
+                break
+        con.executemany('DELETE FROM tdr WHERE sha256 = ?', victimas)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos y fallos de este proceso, entradas y bytes guardados
+        """
+        entradas, total = self._conexion().execute(
+            'SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM tdr'
+        ).fetchone()
+        with self._contadores_lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': entradas,
+                'bytes': total,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_tdr():
+    """
+    Devuelve el cache compartido del proceso, o ``None`` si está desactivado
+    (``COTIZACION_CACHE_TDR`` vacío) o no se pudo abrir la base.
+    """
+    global _cache
+    if not RUTA_CACHE_TDR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = CacheTDR()
+            except (OSError, sqlite3.Error):
+                return None
+        return _cache
@@ -0,0 +1,107 @@
+# empaquetado.py
+"""
+Empaquetado del ZIP descargable.
+
+Los DOCX, PNG y PDF ya vienen comprimidos, así que se guardan sin volver a
+comprimir (``ZIP_STORED``); sólo el resto se comprime con deflate. Cada parte
+se copia directamente desde su buffer de origen, sin duplicarla con
+``getvalue()``, y el ZIP se escribe en un ``SpooledTemporaryFile`` que pasa a
+disco si supera el umbral configurado.
+"""
+import os
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass, field
+
+from metricas import anotar, instrumentar
+
+# Extensiones cuyo contenido ya está comprimido
+EXTENSIONES_COMPRIMIDAS = frozenset({
+    '.docx', '.xlsx', '.pptx', '.zip', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.pdf',
+})
+
+# Tamaño a partir del cual el ZIP en construcción se vuelca a disco
+UMBRAL_SPOOL = int(os.environ.get('COTIZACION_ZIP_UMBRAL_MB', '16')) * 1024 * 1024
+
+TAMANO_BLOQUE = 1024 * 1024
+
+
+@dataclass
+class Paquete:
+    """
+    ZIP generado y métricas del empaquetado.
+
+    Attributes:
+        archivo: ZIP en un ``SpooledTemporaryFile`` posicionado al inicio
+        tamano: Bytes del ZIP
+        duracion: Segundos que tomó el empaquetado
+        entradas: Tuplas (nombre, bytes sin comprimir, método de compresión)
+    """
+    archivo: tempfile.SpooledTemporaryFile
+    tamano: int
+    duracion: float
+    entradas: list = field(default_factory=list)
+
+
+def metodo_compresion(nombre):
+    extension = os.path.splitext(nombre)[1].lower()
+    return zipfile.ZIP_STORED if extension in EXTENSIONES_COMPRIMIDAS else zipfile.ZIP_DEFLATED
+
+
+def _copiar(fuente, destino):
+    """Copia una parte al ZIP sin crear copias intermedias de su contenido."""
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        destino.write(fuente)
+        return len(fuente)
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, 'rb') as archivo:
+            return _copiar(archivo, destino)
+    if hasattr(fuente, 'getbuffer'):
+        # Vista sobre el buffer del BytesIO, sin copiarlo
+        with fuente.getbuffer() as vista:
+            destino.write(vista)
+            return vista.nbytes
+    fuente.seek(0)
+    total = 0
+    while True:
+        bloque = fuente.read(TAMANO_BLOQUE)
+        if not bloque:
+            return total
+        destino.write(bloque)
+        total += len(bloque)
+
+
+@instrumentar('zip')
+def empaquetar(partes, umbral=UMBRAL_SPOOL):
+    """
+    Construye el ZIP con las partes indicadas.
+
+    Args:
+        partes: Iterable de tuplas (nombre en el ZIP, contenido), donde el
+            contenido es bytes, una ruta, un BytesIO o un archivo binario
+        umbral: Bytes a partir de los cuales el ZIP se escribe en disco
+
+    Returns:
+        Paquete: ZIP listo para leerse y sus métricas
+    """
+    inicio = time.perf_counter()
+    archivo = tempfile.SpooledTemporaryFile(max_size=umbral, suffix='.zip')
+    entradas = []
+    with zipfile.ZipFile(archivo, mode='w') as zipf:
+        for nombre, contenido in partes:
+            metodo = metodo_compresion(nombre)
+            info = zipfile.ZipInfo(nombre, date_time=time.localtime()[:6])
+            info.compress_type = metodo
+            with zipf.open(info, mode='w') as destino:
+                entradas.append((nombre, _copiar(contenido, destino), metodo))
+
+    tamano = archivo.tell()
+    archivo.seek(0)
+    anotar(tamano=tamano)
+    return Paquete(
+        archivo=archivo,
+        tamano=tamano,
+        duracion=time.perf_counter() - inicio,
+        entradas=entradas,
+    )
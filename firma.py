@@ -0,0 +1,283 @@
+# firma.py
+"""
+Procesamiento de la imagen de la firma.
+
+La sesión de rembg (el modelo ONNX de segmentación) se crea una sola vez por
+proceso y se comparte entre sesiones de Streamlit con un candado. El
+resultado de cada firma se memoriza por el SHA-256 de la imagen subida y las
+opciones de procesamiento, de modo que los reruns no vuelven a ejecutar la
+inferencia sobre la misma imagen.
+
+La mayoría de firmas son tinta oscura sobre papel blanco: para ellas basta
+un umbral de Otsu calculado con NumPy, mucho más rápido que la red neuronal.
+En modo ``auto`` se revisa si el borde de la imagen es un fondo claro y
+uniforme; si lo es se usa el método clásico y, si no (fotos con fondos
+complejos), rembg.
+
+Antes de procesarla, la imagen se normaliza: se rechazan las que superan un
+presupuesto de píxeles (bombas de descompresión), los JPEG se decodifican en
+modo *draft* a la resolución más baja que alcanza, se corrige la orientación
+EXIF y se reduce a un tamaño de trabajo acotado. El resultado final se
+escala a los píxeles que realmente ocupa la firma en el documento (1.91 cm
+de alto a los DPI configurados) y se guarda como PNG optimizado.
+"""
+import hashlib
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from cache_memoria import CacheLRU
+from metricas import anotar, instrumentar
+from medidas import ALTURA_FIRMA_CM
+
+# u2net (por defecto), o modelos más livianos como u2netp o silueta
+MODELO_REMBG = os.environ.get('COTIZACION_REMBG_MODELO', 'u2net')
+# 'auto', 'clasico' (umbral con NumPy) o 'rembg'
+METODO_FONDO = os.environ.get('COTIZACION_FIRMA_METODO', 'auto')
+MAX_FIRMAS_EN_CACHE = 32
+
+# Resolución con que se incrusta la firma en el documento
+DPI_FIRMA = int(os.environ.get('COTIZACION_FIRMA_DPI', '300'))
+# Imágenes más grandes se rechazan antes de decodificarlas
+MAX_PIXELES_FIRMA = int(float(os.environ.get('COTIZACION_FIRMA_MAX_MEGAPIXELES', '50')) * 1_000_000)
+# Tamaño máximo con el que se procesa la firma (segmentación, umbral)
+PIXELES_TRABAJO = 2_000_000
+
+# Fracción del lado de la imagen que se toma como borde para medir el fondo
+MARGEN_FONDO = 0.05
+# Un fondo es "simple" si su borde es claro y casi uniforme
+BRILLO_MINIMO_FONDO = 150
+DESVIACION_MAXIMA_FONDO = 20
+# Píxeles que se dejan alrededor de la tinta al recortar
+MARGEN_RECORTE = 4
+
+
+class ErrorImagenFirma(Exception):
+    """La imagen de la firma no se puede abrir o es demasiado grande."""
+
+
+_lock_rembg = threading.Lock()
+_procesadas = CacheLRU(MAX_FIRMAS_EN_CACHE)
+_sesiones_rembg = {}
+_sesiones_rembg_lock = threading.Lock()
+
+
+def obtener_sesion_rembg(modelo=MODELO_REMBG):
+    """
+    Sesión de rembg compartida por el proceso para ``modelo``.
+
+    La construcción carga el modelo ONNX, así que se hace bajo un candado
+    para que dos hilos que llegan a la vez no la repitan; una vez creada se
+    devuelve sin tomarlo.
+    """
+    sesion = _sesiones_rembg.get(modelo)
+    if sesion is None:
+        with _sesiones_rembg_lock:
+            sesion = _sesiones_rembg.get(modelo)
+            if sesion is None:
+                # rembg (onnxruntime, scikit-image...) sólo se carga si se llega a usar
+                from rembg import new_session
+
+                sesion = _sesiones_rembg[modelo] = new_session(modelo)
+    return sesion
+
+
+def clave_firma(contenido, remover_fondo, metodo=METODO_FONDO):
+    """Clave del cache: hash de la imagen más las opciones que afectan el resultado."""
+    return (
+        hashlib.sha256(contenido).hexdigest(),
+        remover_fondo,
+        (metodo, MODELO_REMBG) if remover_fondo else None,
+        DPI_FIRMA,
+    )
+
+
+def firma_en_cache(contenido, remover_fondo, metodo=METODO_FONDO):
+    return clave_firma(contenido, remover_fondo, metodo) in _procesadas
+
+
+def altura_objetivo():
+    """Píxeles de alto que ocupa la firma en el documento a ``DPI_FIRMA``."""
+    return max(1, round(ALTURA_FIRMA_CM / 2.54 * DPI_FIRMA))
+
+
+def cargar_imagen(contenido, max_pixeles=MAX_PIXELES_FIRMA, pixeles_trabajo=PIXELES_TRABAJO):
+    """
+    Abre la imagen subida ya normalizada para procesarla.
+
+    Returns:
+        Image: Imagen orientada y reducida a lo sumo a ``pixeles_trabajo``
+
+    Raises:
+        ErrorImagenFirma: Si no es una imagen válida o supera ``max_pixeles``
+    """
+    try:
+        image = Image.open(BytesIO(contenido))
+        ancho, alto = image.size
+        # El tamaño se conoce por la cabecera, antes de decodificar
+        if ancho * alto > max_pixeles:
+            raise ErrorImagenFirma(
+                f"La imagen de la firma es demasiado grande ({ancho}x{alto} píxeles)."
+            )
+        escala = min(1.0, (pixeles_trabajo / (ancho * alto)) ** 0.5)
+        objetivo = (max(1, int(ancho * escala)), max(1, int(alto * escala)))
+        if image.format == 'JPEG' and escala < 1.0:
+            # Decodifica directamente a 1/2, 1/4 u 1/8 si alcanza
+            image.draft('RGB', objetivo)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except ErrorImagenFirma:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ErrorImagenFirma(f"No se pudo abrir la imagen de la firma: {e}") from e
+
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+        image = image.convert('RGB')
+    if image.width * image.height > pixeles_trabajo:
+        escala = (pixeles_trabajo / (image.width * image.height)) ** 0.5
+        image = image.resize(
+            (max(1, int(image.width * escala)), max(1, int(image.height * escala))),
+            Image.LANCZOS,
+        )
+    return image
+
+
+def ajustar_para_documento(image):
+    """Reduce la firma a la altura en píxeles con que se incrusta en el documento."""
+    alto = altura_objetivo()
+    if image.height > alto:
+        ancho = max(1, round(image.width * alto / image.height))
+        image = image.resize((ancho, alto), Image.LANCZOS)
+    return image
+
+
+def escala_de_grises(image):
+    """Luminancia (0-255) de la imagen, con las zonas transparentes como blanco."""
+    rgba = np.asarray(image.convert('RGBA'), dtype=np.float32)
+    alfa = rgba[..., 3:] / 255.0
+    rgb = rgba[..., :3] * alfa + 255.0 * (1.0 - alfa)
+    return rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def fondo_uniforme(gris):
+    """Indica si el borde de la imagen es un fondo claro y casi uniforme."""
+    alto, ancho = gris.shape
+    m_alto = max(1, int(alto * MARGEN_FONDO))
+    m_ancho = max(1, int(ancho * MARGEN_FONDO))
+    borde = np.concatenate([
+        gris[:m_alto].ravel(), gris[-m_alto:].ravel(),
+        gris[:, :m_ancho].ravel(), gris[:, -m_ancho:].ravel(),
+    ])
+    return borde.mean() >= BRILLO_MINIMO_FONDO and borde.std() <= DESVIACION_MAXIMA_FONDO
+
+
+def umbral_otsu(gris):
+    """Umbral que maximiza la varianza entre clases del histograma."""
+    histograma = np.bincount(gris.astype(np.uint8).ravel(), minlength=256).astype(np.float64)
+    niveles = np.arange(256, dtype=np.float64)
+    # Para cada umbral t, la clase <= t es la tinta (oscura) y el resto el papel
+    peso_tinta = np.cumsum(histograma)
+    peso_papel = peso_tinta[-1] - peso_tinta
+    suma = np.cumsum(histograma * niveles)
+    media_tinta = suma / np.maximum(peso_tinta, 1)
+    media_papel = (suma[-1] - suma) / np.maximum(peso_papel, 1)
+    varianza = peso_tinta * peso_papel * (media_tinta - media_papel) ** 2
+    return int(np.argmax(varianza))
+
+
+def remover_fondo_clasico(image, gris=None):
+    """
+    Quita un fondo claro con un umbral de Otsu y recorta al trazo.
+
+    El canal alfa se obtiene de lo oscura que es la tinta respecto del papel,
+    lo que conserva los bordes suavizados del trazo.
+
+    Returns:
+        Image: Firma en RGBA recortada a la tinta
+    """
+    if gris is None:
+        gris = escala_de_grises(image)
+    umbral = umbral_otsu(gris)
+    tinta = gris <= umbral
+    if not tinta.any():
+        return image.convert('RGBA')
+
+    nivel_tinta = float(np.median(gris[tinta]))
+    nivel_papel = float(np.median(gris[~tinta])) if (~tinta).any() else 255.0
+    rango = max(nivel_papel - nivel_tinta, 1.0)
+    alfa = np.clip((nivel_papel - gris) / rango * 255.0, 0, 255).astype(np.uint8)
+
+    rgba = np.array(image.convert('RGBA'))
+    rgba[..., 3] = np.minimum(rgba[..., 3], alfa)
+
+    filas = np.flatnonzero(tinta.any(axis=1))
+    columnas = np.flatnonzero(tinta.any(axis=0))
+    arriba = max(filas[0] - MARGEN_RECORTE, 0)
+    abajo = min(filas[-1] + MARGEN_RECORTE + 1, rgba.shape[0])
+    izquierda = max(columnas[0] - MARGEN_RECORTE, 0)
+    derecha = min(columnas[-1] + MARGEN_RECORTE + 1, rgba.shape[1])
+    return Image.fromarray(rgba[arriba:abajo, izquierda:derecha], 'RGBA')
+
+
+def remover_fondo_rembg(image):
+    """Segmenta la firma con rembg y devuelve la imagen en RGBA."""
+    from rembg import remove
+
+    sesion = obtener_sesion_rembg()
+    with _lock_rembg:
+        imagen_procesada = remove(image, session=sesion)
+    if imagen_procesada.mode != 'RGBA':
+        imagen_procesada = imagen_procesada.convert('RGBA')
+    return imagen_procesada
+
+
+def _remover_fondo(image, metodo):
+    """
+    Quita el fondo de la firma con el método indicado.
+
+    En modo ``auto`` se usa el método clásico si el fondo es claro y
+    uniforme, y rembg en caso contrario.
+    """
+    if metodo == 'rembg':
+        return remover_fondo_rembg(image)
+    gris = escala_de_grises(image)
+    if metodo == 'auto' and not fondo_uniforme(gris):
+        return remover_fondo_rembg(image)
+    return remover_fondo_clasico(image, gris)
+
+
+@instrumentar('firma')
+def procesar_firma(contenido, remover_fondo=False, metodo=METODO_FONDO):
+    """
+    Procesa la imagen de la firma, opcionalmente removiendo el fondo.
+
+    Args:
+        contenido: Bytes de la imagen subida
+        remover_fondo: Boolean indicando si se debe remover el fondo
+        metodo: ``auto``, ``clasico`` o ``rembg``
+
+    Returns:
+        bytes: Imagen procesada en formato PNG
+
+    Raises:
+        ErrorImagenFirma: Si la imagen no es válida o es demasiado grande
+    """
+    anotar(tamano=len(contenido))
+    clave = clave_firma(contenido, remover_fondo, metodo)
+    png = _procesadas.obtener(clave)
+    anotar(cache=png is not None)
+    if png is not None:
+        return png
+
+    image = cargar_imagen(contenido)
+    imagen_procesada = _remover_fondo(image, metodo) if remover_fondo else image
+    imagen_procesada = ajustar_para_documento(imagen_procesada)
+
+    salida = BytesIO()
+    imagen_procesada.save(salida, format='PNG', optimize=True)
+    png = salida.getvalue()
+    _procesadas.guardar(clave, png)
+    return png
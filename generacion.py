@@ -0,0 +1,267 @@
+# generacion.py
+"""
+Generación del paquete de cotización, independiente de la interfaz.
+
+Al generar, las etapas que no dependen entre sí (verificación en SUNAT,
+extracción del TDR y preparación de la firma) se ejecutan en paralelo en un
+pool de hilos, cada una con su propio timeout; el renderizado de las
+plantillas y el empaquetado esperan a que terminen las tres. Así la latencia
+es la de la etapa más lenta y no la suma de todas.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturoTimeoutError
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+
+from PIL import Image
+
+from empaquetado import empaquetar
+from metricas import instrumentar
+from plantilla import cargar_manifiesto, obtener_plantilla, renderizar_paquete
+from tdr import extraer_datos_tdr
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_MANIFIESTO = os.path.join(BASE_DIR, 'plantillas.json')
+
+TIMEOUT_SUNAT = float(os.environ.get('COTIZACION_TIMEOUT_SUNAT', '30'))
+TIMEOUT_TDR = float(os.environ.get('COTIZACION_TIMEOUT_TDR', '120'))
+TIMEOUT_FIRMA = float(os.environ.get('COTIZACION_TIMEOUT_FIRMA', '60'))
+HILOS_ETAPAS = int(os.environ.get('COTIZACION_HILOS_ETAPAS', '8'))
+
+NOMBRE_FIRMA = 'Firma.png'
+NOMBRE_TDR = '6. Copia de Terminos de Referencia.pdf'
+
+
+class ErrorEtapa(Exception):
+    """
+    Falló o se agotó el tiempo de una etapa de la generación.
+
+    Attributes:
+        etapa: Nombre de la etapa (``sunat``, ``tdr``, ``firma``...)
+        causa: Excepción original, o ``None`` si fue un timeout
+    """
+
+    def __init__(self, etapa, mensaje, causa=None):
+        super().__init__(f"Etapa '{etapa}': {mensaje}")
+        self.etapa = etapa
+        self.mensaje = mensaje
+        self.causa = causa
+
+    def __reduce__(self):
+        # Para que viaje entre procesos (ver lote.py)
+        return self.__class__, (self.etapa, self.mensaje, self.causa)
+
+
+@dataclass(frozen=True)
+class Tarea:
+    nombre: str
+    funcion: Callable
+    args: tuple = ()
+    timeout: Optional[float] = None
+
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS_ETAPAS, thread_name_prefix='etapa')
+        return _ejecutor
+
+
+def ejecutar_tareas(tareas):
+    """
+    Ejecuta tareas independientes en paralelo y espera sus resultados.
+
+    El timeout de cada tarea se cuenta desde que se lanzaron todas. Si alguna
+    falla o se agota su tiempo, se cancelan las que aún no empezaron y se
+    lanza ``ErrorEtapa`` con el nombre de la tarea.
+
+    Args:
+        tareas: Iterable de ``Tarea``
+
+    Returns:
+        dict: Nombre de la tarea -> resultado
+    """
+    ejecutor = _obtener_ejecutor()
+    inicio = time.monotonic()
+    futuros = [(tarea, ejecutor.submit(tarea.funcion, *tarea.args)) for tarea in tareas]
+    resultados = {}
+    try:
+        for tarea, futuro in futuros:
+            restante = None
+            if tarea.timeout is not None:
+                restante = max(0.0, tarea.timeout - (time.monotonic() - inicio))
+            try:
+                resultados[tarea.nombre] = futuro.result(timeout=restante)
+            except FuturoTimeoutError:
+                raise ErrorEtapa(tarea.nombre, f"no terminó en {tarea.timeout:g} s") from None
+            except Exception as e:
+                raise ErrorEtapa(tarea.nombre, str(e) or type(e).__name__, causa=e) from e
+    except ErrorEtapa:
+        for _, futuro in futuros:
+            futuro.cancel()
+        raise
+    return resultados
+
+
+def formatear_fecha(fecha):
+    """
+    Formatea una fecha en español.
+
+    Returns:
+        tuple: (fecha como "17 de octubre de 2026", mes en mayúsculas)
+    """
+    meses = {
+        "January": "enero", "February": "febrero", "March": "marzo", "April": "abril",
+        "May": "mayo", "June": "junio", "July": "julio", "August": "agosto",
+        "September": "setiembre", "October": "octubre", "November": "noviembre", "December": "diciembre"
+    }
+    mes = meses[fecha.strftime("%B")]
+    return f"{fecha.day} de {mes} de {fecha.year}", mes.upper()
+
+
+def finalizar_firma(firma):
+    """
+    Obtiene los bytes PNG definitivos de la firma procesada.
+
+    Returns:
+        tuple: (bytes PNG, SHA-256 en hexadecimal)
+
+    Raises:
+        ErrorImagenFirma: Si la firma no es una imagen válida
+    """
+    contenido = firma.getvalue() if hasattr(firma, 'getvalue') else bytes(firma)
+    if not contenido.startswith(b'\x89PNG'):
+        png = BytesIO()
+        try:
+            Image.open(BytesIO(contenido)).save(png, format='PNG')
+        except (OSError, ValueError) as e:
+            from firma import ErrorImagenFirma
+            raise ErrorImagenFirma(f"No se pudo abrir la imagen de la firma: {e}") from e
+        contenido = png.getvalue()
+    return contenido, hashlib.sha256(contenido).hexdigest()
+
+
+def construir_reemplazos(pdf_file, data, tdr=None):
+    """
+    Completa ``data`` con los campos del TDR y arma el contexto de reemplazos
+    común a todas las plantillas.
+
+    Returns:
+        dict: Nombre del marcador (sin llaves) -> valor
+    """
+    # Extraer datos del PDF (una sola lectura, memorizada por contenido)
+    tdr = tdr or extraer_datos_tdr(pdf_file)
+
+    # Actualizar data con los datos extraídos
+    data['servicio'] = tdr.servicio
+    data['armada'] = tdr.forma_pago
+    data['dias'] = tdr.dias
+
+    return {
+        'fecha': data['fecha'],
+        'servicio': data['servicio'],
+        'dias': data['dias'],
+        'oferta': "{:.2f}".format(data['oferta']),
+        'armada': data['armada'],
+        'MES': data['mes'],
+        'dni': data['dni'],
+        'nombres': data['nombres'],
+        'ruc': data['ruc'],
+        'telefono': data['telefono'],
+        'correo': data['correo'],
+        'direccion': data['direccion'],
+        'banco': data['banco'],
+        'cuenta': data['cuenta'],
+        'cci': data['cci'],
+        'year': str(data['year']),
+    }
+
+
+@instrumentar('documentos')
+def generar_documentos(pdf_file, data, manifiesto_path=None, tdr=None):
+    """
+    Genera todos los documentos del paquete descrito en el manifiesto
+    (cotización, declaraciones juradas, anexos, carta de autorización...).
+
+    El contexto de reemplazos y la firma se preparan una sola vez y las
+    plantillas se renderizan en paralelo.
+
+    Returns:
+        list: Tuplas (nombre del archivo, BytesIO) en el orden del manifiesto
+    """
+    entradas = cargar_manifiesto(manifiesto_path or RUTA_MANIFIESTO)
+    reemplazos = construir_reemplazos(pdf_file, data, tdr)
+    return renderizar_paquete(entradas, reemplazos, firma=data['firma'])
+
+
+def precargar(rembg=False):
+    """
+    Carga de antemano las plantillas del manifiesto y, si se pide, la sesión
+    de rembg, para que la primera cotización no pague por ellas.
+    """
+    for ruta, _ in cargar_manifiesto(RUTA_MANIFIESTO):
+        obtener_plantilla(ruta)
+    if rembg:
+        from firma import obtener_sesion_rembg
+        try:
+            obtener_sesion_rembg()
+        except Exception:
+            # Sin modelo disponible; fallarán sólo las firmas que lo necesiten
+            pass
+
+
+@instrumentar('paquete')
+def generar_paquete(pdf_file, firma, campos, consultar_dni, datos_sunat=None):
+    """
+    Genera el ZIP completo de la cotización.
+
+    La consulta a SUNAT, la extracción del TDR y la preparación de la firma
+    se ejecutan en paralelo; después se renderizan las plantillas y se
+    empaqueta el resultado.
+
+    Args:
+        pdf_file: TDR (ruta, bytes o archivo subido)
+        firma: Firma procesada (BytesIO o bytes)
+        campos: Datos del formulario (dni, telefono, correo, direccion, banco,
+            cuenta, cci, oferta, fecha, mes, year)
+        consultar_dni: Función DNI -> objeto con ``nombres`` y ``ruc``
+        datos_sunat: Resultado ya obtenido de SUNAT; si se pasa no se consulta
+
+    Returns:
+        Paquete: ZIP generado (ver ``empaquetado.empaquetar``)
+
+    Raises:
+        ErrorEtapa: Si alguna etapa falla o supera su timeout
+    """
+    tareas = [
+        Tarea('tdr', extraer_datos_tdr, (pdf_file,), TIMEOUT_TDR),
+        Tarea('firma', finalizar_firma, (firma,), TIMEOUT_FIRMA),
+    ]
+    if datos_sunat is None:
+        tareas.insert(0, Tarea('sunat', consultar_dni, (campos['dni'],), TIMEOUT_SUNAT))
+    resultados = ejecutar_tareas(tareas)
+    datos_sunat = resultados.get('sunat', datos_sunat)
+    imagen_firma, _ = resultados['firma']
+
+    data = {
+        **campos,
+        'nombres': datos_sunat.nombres,
+        'ruc': datos_sunat.ruc,
+        'firma': imagen_firma,
+    }
+    documentos = generar_documentos(pdf_file, data, tdr=resultados['tdr'])
+    return empaquetar([
+        *documentos,
+        (NOMBRE_FIRMA, imagen_firma),
+        (NOMBRE_TDR, pdf_file),
+    ])
@@ -0,0 +1,222 @@
+# geocodificacion.py
+"""
+Geocodificación inversa (coordenadas -> dirección) con Nominatim.
+
+Todas las sesiones comparten un único cliente de Nominatim, un cache de
+direcciones y un limitador de tasa tipo *token bucket*, de modo que el
+proceso completo respeta la política de uso de Nominatim (1 petición por
+segundo) aunque haya muchos usuarios a la vez.
+
+Las coordenadas se agrupan en celdas geohash: dos puntos dentro de la misma
+celda comparten la dirección cacheada y se geocodifica el centro de la
+celda. Con la precisión por defecto (8) una celda mide unos 38 x 19 m.
+
+Con ``COTIZACION_GEOCODIFICACION=offline`` no se consulta Nominatim y se
+responde con el índice local de ubigeos (ver ``ubigeo.py``).
+"""
+import os
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+
+from cache_memoria import CacheLRU
+from metricas import anotar, instrumentar
+from ubigeo import direccion_aproximada
+
+# 'nominatim' (con respaldo local si falla) u 'offline' (sólo el índice local)
+MODO_GEOCODIFICACION = os.environ.get('COTIZACION_GEOCODIFICACION', 'nominatim')
+# Servidor de Nominatim (por ejemplo uno local para pruebas de carga)
+URL_NOMINATIM = os.environ.get('COTIZACION_NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+USER_AGENT = os.environ.get('COTIZACION_NOMINATIM_USER_AGENT', 'my_streamlit_app')
+PETICIONES_POR_SEGUNDO = float(os.environ.get('COTIZACION_NOMINATIM_RPS', '1'))
+PRECISION_GEOHASH = int(os.environ.get('COTIZACION_GEOHASH_PRECISION', '8'))
+TIMEOUT_NOMINATIM = float(os.environ.get('COTIZACION_NOMINATIM_TIMEOUT', '5'))
+# Tiempo máximo que una consulta espera turno en el limitador
+ESPERA_MAXIMA = 10.0
+TTL_DIRECCIONES = 7 * 24 * 3600
+MAX_DIRECCIONES_EN_CACHE = 4096
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+class ErrorGeocodificacion(Exception):
+    """No se pudo obtener la dirección de unas coordenadas."""
+
+
+def geohash(lat, lon, precision=PRECISION_GEOHASH):
+    """
+    Codifica unas coordenadas como geohash.
+
+    Returns:
+        str: Geohash de ``precision`` caracteres
+    """
+    rango_lat = [-90.0, 90.0]
+    rango_lon = [-180.0, 180.0]
+    caracteres = []
+    bits = 0
+    valor = 0
+    es_lon = True
+    while len(caracteres) < precision:
+        rango, coordenada = (rango_lon, lon) if es_lon else (rango_lat, lat)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        es_lon = not es_lon
+        bits += 1
+        if bits == 5:
+            caracteres.append(_BASE32[valor])
+            bits = 0
+            valor = 0
+    return ''.join(caracteres)
+
+
+def centro_geohash(celda):
+    """
+    Decodifica un geohash.
+
+    Returns:
+        tuple: (lat, lon) del centro de la celda
+    """
+    rango_lat = [-90.0, 90.0]
+    rango_lon = [-180.0, 180.0]
+    es_lon = True
+    for caracter in celda:
+        valor = _BASE32.index(caracter)
+        for desplazamiento in range(4, -1, -1):
+            rango = rango_lon if es_lon else rango_lat
+            medio = (rango[0] + rango[1]) / 2
+            if (valor >> desplazamiento) & 1:
+                rango[0] = medio
+            else:
+                rango[1] = medio
+            es_lon = not es_lon
+    return (rango_lat[0] + rango_lat[1]) / 2, (rango_lon[0] + rango_lon[1]) / 2
+
+
+class LimitadorTasa:
+    """
+    Token bucket seguro entre hilos.
+
+    Args:
+        tasa: Fichas que se reponen por segundo
+        capacidad: Fichas máximas acumulables (ráfaga permitida)
+    """
+
+    def __init__(self, tasa, capacidad=1):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._fichas = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self, timeout=None):
+        """
+        Espera hasta obtener una ficha.
+
+        Returns:
+            bool: ``False`` si no se consiguió antes de ``timeout`` segundos
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return True
+                espera = (1 - self._fichas) / self.tasa
+            if limite is not None and ahora + espera > limite:
+                return False
+            time.sleep(espera)
+
+
+class ServicioGeocodificacion:
+    """
+    Geocodificación inversa compartida por todas las sesiones.
+
+    Args:
+        user_agent: Identificación de la aplicación ante Nominatim
+        tasa: Peticiones por segundo permitidas a Nominatim
+        precision: Caracteres del geohash usado como clave del cache
+        modo: ``nominatim`` u ``offline``
+    """
+
+    def __init__(self, user_agent=USER_AGENT, tasa=PETICIONES_POR_SEGUNDO,
+                 precision=PRECISION_GEOHASH, modo=MODO_GEOCODIFICACION):
+        self.precision = precision
+        self.modo = modo
+        url = urlparse(URL_NOMINATIM)
+        self.geolocator = Nominatim(
+            user_agent=user_agent,
+            timeout=TIMEOUT_NOMINATIM,
+            domain=url.netloc + url.path.rstrip('/'),
+            scheme=url.scheme,
+        )
+        self.limitador = LimitadorTasa(tasa)
+        self.cache = CacheLRU(MAX_DIRECCIONES_EN_CACHE, ttl=TTL_DIRECCIONES)
+        # Celda -> [candado, sesiones que lo usan]: no se consulta dos veces
+        # la misma celda a la vez y el candado vive mientras alguien lo espere
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def celda(self, lat, lon):
+        return geohash(lat, lon, self.precision)
+
+    @instrumentar('nominatim')
+    def direccion(self, lat, lon):
+        """
+        Obtiene la dirección de unas coordenadas.
+
+        Returns:
+            str: Dirección, o ``None`` si Nominatim no encontró ninguna
+
+        Raises:
+            ErrorGeocodificacion: Si Nominatim falla o no hay turno a tiempo
+        """
+        if self.modo == 'offline':
+            return direccion_aproximada(lat, lon)
+
+        clave = self.celda(lat, lon)
+        if clave in self.cache:
+            anotar(cache=True)
+            return self.cache.obtener(clave)
+
+        with self._lock:
+            entrada = self._en_curso.setdefault(clave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                # Otra sesión pudo resolverla mientras se esperaba
+                if clave in self.cache:
+                    anotar(cache=True)
+                    return self.cache.obtener(clave)
+                anotar(cache=False)
+                if not self.limitador.adquirir(timeout=ESPERA_MAXIMA):
+                    raise ErrorGeocodificacion("demasiadas consultas a Nominatim, intenta de nuevo")
+                try:
+                    location = self.geolocator.reverse(centro_geohash(clave))
+                except GeopyError as e:
+                    raise ErrorGeocodificacion(str(e)) from e
+                direccion = location.address if location else None
+                self.cache.guardar(clave, direccion)
+                return direccion
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._en_curso[clave]
+
+
+@lru_cache(maxsize=None)
+def obtener_servicio_geocodificacion():
+    """Servicio compartido por el proceso."""
+    return ServicioGeocodificacion()
@@ -0,0 +1,225 @@
+# lote.py
+"""
+Generación de cotizaciones por lotes, sin Streamlit.
+
+Toma una carpeta de TDR en PDF y un archivo CSV o JSON de proveedores, y
+genera un ZIP por cada combinación TDR/proveedor. Si un proveedor tiene la
+columna ``tdr`` sólo se combina con ese archivo; si no, con todos los TDR de
+la carpeta.
+
+Columnas de cada proveedor:
+    dni, telefono, correo, direccion, banco, cuenta, firma (ruta de la
+    imagen, relativa al archivo de proveedores), oferta
+    Opcionales: cci (se calcula del banco y la cuenta), nombres y ruc (si
+    faltan se consultan en SUNAT), remover_fondo, tdr
+
+El trabajo se reparte en un ``ProcessPoolExecutor``; cada proceso carga las
+plantillas (y la sesión de rembg, si algún proveedor la necesita) una sola
+vez al iniciar. Los ZIP se copian por bloques a la carpeta de salida.
+
+Uso:
+    python lote.py carpeta_tdrs/ proveedores.csv salida/ [--procesos 4] [--token-sunat CLAVE]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from bancos import generar_cci
+from firma import ErrorImagenFirma, procesar_firma
+from generacion import ErrorEtapa, formatear_fecha, generar_paquete, precargar
+from sunat import DatosSunat, obtener_cliente_sunat
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 'yes', 'x'}
+
+# Estado de cada proceso del pool, preparado por _inicializar_proceso
+_token_sunat = None
+
+
+class ErrorProveedor(Exception):
+    """Los datos de un proveedor están incompletos o no son válidos."""
+
+
+def cargar_proveedores(ruta):
+    """
+    Lee los proveedores de un CSV o de un JSON (lista de objetos).
+
+    Returns:
+        list: Diccionarios con los datos normalizados de cada proveedor
+    """
+    with open(ruta, encoding='utf-8-sig', newline='') as f:
+        if ruta.lower().endswith('.json'):
+            registros = json.load(f)
+        else:
+            registros = list(csv.DictReader(f))
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    proveedores = []
+    for registro in registros:
+        registro = {clave.strip().lower(): valor for clave, valor in registro.items()}
+        if registro.get('firma'):
+            registro['firma'] = os.path.join(directorio, str(registro['firma']))
+        registro['remover_fondo'] = str(registro.get('remover_fondo', '')).strip().lower() in VALORES_VERDADEROS
+        proveedores.append(registro)
+    return proveedores
+
+
+def planificar(carpeta_tdrs, proveedores):
+    """
+    Combina los TDR de la carpeta con los proveedores.
+
+    Returns:
+        list: Tuplas (ruta del TDR, proveedor)
+    """
+    tdrs = sorted(
+        nombre for nombre in os.listdir(carpeta_tdrs) if nombre.lower().endswith('.pdf')
+    )
+    trabajos = []
+    for proveedor in proveedores:
+        propios = [proveedor['tdr']] if proveedor.get('tdr') else tdrs
+        trabajos.extend((os.path.join(carpeta_tdrs, nombre), proveedor) for nombre in propios)
+    return trabajos
+
+
+def nombre_salida(ruta_tdr, proveedor):
+    base = os.path.splitext(os.path.basename(ruta_tdr))[0]
+    return f"{base}_{proveedor.get('dni', 'sin_dni')}.zip"
+
+
+def _inicializar_proceso(token_sunat, precargar_rembg):
+    """Carga una sola vez por proceso las plantillas y los modelos."""
+    global _token_sunat
+    _token_sunat = token_sunat
+    precargar(rembg=precargar_rembg)
+
+
+def _consultar_dni(dni):
+    if not _token_sunat:
+        raise ErrorProveedor(f"Falta nombres/ruc para el DNI {dni} y no hay token de SUNAT")
+    return obtener_cliente_sunat(_token_sunat).consultar(dni)
+
+
+def generar(ruta_tdr, proveedor, ruta_salida):
+    """
+    Genera el ZIP de un TDR y un proveedor en ``ruta_salida``.
+
+    Returns:
+        tuple: (tamaño del ZIP en bytes, segundos)
+    """
+    inicio = time.perf_counter()
+    faltantes = [
+        campo for campo in ('dni', 'telefono', 'correo', 'direccion', 'banco', 'cuenta', 'firma', 'oferta')
+        if not proveedor.get(campo)
+    ]
+    if faltantes:
+        raise ErrorProveedor(f"Faltan campos: {', '.join(faltantes)}")
+
+    with open(proveedor['firma'], 'rb') as f:
+        firma = procesar_firma(f.read(), proveedor['remover_fondo'])
+
+    fecha = datetime.now()
+    fecha_formateada, mes = formatear_fecha(fecha)
+    dni = str(proveedor['dni'])
+    campos = {
+        'dni': dni,
+        'telefono': str(proveedor['telefono']),
+        'correo': proveedor['correo'],
+        'direccion': proveedor['direccion'],
+        'banco': proveedor['banco'],
+        'cuenta': str(proveedor['cuenta']),
+        'cci': str(proveedor.get('cci') or generar_cci(proveedor['banco'], str(proveedor['cuenta']))),
+        'oferta': float(proveedor['oferta']),
+        'fecha': fecha_formateada,
+        'mes': mes,
+        'year': fecha.year,
+    }
+    datos_sunat = None
+    if proveedor.get('nombres') and proveedor.get('ruc'):
+        datos_sunat = DatosSunat(proveedor['nombres'], str(proveedor['ruc']))
+
+    paquete = generar_paquete(ruta_tdr, firma, campos, _consultar_dni, datos_sunat=datos_sunat)
+
+    # Se escribe a un temporal y se renombra para no dejar ZIP a medias
+    parcial = ruta_salida + '.part'
+    try:
+        with paquete.archivo, open(parcial, 'wb') as destino:
+            shutil.copyfileobj(paquete.archivo, destino, 1024 * 1024)
+        os.replace(parcial, ruta_salida)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    return paquete.tamano, time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Genera cotizaciones por lotes.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument('tdrs', help='Carpeta con los TDR en PDF')
+    parser.add_argument('proveedores', help='Archivo CSV o JSON con los proveedores')
+    parser.add_argument('salida', help='Carpeta donde se escriben los ZIP')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--token-sunat', default=os.environ.get('COTIZACION_SUNAT_TOKEN'),
+                        help='Clave de apis.net.pe para los proveedores sin nombres/ruc')
+    args = parser.parse_args(argv)
+
+    proveedores = cargar_proveedores(args.proveedores)
+    trabajos = planificar(args.tdrs, proveedores)
+    if not trabajos:
+        print("No hay TDR ni proveedores que procesar.")
+        return 0
+    os.makedirs(args.salida, exist_ok=True)
+
+    precargar_rembg = any(p['remover_fondo'] for p in proveedores)
+    inicio = time.perf_counter()
+    total_bytes = 0
+    fallidos = 0
+    with ProcessPoolExecutor(
+        max_workers=args.procesos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_proceso,
+        initargs=(args.token_sunat, precargar_rembg),
+    ) as ejecutor:
+        futuros = {}
+        for ruta_tdr, proveedor in trabajos:
+            destino = os.path.join(args.salida, nombre_salida(ruta_tdr, proveedor))
+            futuros[ejecutor.submit(generar, ruta_tdr, proveedor, destino)] = destino
+
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            destino = futuros[futuro]
+            prefijo = f"[{hechos}/{len(futuros)}] {os.path.basename(destino)}"
+            try:
+                tamano, duracion = futuro.result()
+            except (ErrorEtapa, ErrorImagenFirma, ErrorProveedor, OSError, ValueError) as e:
+                fallidos += 1
+                print(f"{prefijo}: ERROR {e}", flush=True)
+                continue
+            except Exception as e:
+                # Un fallo inesperado en un trabajo no debe detener el resto del lote
+                fallidos += 1
+                print(f"{prefijo}: ERROR inesperado {type(e).__name__}: {e}", flush=True)
+                continue
+            total_bytes += tamano
+            print(f"{prefijo}: {tamano / 1024:,.0f} KB en {duracion:.2f} s", flush=True)
+
+    transcurrido = time.perf_counter() - inicio
+    generados = len(trabajos) - fallidos
+    print(
+        f"{generados} cotizaciones generadas, {fallidos} con error, en {transcurrido:.1f} s "
+        f"({generados / transcurrido:.2f} cotizaciones/s, "
+        f"{total_bytes / 1024 / 1024 / transcurrido:.2f} MB/s)"
+    )
+    return 1 if fallidos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
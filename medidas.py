@@ -0,0 +1,5 @@
+# medidas.py
+"""Medidas del documento generado que comparten la firma y las plantillas."""
+
+# Alto con que se inserta la firma en las plantillas
+ALTURA_FIRMA_CM = 1.91
@@ -0,0 +1,387 @@
+# metricas.py
+"""
+Métricas en memoria del proceso.
+
+Hay dos tipos de registro, ambos compartidos entre todas las sesiones y
+seguros entre hilos:
+
+- ``observar``: resumen simple de una magnitud (cantidad, suma, máximo y
+  último valor).
+- ``medir`` / ``instrumentar``: mide cada llamada a una etapa (SUNAT,
+  Nominatim, TDR, firma, documentos, ZIP...) y acumula en histogramas su
+  duración y el tamaño de los datos, junto con contadores de llamadas,
+  errores y aciertos de cache. Dentro de la etapa, ``anotar`` indica el
+  tamaño procesado o si la respuesta salió del cache.
+
+``exportar_prometheus`` genera el formato de texto de Prometheus; con
+``COTIZACION_METRICAS_ARCHIVO`` un hilo lo escribe periódicamente en ese
+archivo (por ejemplo, para el *textfile collector* de node_exporter).
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+RUTA_EXPORTACION = os.environ.get('COTIZACION_METRICAS_ARCHIVO', '')
+INTERVALO_EXPORTACION = float(os.environ.get('COTIZACION_METRICAS_INTERVALO', '15'))
+PREFIJO = 'cotizacion_'
+
+# Límites superiores de los buckets de los histogramas
+BUCKETS_SEGUNDOS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+BUCKETS_BYTES = tuple(1024 * 4 ** i for i in range(10))  # 1 KB a 256 MB
+
+
+class Metrica:
+    """Resumen de las observaciones de una magnitud."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = None
+        self.ultimo = None
+
+    def observar(self, valor):
+        self.cantidad += 1
+        self.suma += valor
+        self.ultimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+
+    @property
+    def promedio(self):
+        return self.suma / self.cantidad if self.cantidad else None
+
+
+class Histograma:
+    """
+    Histograma acumulativo con buckets fijos, como los de Prometheus.
+
+    Args:
+        limites: Límites superiores de los buckets, en orden creciente
+    """
+
+    def __init__(self, limites):
+        self.limites = limites
+        # El último bucket es +Inf
+        self.conteos = [0] * (len(limites) + 1)
+        self.cantidad = 0
+        self.suma = 0.0
+
+    def observar(self, valor):
+        self.conteos[bisect_left(self.limites, valor)] += 1
+        self.cantidad += 1
+        self.suma += valor
+
+    def cuantil(self, q):
+        """
+        Estima el cuantil ``q`` interpolando dentro del bucket que lo
+        contiene (igual que ``histogram_quantile`` de Prometheus).
+
+        Returns:
+            float: Valor estimado, o ``None`` si no hay observaciones
+        """
+        if not self.cantidad:
+            return None
+        objetivo = q * self.cantidad
+        acumulado = 0
+        for i, conteo in enumerate(self.conteos):
+            if conteo and acumulado + conteo >= objetivo:
+                if i == len(self.limites):
+                    # Por encima del último límite no hay con qué interpolar
+                    return self.limites[-1]
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return self.limites[-1]
+
+
+class Medicion:
+    """Datos de una llamada en curso a una etapa; ver ``anotar``."""
+    __slots__ = ('etapa', 'inicio', 'tamano', 'cache')
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self.inicio = time.perf_counter()
+        self.tamano = None
+        self.cache = None
+
+
+_metricas = {}
+# (nombre, etapa) -> Histograma / contador
+_histogramas = {}
+_contadores = {}
+_colectores = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def observar(nombre, valor):
+    """Registra una observación de la métrica ``nombre``."""
+    with _lock:
+        metrica = _metricas.get(nombre)
+        if metrica is None:
+            metrica = _metricas[nombre] = Metrica(nombre)
+        metrica.observar(valor)
+
+
+def instantanea():
+    """
+    Copia del estado de todas las métricas.
+
+    Returns:
+        dict: Nombre -> dict con cantidad, suma, promedio, maximo y ultimo
+    """
+    with _lock:
+        return {
+            nombre: {
+                'cantidad': m.cantidad,
+                'suma': m.suma,
+                'promedio': m.promedio,
+                'maximo': m.maximo,
+                'ultimo': m.ultimo,
+            }
+            for nombre, m in _metricas.items()
+        }
+
+
+def _pila():
+    pila = getattr(_local, 'pila', None)
+    if pila is None:
+        pila = _local.pila = []
+    return pila
+
+
+def _histograma(nombre, etapa, limites):
+    # Se llama con el candado tomado
+    histograma = _histogramas.get((nombre, etapa))
+    if histograma is None:
+        histograma = _histogramas[(nombre, etapa)] = Histograma(limites)
+    return histograma
+
+
+def _incrementar(nombre, etapa, valor=1):
+    # Se llama con el candado tomado
+    _contadores[(nombre, etapa)] = _contadores.get((nombre, etapa), 0) + valor
+
+
+def _registrar(medicion, duracion, error):
+    with _lock:
+        _histograma('etapa_segundos', medicion.etapa, BUCKETS_SEGUNDOS).observar(duracion)
+        _incrementar('etapa_llamadas_total', medicion.etapa)
+        if error:
+            _incrementar('etapa_errores_total', medicion.etapa)
+        if medicion.tamano is not None:
+            _histograma('etapa_bytes', medicion.etapa, BUCKETS_BYTES).observar(medicion.tamano)
+        if medicion.cache is not None:
+            _incrementar('etapa_cache_aciertos_total' if medicion.cache else 'etapa_cache_fallos_total',
+                         medicion.etapa)
+
+
+@contextmanager
+def medir(etapa):
+    """
+    Mide la duración del bloque como una llamada a ``etapa``. Si el bloque
+    lanza una excepción se cuenta como error (y la excepción se propaga).
+
+    Yields:
+        Medicion: Llamada en curso
+    """
+    medicion = Medicion(etapa)
+    pila = _pila()
+    pila.append(medicion)
+    error = False
+    try:
+        yield medicion
+    except BaseException:
+        error = True
+        raise
+    finally:
+        pila.pop()
+        _registrar(medicion, time.perf_counter() - medicion.inicio, error)
+
+
+def instrumentar(etapa):
+    """Decorador que mide cada llamada a la función como ``etapa``."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(etapa):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def anotar(tamano=None, cache=None):
+    """
+    Completa la medición en curso en este hilo; sin medición no hace nada.
+
+    Args:
+        tamano: Bytes procesados o producidos por la llamada
+        cache: ``True`` si la respuesta salió de un cache, ``False`` si no
+    """
+    pila = _pila()
+    if not pila:
+        return
+    if tamano is not None:
+        pila[-1].tamano = tamano
+    if cache is not None:
+        pila[-1].cache = cache
+
+
+def registrar_colector(funcion):
+    """
+    Agrega una fuente de valores instantáneos (*gauges*) a la exportación.
+
+    Args:
+        funcion: Función sin argumentos que devuelve tuplas
+            (nombre, dict de etiquetas, valor)
+    """
+    with _lock:
+        _colectores.append(funcion)
+
+
+def resumen_etapas():
+    """
+    Resumen por etapa para mostrar en pantalla.
+
+    Returns:
+        list: Un dict por etapa con llamadas, errores, p50 y p95 en
+        milisegundos, porcentaje de aciertos de cache y bytes promedio
+    """
+    with _lock:
+        filas = []
+        etapas = sorted({etapa for nombre, etapa in _histogramas if nombre == 'etapa_segundos'})
+        for etapa in etapas:
+            duraciones = _histogramas[('etapa_segundos', etapa)]
+            tamanos = _histogramas.get(('etapa_bytes', etapa))
+            aciertos = _contadores.get(('etapa_cache_aciertos_total', etapa), 0)
+            fallos = _contadores.get(('etapa_cache_fallos_total', etapa), 0)
+            filas.append({
+                'etapa': etapa,
+                'llamadas': duraciones.cantidad,
+                'errores': _contadores.get(('etapa_errores_total', etapa), 0),
+                'p50_ms': round(duraciones.cuantil(0.5) * 1000, 1),
+                'p95_ms': round(duraciones.cuantil(0.95) * 1000, 1),
+                'cache_%': round(100 * aciertos / (aciertos + fallos), 1) if aciertos + fallos else None,
+                'bytes_promedio': round(tamanos.suma / tamanos.cantidad) if tamanos and tamanos.cantidad else None,
+            })
+        return filas
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in etiquetas.items()) + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar_prometheus():
+    """
+    Todas las métricas en el formato de texto de Prometheus (0.0.4).
+
+    Returns:
+        str: Texto listo para servir como ``text/plain; version=0.0.4``
+    """
+    with _lock:
+        colectores = list(_colectores)
+        lineas = []
+        por_nombre = {}
+        for (nombre, etapa), histograma in _histogramas.items():
+            por_nombre.setdefault(nombre, []).append((etapa, histograma))
+        for nombre, series in sorted(por_nombre.items()):
+            completo = PREFIJO + nombre
+            lineas.append(f'# TYPE {completo} histogram')
+            for etapa, histograma in sorted(series, key=lambda serie: serie[0]):
+                acumulado = 0
+                limites = (*histograma.limites, float('inf'))
+                for limite, conteo in zip(limites, histograma.conteos):
+                    acumulado += conteo
+                    etiquetas = _etiquetas({'etapa': etapa, 'le': _numero(limite)})
+                    lineas.append(f'{completo}_bucket{etiquetas} {acumulado}')
+                etiquetas = _etiquetas({'etapa': etapa})
+                lineas.append(f'{completo}_sum{etiquetas} {_numero(histograma.suma)}')
+                lineas.append(f'{completo}_count{etiquetas} {histograma.cantidad}')
+
+        por_nombre = {}
+        for (nombre, etapa), valor in _contadores.items():
+            por_nombre.setdefault(nombre, []).append((etapa, valor))
+        for nombre, series in sorted(por_nombre.items()):
+            completo = PREFIJO + nombre
+            lineas.append(f'# TYPE {completo} counter')
+            for etapa, valor in sorted(series):
+                lineas.append(f'{completo}{_etiquetas({"etapa": etapa})} {_numero(valor)}')
+
+        for nombre, metrica in sorted(_metricas.items()):
+            completo = PREFIJO + nombre
+            lineas.append(f'# TYPE {completo} summary')
+            lineas.append(f'{completo}_sum {_numero(metrica.suma)}')
+            lineas.append(f'{completo}_count {metrica.cantidad}')
+
+    # Los colectores se consultan sin el candado: pueden tomar los suyos
+    valores = {}
+    for colector in colectores:
+        for nombre, etiquetas, valor in colector():
+            valores.setdefault(nombre, []).append((etiquetas, valor))
+    for nombre, series in sorted(valores.items()):
+        completo = PREFIJO + nombre
+        lineas.append(f'# TYPE {completo} gauge')
+        for etiquetas, valor in series:
+            lineas.append(f'{completo}{_etiquetas(etiquetas)} {_numero(valor)}')
+    return '\n'.join(lineas) + '\n'
+
+
+def escribir_prometheus(ruta):
+    """Escribe ``exportar_prometheus()`` en ``ruta`` de forma atómica."""
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(exportar_prometheus())
+    os.replace(temporal, ruta)
+
+
+_hilo_exportacion = None
+
+
+def _exportar_periodicamente(ruta, intervalo):
+    while True:
+        try:
+            escribir_prometheus(ruta)
+        except OSError:
+            # Se reintenta en el siguiente intervalo
+            pass
+        time.sleep(intervalo)
+
+
+def iniciar_exportacion(ruta=RUTA_EXPORTACION, intervalo=INTERVALO_EXPORTACION):
+    """
+    Inicia, una sola vez por proceso, el hilo que escribe las métricas en
+    ``ruta`` cada ``intervalo`` segundos.
+
+    Returns:
+        threading.Thread: Hilo de exportación, o ``None`` si ``ruta`` está
+        vacía
+    """
+    global _hilo_exportacion
+    if not ruta:
+        return None
+    with _lock:
+        if _hilo_exportacion is None:
+            _hilo_exportacion = threading.Thread(
+                target=_exportar_periodicamente, args=(ruta, intervalo), name='metricas', daemon=True,
+            )
+            _hilo_exportacion.start()
+        return _hilo_exportacion
@@ -0,0 +1,199 @@
+# plantilla.py
+"""
+Plantillas DOCX precompiladas.
+
+La plantilla se lee y analiza una sola vez por proceso: se guarda una copia
+intacta de sus bytes en memoria y el índice de los párrafos que contienen
+marcadores ``{{...}}`` (aunque Word los haya partido en varios runs). Cada
+renderizado parte de esa copia y sólo modifica los párrafos indexados, con
+una única sustitución por expresión regular contra el mapa de reemplazos.
+
+Un paquete de documentos (cotización, declaraciones juradas, anexos, carta
+de autorización del CCI...) se describe en un manifiesto JSON y se renderiza
+en paralelo con un pool de hilos compartiendo los mismos reemplazos y la
+misma firma. Cada documento renderizado se memoriza según los valores de los
+marcadores que realmente usa su plantilla: si sólo cambia la oferta, sólo se
+vuelven a generar las plantillas que contienen ``{{oferta}}``.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Cm, Pt
+from docx.text.paragraph import Paragraph
+
+from cache_memoria import CacheLRU
+from medidas import ALTURA_FIRMA_CM
+
+MARCADOR = re.compile(r'\{\{(\w+)\}\}')
+MARCADOR_FIRMA = '{{firma}}'
+ALTURA_FIRMA = Cm(ALTURA_FIRMA_CM)
+
+# Documentos renderizados que se conservan en memoria
+MAX_DOCUMENTOS_RENDERIZADOS = 64
+
+HILOS_RENDER = int(os.environ.get('COTIZACION_HILOS_PLANTILLAS', str(min(4, os.cpu_count() or 1))))
+
+
+def _parrafos(doc):
+    """Todos los párrafos del cuerpo, incluidos los de tablas anidadas, en orden."""
+    return doc.element.body.iter(qn('w:p'))
+
+
+class PlantillaCompilada:
+    """
+    Plantilla DOCX lista para renderizarse muchas veces.
+
+    Args:
+        ruta: Ruta del archivo ``.docx``
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            self._contenido = f.read()
+
+        doc = Document(BytesIO(self._contenido))
+        # Posición de cada párrafo con marcadores y si es el de la firma
+        self._indices = {}
+        marcadores = set()
+        for indice, elemento in enumerate(_parrafos(doc)):
+            texto = Paragraph(elemento, None).text
+            if '{{' in texto:
+                self._indices[indice] = MARCADOR_FIRMA in texto
+                marcadores.update(MARCADOR.findall(texto))
+        self.usa_firma = any(self._indices.values())
+        # Nombres de los marcadores de texto que usa la plantilla
+        self.marcadores = frozenset(marcadores - {'firma'})
+
+    def renderizar(self, reemplazos, firma=None):
+        """
+        Genera un documento a partir de la plantilla.
+
+        Args:
+            reemplazos: Dict nombre del marcador (sin llaves) -> valor
+            firma: Imagen de la firma (bytes o BytesIO) para ``{{firma}}``
+
+        Returns:
+            BytesIO: Documento generado
+        """
+        doc = Document(BytesIO(self._contenido))
+        cuerpo = doc._body
+        imagen_firma = firma.getvalue() if hasattr(firma, 'getvalue') else firma
+
+        def reemplazar(match):
+            valor = reemplazos.get(match.group(1))
+            return match.group(0) if valor is None else str(valor)
+
+        # Se materializa la lista antes de modificar el árbol XML
+        elementos = list(_parrafos(doc))
+        for indice, es_firma in self._indices.items():
+            paragraph = Paragraph(elementos[indice], cuerpo)
+
+            if es_firma:
+                paragraph._element.clear_content()
+                if imagen_firma is not None:
+                    paragraph.add_run().add_picture(BytesIO(imagen_firma), height=ALTURA_FIRMA)
+                continue
+
+            runs = paragraph.runs
+            if not runs:
+                continue
+            # Se unen los runs para reemplazar marcadores partidos; el texto
+            # resultante queda en el primer run, con su formato
+            texto = MARCADOR.sub(reemplazar, ''.join(run.text for run in runs))
+            for run in runs[1:]:
+                run.text = ''
+            run = runs[0]
+            run.text = texto
+            run.font.name = 'Arial'
+            run.font.size = Pt(11)
+
+        doc_io = BytesIO()
+        doc.save(doc_io)
+        doc_io.seek(0)
+        return doc_io
+
+
+@lru_cache(maxsize=None)
+def obtener_plantilla(ruta):
+    """Devuelve la plantilla compilada de ``ruta``, compilándola la primera vez."""
+    return PlantillaCompilada(ruta)
+
+
+def cargar_manifiesto(ruta):
+    """
+    Lee el manifiesto de plantillas del paquete.
+
+    El manifiesto es una lista JSON de objetos con ``plantilla`` (ruta del
+    ``.docx``, relativa al manifiesto) y ``archivo`` (nombre en el ZIP).
+
+    Returns:
+        list: Tuplas (ruta absoluta de la plantilla, nombre del archivo)
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    with open(ruta, encoding='utf-8') as f:
+        entradas = json.load(f)
+    return [
+        (os.path.join(directorio, entrada['plantilla']), entrada['archivo'])
+        for entrada in entradas
+    ]
+
+
+_renderizados = CacheLRU(MAX_DOCUMENTOS_RENDERIZADOS)
+
+
+def _renderizar(ruta, reemplazos, firma, hash_firma):
+    """Renderiza una plantilla o reutiliza el resultado para el mismo contexto."""
+    plantilla = obtener_plantilla(ruta)
+    clave = (
+        ruta,
+        tuple(sorted((nombre, str(reemplazos.get(nombre))) for nombre in plantilla.marcadores)),
+        hash_firma if plantilla.usa_firma else None,
+    )
+    contenido = _renderizados.obtener(clave)
+    if contenido is None:
+        contenido = plantilla.renderizar(reemplazos, firma).getvalue()
+        _renderizados.guardar(clave, contenido)
+    return BytesIO(contenido)
+
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS_RENDER, thread_name_prefix='plantilla')
+        return _ejecutor
+
+
+def renderizar_paquete(entradas, reemplazos, firma=None):
+    """
+    Renderiza varias plantillas en paralelo con el mismo contexto.
+
+    Args:
+        entradas: Tuplas (ruta de la plantilla, nombre del archivo)
+        reemplazos: Dict nombre del marcador (sin llaves) -> valor
+        firma: Imagen de la firma (bytes o BytesIO)
+
+    Returns:
+        list: Tuplas (nombre del archivo, BytesIO) en el orden de ``entradas``
+    """
+    imagen_firma = firma.getvalue() if hasattr(firma, 'getvalue') else firma
+    hash_firma = hashlib.sha256(imagen_firma).hexdigest() if imagen_firma else None
+    ejecutor = _obtener_ejecutor()
+    futuros = [
+        (archivo, ejecutor.submit(_renderizar, ruta, reemplazos, imagen_firma, hash_firma))
+        for ruta, archivo in entradas
+    ]
+    return [(archivo, futuro.result()) for archivo, futuro in futuros]
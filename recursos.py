@@ -0,0 +1,180 @@
+# recursos.py
+"""
+Recursos estáticos: binarios externos e imágenes de la interfaz.
+
+Los binarios que se ofrecen para descargar (el generador de constancias) se
+descargan a un cache en disco la primera vez que se necesitan, en un hilo en
+segundo plano y escribiendo por bloques, nunca todo en memoria. Se
+revalidan con ``ETag``/``Last-Modified`` como máximo una vez por intervalo,
+y si el origen no responde se sigue sirviendo la copia que ya está en disco.
+El archivo nunca se lee en el proceso: la interfaz lo enlaza desde la
+carpeta de archivos estáticos de Streamlit.
+
+Las imágenes de la interfaz se reducen una sola vez al ancho con que se
+muestran y se guardan junto a los binarios.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from PIL import Image
+
+from metricas import anotar, instrumentar
+
+DIR_RECURSOS = os.environ.get(
+    'COTIZACION_CACHE_RECURSOS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'recursos'),
+)
+REVALIDAR_CADA = float(os.environ.get('COTIZACION_RECURSOS_REVALIDAR_HORAS', '24')) * 3600
+TIMEOUT_DESCARGA = (5, 60)
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class RecursoRemoto:
+    """
+    Archivo externo cacheado en disco.
+
+    Args:
+        nombre: Nombre del archivo en el cache
+        url: Origen del archivo
+        directorio: Carpeta del cache
+        revalidar_cada: Segundos entre revalidaciones con el origen
+    """
+
+    def __init__(self, nombre, url, directorio=DIR_RECURSOS, revalidar_cada=REVALIDAR_CADA):
+        self.nombre = nombre
+        self.url = url
+        self.directorio = directorio
+        self.revalidar_cada = revalidar_cada
+        self.ruta = os.path.join(directorio, nombre)
+        self._ruta_meta = self.ruta + '.json'
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._verificado = 0.0
+
+    def _leer_meta(self):
+        try:
+            with open(self._ruta_meta, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar_meta(self, meta):
+        with open(self._ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def _vigente(self):
+        if not os.path.exists(self.ruta):
+            return False
+        verificado = max(self._verificado, self._leer_meta().get('verificado', 0.0))
+        return time.time() - verificado < self.revalidar_cada
+
+    @instrumentar('recursos')
+    def actualizar(self):
+        """
+        Descarga o revalida el archivo con el origen.
+
+        Returns:
+            str: Ruta del archivo en disco
+
+        Raises:
+            requests.RequestException: Si falla y no hay copia en disco
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        meta = self._leer_meta()
+        encabezados = {}
+        if os.path.exists(self.ruta):
+            if meta.get('etag'):
+                encabezados['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                encabezados['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            with requests.get(self.url, headers=encabezados, stream=True, timeout=TIMEOUT_DESCARGA) as r:
+                anotar(cache=r.status_code == 304)
+                if r.status_code != 304:
+                    r.raise_for_status()
+                    # Se escribe en un temporal y se reemplaza de forma atómica
+                    fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix=self.nombre + '.')
+                    try:
+                        with os.fdopen(fd, 'wb') as f:
+                            for bloque in r.iter_content(TAMANO_BLOQUE):
+                                f.write(bloque)
+                        os.replace(temporal, self.ruta)
+                        anotar(tamano=os.path.getsize(self.ruta))
+                    except BaseException:
+                        os.unlink(temporal)
+                        raise
+                    meta = {
+                        'etag': r.headers.get('ETag'),
+                        'last_modified': r.headers.get('Last-Modified'),
+                    }
+        except requests.RequestException:
+            if not os.path.exists(self.ruta):
+                raise
+            # Sin conexión con el origen: se sigue usando la copia en disco
+
+        self._verificado = time.time()
+        meta['verificado'] = self._verificado
+        self._guardar_meta(meta)
+        return self.ruta
+
+    def _actualizar_en_segundo_plano(self):
+        try:
+            self.actualizar()
+        except (OSError, requests.RequestException):
+            pass
+
+    def disponible(self):
+        """
+        Ruta del archivo si ya está en disco; si falta o hay que revalidarlo,
+        lanza la descarga en segundo plano (una sola a la vez).
+
+        Returns:
+            str: Ruta del archivo, o ``None`` si todavía no se descargó
+        """
+        with self._lock:
+            if not self._vigente() and (self._hilo is None or not self._hilo.is_alive()):
+                self._hilo = threading.Thread(
+                    target=self._actualizar_en_segundo_plano,
+                    name=f'recurso-{self.nombre}',
+                    daemon=True,
+                )
+                self._hilo.start()
+        return self.ruta if os.path.exists(self.ruta) else None
+
+
+@lru_cache(maxsize=None)
+def obtener_recurso(nombre, url, directorio=DIR_RECURSOS):
+    """Recurso remoto compartido por el proceso."""
+    return RecursoRemoto(nombre, url, directorio)
+
+
+@lru_cache(maxsize=None)
+def imagen_reducida(ruta, ancho, directorio=DIR_RECURSOS):
+    """
+    Versión de una imagen reducida a ``ancho`` píxeles, generada una sola vez.
+
+    Returns:
+        str: Ruta de la imagen reducida (o la original si ya es más angosta
+        o no se pudo escribir el cache)
+    """
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    destino = os.path.join(directorio, f'{base}-{ancho}.png')
+    try:
+        if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(ruta):
+            return destino
+        with Image.open(ruta) as image:
+            if image.width <= ancho:
+                return ruta
+            alto = max(1, round(image.height * ancho / image.width))
+            reducida = image.resize((ancho, alto), Image.LANCZOS)
+        os.makedirs(directorio, exist_ok=True)
+        reducida.save(destino, format='PNG', optimize=True)
+        return destino
+    except OSError:
+        return ruta
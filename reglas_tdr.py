@@ -0,0 +1,292 @@
+# reglas_tdr.py
+"""
+Catálogo declarativo de reglas para extraer campos de un TDR.
+
+Cada regla indica el campo que llena, un ancla (frase clave que marca dónde
+empieza la información) y el patrón local que se aplica a partir del ancla.
+Todas las anclas se combinan en una única expresión regular compilada al
+importar el módulo, de modo que el texto se recorre una sola vez sin
+importar cuántos campos se busquen; los patrones locales sólo se evalúan
+en las posiciones donde apareció su ancla.
+"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional, TypedDict
+
+FLAGS = re.IGNORECASE | re.DOTALL
+
+# Siguiente encabezado numerado en mayúsculas ("7. LUGAR ...", "8.1 CONFORMIDAD")
+_ENCABEZADO = r'\s+(?-i:\d{1,2}\.(?:\d{1,2}\.?)*\s*[A-ZÁÉÍÓÚÑ]{3,})'
+# Final de una sección: el siguiente encabezado o el final del texto
+_FIN_SECCION = rf'(?={_ENCABEZADO}|$)'
+# Final de una oración, de la sección o del texto
+_FIN_ORACION = rf'(?=\.\s|{_ENCABEZADO}|$)'
+# Número de sección delante de un encabezado ("10.", "7.1")
+_NUMERO_SECCION = r'\d{1,2}\.(?:\d{1,2}\.?)*\s*'
+
+NUMEROS_EN_LETRAS = {
+    'UN': 1, 'UNA': 1, 'UNICA': 1, 'ÚNICA': 1, 'UNICO': 1, 'ÚNICO': 1,
+    'DOS': 2, 'TRES': 3, 'CUATRO': 4, 'CINCO': 5, 'SEIS': 6,
+    'SIETE': 7, 'OCHO': 8, 'NUEVE': 9, 'DIEZ': 10, 'ONCE': 11, 'DOCE': 12,
+}
+
+
+class CamposTDR(TypedDict, total=False):
+    servicio: str
+    forma_pago: str
+    dias: str
+    numero_armadas: int
+    lugar_prestacion: str
+    entregables: str
+    penalidades: str
+    requisitos_proveedor: str
+
+
+@dataclass(frozen=True)
+class Regla:
+    """
+    Regla de extracción de un campo.
+
+    Attributes:
+        nombre: Identificador de la regla (se reporta junto al valor)
+        campo: Clave de ``CamposTDR`` que llena la regla
+        ancla: Expresión que localiza el inicio de la información
+        patron: Expresión evaluada desde la posición del ancla
+        formato: Convierte el match en el valor del campo; si devuelve
+            ``None`` la coincidencia se descarta (p. ej. un índice)
+        prioridad: Entre reglas del mismo campo gana la de mayor prioridad,
+            aunque aparezca después en el texto
+    """
+    nombre: str
+    campo: str
+    ancla: str
+    patron: str
+    formato: Callable[[re.Match], Optional[object]]
+    prioridad: int = 0
+
+
+def _espacios(match, grupo=1):
+    return ' '.join(match.group(grupo).split())
+
+
+def _mayusculas(match):
+    return _espacios(match).upper()
+
+
+def _seccion(match):
+    # Descarta capturas vacías o mínimas, típicas del índice del documento
+    texto = _espacios(match)
+    return texto if len(texto) >= 3 else None
+
+
+def _entero(match):
+    return int(match.group(1))
+
+
+def _numero_en_letras(match):
+    return NUMEROS_EN_LETRAS.get(match.group(1).upper())
+
+
+# Palabras que indican que un plazo pertenece a una cláusula de penalidad
+_PENALIDAD = re.compile(r'\b(?:penalidad(?:es)?|mora|demora|retraso|atraso)\b', FLAGS)
+# Caracteres de la oración que se revisan antes y después de la coincidencia
+_CONTEXTO_ORACION = 200
+
+
+def _oracion(match):
+    """Oración (acotada) que contiene la coincidencia."""
+    texto = match.string
+    inicio = max(match.start() - _CONTEXTO_ORACION, 0)
+    antes = texto[inicio:match.start()]
+    punto = antes.rfind('. ')
+    if punto >= 0:
+        antes = antes[punto + 2:]
+    despues = texto[match.end():match.end() + _CONTEXTO_ORACION]
+    punto = despues.find('. ')
+    if punto >= 0:
+        despues = despues[:punto]
+    return antes + match.group(0) + despues
+
+
+def _plazo_fuera_de_penalidad(match):
+    # "retraso en el plazo de ejecución de 5 días" describe la penalidad, no
+    # el plazo del servicio
+    if _PENALIDAD.search(_oracion(match)):
+        return None
+    return match.group(1)
+
+
+_ANCLA_PAGO = r'El pago se realizará en'
+_ANCLA_PLAZO = r'plazo de ejecución'
+
+REGLAS = (
+    Regla(
+        'objeto_finalidad', 'servicio',
+        ancla=r'2\.\s*OBJETO\s*DE\s*LA\s*CONTRATACION',
+        patron=r'2\.\s*OBJETO\s*DE\s*LA\s*CONTRATACION\s*(.*?)\s*3\.\s*FINALIDAD\s*PUBLICA',
+        formato=_espacios,
+    ),
+    Regla(
+        'pago_tras_conformidad', 'forma_pago',
+        ancla=_ANCLA_PAGO,
+        patron=_ANCLA_PAGO + r'\s*(.*?)\s*luego de la emisión de la conformidad del servicio,',
+        formato=_mayusculas,
+    ),
+    Regla(
+        'armadas_en_digitos', 'numero_armadas',
+        ancla=_ANCLA_PAGO,
+        patron=_ANCLA_PAGO + r'\s*(?:[A-ZÁÉÍÓÚÑ]+\s*)?\(\s*0?(\d{1,2})\s*\)\s*(?:armadas?|pagos?|cuotas?)',
+        formato=_entero,
+    ),
+    Regla(
+        'armadas_en_letras', 'numero_armadas',
+        ancla=_ANCLA_PAGO,
+        patron=_ANCLA_PAGO + r'\s*(' + '|'.join(NUMEROS_EN_LETRAS) + r')\s+(?:armadas?|pagos?|cuotas?)\b',
+        formato=_numero_en_letras,
+    ),
+    Regla(
+        'plazo_hasta', 'dias',
+        ancla=_ANCLA_PLAZO,
+        patron=_ANCLA_PLAZO + r' del servicio es de hasta\s*(\d+)\s*días calendario',
+        formato=lambda match: match.group(1),
+        # Un plazo de penalidad puede aparecer antes que el del servicio
+        prioridad=1,
+    ),
+    Regla(
+        'plazo_generico', 'dias',
+        ancla=_ANCLA_PLAZO,
+        patron=_ANCLA_PLAZO + r'(?: del servicio)?[^.]{0,60}?\(?(\d{1,3})\)?\s*días calendario',
+        formato=_plazo_fuera_de_penalidad,
+    ),
+    Regla(
+        'lugar_prestacion', 'lugar_prestacion',
+        ancla=r'lugar de (?:la )?(?:prestaci[oó]n|ejecuci[oó]n)',
+        patron=r'lugar de (?:la )?(?:prestaci[oó]n|ejecuci[oó]n)(?: del servicio)?\s*?:?\s*?(.{0,600}?)' + _FIN_ORACION,
+        formato=_seccion,
+    ),
+    # En las secciones siguientes los separadores tras el encabezado
+    # (``\s*?:?\s*?``) se consumen de forma perezosa para que una sección
+    # vacía (como en el índice) termine en el siguiente encabezado
+    Regla(
+        'entregables', 'entregables',
+        ancla=_NUMERO_SECCION + r'(?:de los\s+)?entregables?\b',
+        patron=_NUMERO_SECCION + r'(?:de los\s+)?entregables?\s*?:?\s*?(.{0,1500}?)' + _FIN_SECCION,
+        formato=_seccion,
+    ),
+    Regla(
+        'penalidades', 'penalidades',
+        ancla=_NUMERO_SECCION + r'penalidad(?:es)?\b',
+        patron=_NUMERO_SECCION + r'penalidad(?:es)?(?: por mora)?\s*?:?\s*?(.{0,1500}?)' + _FIN_SECCION,
+        formato=_seccion,
+    ),
+    Regla(
+        'requisitos_proveedor', 'requisitos_proveedor',
+        ancla=_NUMERO_SECCION + r'(?:requisitos|perfil)\s+(?:mínimos\s+)?del\s+(?:proveedor|postor|contratista)',
+        patron=(_NUMERO_SECCION + r'(?:requisitos|perfil)\s+(?:mínimos\s+)?del\s+(?:proveedor|postor|contratista)'
+                r'\s*?:?\s*?(.{0,1500}?)' + _FIN_SECCION),
+        formato=_seccion,
+    ),
+)
+
+
+class MotorReglas:
+    """
+    Aplica un catálogo de reglas en una sola pasada sobre el texto.
+
+    Las reglas que comparten ancla se agrupan; cada ancla distinta es una
+    alternativa con nombre de la expresión combinada. Para cada campo gana
+    la regla de mayor prioridad; entre reglas de igual prioridad, la primera
+    coincidencia válida en el orden del texto y, con la misma ancla, el
+    orden del catálogo. Un campo hallado con una regla de menor prioridad
+    sigue pendiente (es provisional) hasta que aparezca una mejor.
+    """
+
+    def __init__(self, reglas):
+        self.reglas = tuple(reglas)
+        self.campos = tuple(dict.fromkeys(regla.campo for regla in self.reglas))
+        self._prioridades = {regla.nombre: regla.prioridad for regla in self.reglas}
+        self._prioridad_maxima = {}
+        for regla in self.reglas:
+            self._prioridad_maxima[regla.campo] = max(
+                regla.prioridad, self._prioridad_maxima.get(regla.campo, regla.prioridad)
+            )
+
+        anclas = {}
+        for regla in self.reglas:
+            anclas.setdefault(regla.ancla, []).append(
+                (regla, re.compile(regla.patron, FLAGS))
+            )
+        self._reglas_por_ancla = {}
+        alternativas = []
+        for indice, (ancla, reglas_ancla) in enumerate(anclas.items()):
+            grupo = f'a{indice}'
+            self._reglas_por_ancla[grupo] = reglas_ancla
+            alternativas.append(f'(?P<{grupo}>{ancla})')
+        self._anclas = re.compile('|'.join(alternativas), FLAGS)
+
+    def prioridad(self, nombre_regla):
+        return self._prioridades[nombre_regla]
+
+    def es_definitiva(self, campo, nombre_regla):
+        """Indica si ninguna otra regla puede reemplazar el valor del campo."""
+        return self._prioridades[nombre_regla] == self._prioridad_maxima[campo]
+
+    def buscar(self, texto, pendientes=None):
+        """
+        Busca los campos en ``texto`` recorriéndolo una sola vez.
+
+        Args:
+            texto: Texto normalizado
+            pendientes: Campos a buscar (por defecto todos)
+
+        Returns:
+            tuple: (``CamposTDR`` con los campos encontrados,
+                dict campo -> nombre de la regla que lo produjo)
+        """
+        pendientes = set(self.campos if pendientes is None else pendientes)
+        campos = CamposTDR()
+        reglas_usadas = {}
+        for ancla in self._anclas.finditer(texto):
+            for regla, patron in self._reglas_por_ancla[ancla.lastgroup]:
+                if regla.campo not in pendientes:
+                    continue
+                anterior = reglas_usadas.get(regla.campo)
+                if anterior is not None and self._prioridades[anterior] >= regla.prioridad:
+                    continue
+                match = patron.match(texto, ancla.start())
+                if not match:
+                    continue
+                valor = regla.formato(match)
+                if valor is None:
+                    continue
+                campos[regla.campo] = valor
+                reglas_usadas[regla.campo] = regla.nombre
+                if self.es_definitiva(regla.campo, regla.nombre):
+                    pendientes.discard(regla.campo)
+            if not pendientes:
+                break
+        return campos, reglas_usadas
+
+
+MOTOR = MotorReglas(REGLAS)
+
+# Se incrementa al cambiar la lógica de las funciones de formato (por
+# ejemplo, qué coincidencias descartan), que la huella no puede ver
+REVISION_FORMATOS = 2
+
+
+def _huella_catalogo(reglas):
+    """Hash de lo que determina el resultado de cada regla."""
+    h = hashlib.sha256(str(REVISION_FORMATOS).encode('ascii'))
+    for regla in reglas:
+        h.update(repr((
+            regla.nombre, regla.campo, regla.ancla, regla.patron,
+            regla.formato.__name__, regla.prioridad,
+        )).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+# Versión de las extracciones guardadas en el cache persistente: cambia con
+# el catálogo, no con comentarios ni formato de este módulo
+VERSION_REGLAS = _huella_catalogo(REGLAS)
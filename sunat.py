@@ -0,0 +1,215 @@
+# sunat.py
+"""
+Consulta de datos de SUNAT por DNI (api.apis.net.pe).
+
+Todas las consultas pasan por un ``requests.Session`` compartido con
+conexiones keep-alive, timeouts explícitos de conexión y lectura, y
+reintentos acotados con backoff exponencial para errores transitorios.
+Las respuestas se guardan en un cache LRU en memoria con tiempo de vida y,
+opcionalmente, en un cache SQLite persistente indexado por DNI.
+
+La URL base se puede cambiar con ``COTIZACION_SUNAT_URL`` para probar la
+aplicación contra un servidor HTTP local.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache_memoria import CacheLRU
+from metricas import anotar, instrumentar
+
+URL_SUNAT = os.environ.get('COTIZACION_SUNAT_URL', 'https://api.apis.net.pe/v2/sunat/dni')
+TIMEOUT_CONEXION = float(os.environ.get('COTIZACION_SUNAT_TIMEOUT_CONEXION', '3'))
+TIMEOUT_LECTURA = float(os.environ.get('COTIZACION_SUNAT_TIMEOUT_LECTURA', '10'))
+REINTENTOS = int(os.environ.get('COTIZACION_SUNAT_REINTENTOS', '2'))
+TTL_CACHE_SUNAT = float(os.environ.get('COTIZACION_SUNAT_TTL_HORAS', '24')) * 3600
+MAX_DNI_EN_CACHE = 1024
+# Cache persistente opcional (vacío lo desactiva)
+RUTA_CACHE_SUNAT = os.environ.get('COTIZACION_CACHE_SUNAT', '')
+
+
+class ErrorSunat(Exception):
+    """No se pudo completar la consulta a SUNAT."""
+
+
+class DniNoEncontrado(ErrorSunat):
+    """SUNAT respondió, pero no devolvió datos para el DNI."""
+
+
+class SunatNoDisponible(ErrorSunat):
+    """SUNAT está saturado o caído (429 o 5xx después de los reintentos)."""
+
+
+@dataclass(frozen=True)
+class DatosSunat:
+    nombres: str
+    ruc: str
+
+
+class CacheSunatPersistente:
+    """
+    Cache SQLite de consultas por DNI, compartido entre procesos.
+
+    Args:
+        ruta: Archivo de la base de datos
+        ttl: Segundos que se considera vigente una consulta
+    """
+
+    def __init__(self, ruta, ttl=TTL_CACHE_SUNAT):
+        self.ruta = ruta
+        self.ttl = ttl
+        self._local = threading.local()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as con:
+            con.execute(
+                'CREATE TABLE IF NOT EXISTS sunat ('
+                'dni TEXT PRIMARY KEY, nombres TEXT NOT NULL, ruc TEXT NOT NULL, creado REAL NOT NULL)'
+            )
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute('PRAGMA journal_mode=WAL')
+            self._local.con = con
+        return con
+
+    def obtener(self, dni):
+        fila = self._conexion().execute(
+            'SELECT nombres, ruc FROM sunat WHERE dni = ? AND creado >= ?',
+            (dni, time.time() - self.ttl),
+        ).fetchone()
+        return DatosSunat(*fila) if fila else None
+
+    def guardar(self, dni, datos):
+        with self._conexion() as con:
+            con.execute(
+                'INSERT OR REPLACE INTO sunat (dni, nombres, ruc, creado) VALUES (?, ?, ?, ?)',
+                (dni, datos.nombres, datos.ruc, time.time()),
+            )
+
+
+class ClienteSunat:
+    """
+    Cliente de la API de SUNAT con pool de conexiones y caches.
+
+    Args:
+        token: Clave de apis.net.pe
+        url_base: URL del endpoint de consulta por DNI
+        timeout: Tupla (segundos de conexión, segundos de lectura)
+        reintentos: Reintentos ante errores de conexión, 429 y 5xx
+        cache_persistente: ``CacheSunatPersistente`` opcional
+    """
+
+    def __init__(self, token, url_base=URL_SUNAT, timeout=(TIMEOUT_CONEXION, TIMEOUT_LECTURA),
+                 reintentos=REINTENTOS, cache_persistente=None):
+        self.token = token
+        self.url_base = url_base
+        self.timeout = timeout
+        self.cache = CacheLRU(MAX_DNI_EN_CACHE, ttl=TTL_CACHE_SUNAT)
+        self.cache_persistente = cache_persistente
+
+        reintento = Retry(
+            total=reintentos,
+            connect=reintentos,
+            read=reintentos,
+            status=reintentos,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=reintento)
+        self.sesion = requests.Session()
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+
+    @instrumentar('sunat')
+    def consultar(self, dni):
+        """
+        Obtiene nombres y RUC de un DNI, usando los caches si es posible.
+
+        Returns:
+            DatosSunat: Nombres completos y RUC
+
+        Raises:
+            DniNoEncontrado: Si la API no devuelve datos para el DNI
+            ErrorSunat: Si falla la conexión o la respuesta no es válida
+        """
+        datos = self.cache.obtener(dni)
+        if datos is not None:
+            anotar(cache=True)
+            return datos
+
+        if self.cache_persistente is not None:
+            try:
+                datos = self.cache_persistente.obtener(dni)
+            except sqlite3.Error:
+                datos = None
+            if datos is not None:
+                self.cache.guardar(dni, datos)
+                anotar(cache=True)
+                return datos
+
+        anotar(cache=False)
+        datos = self._consultar_api(dni)
+        self.cache.guardar(dni, datos)
+        if self.cache_persistente is not None:
+            try:
+                self.cache_persistente.guardar(dni, datos)
+            except sqlite3.Error:
+                pass
+        return datos
+
+    def _consultar_api(self, dni):
+        try:
+            response = self.sesion.get(
+                self.url_base,
+                params={'numero': dni, 'token': self.token},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise ErrorSunat(str(e)) from e
+
+        anotar(tamano=len(response.content))
+        estado = response.status_code
+        if estado == 404:
+            raise DniNoEncontrado(f"SUNAT no encontró el DNI {dni}")
+        if estado in (401, 403):
+            raise ErrorSunat(f"SUNAT rechazó el token (respondió {estado})")
+        if estado == 429 or estado >= 500:
+            raise SunatNoDisponible(f"SUNAT no está disponible (respondió {estado})")
+        if estado != 200:
+            raise ErrorSunat(f"SUNAT respondió {estado} para el DNI {dni}")
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise ErrorSunat("Respuesta de SUNAT no válida") from e
+
+        if not isinstance(data, dict):
+            raise DniNoEncontrado(f"SUNAT no devolvió datos para el DNI {dni}")
+        nombres = f"{data.get('nombres') or ''} {data.get('apellidoPaterno') or ''} {data.get('apellidoMaterno') or ''}".strip()
+        if not nombres:
+            raise DniNoEncontrado(f"SUNAT no devolvió datos para el DNI {dni}")
+        return DatosSunat(nombres=nombres, ruc=data.get("ruc", ""))
+
+
+@lru_cache(maxsize=None)
+def obtener_cliente_sunat(token):
+    """Cliente compartido por el proceso para un token dado."""
+    cache_persistente = None
+    if RUTA_CACHE_SUNAT:
+        try:
+            cache_persistente = CacheSunatPersistente(RUTA_CACHE_SUNAT)
+        except (OSError, sqlite3.Error):
+            cache_persistente = None
+    return ClienteSunat(token, cache_persistente=cache_persistente)
@@ -0,0 +1,590 @@
+# tdr.py
+"""
+Extracción de datos de los Términos de Referencia (TDR).
+
+El PDF se procesa una sola vez por contenido: el texto y los campos
+extraídos se guardan en memoria indexados por el hash SHA-256 de los bytes
+del archivo, de modo que los reruns de Streamlit y la generación de la
+cotización reutilizan el resultado sin volver a abrir el PDF.
+
+Las páginas se leen una a una y el motor de reglas de ``reglas_tdr`` se
+aplica sobre una ventana deslizante que cubre el salto entre páginas; la
+lectura se detiene en cuanto todos los campos han sido encontrados.
+
+Para TDR muy extensos puede activarse la extracción en paralelo
+(``COTIZACION_TDR_PROCESOS``): los lotes de páginas se reparten entre un pool
+de procesos que abren el PDF desde un archivo temporal compartido, y los
+textos se reensamblan en orden antes de aplicar los patrones.
+
+Además del cache en memoria, los resultados se guardan en un cache SQLite
+(``cache_tdr``) compartido entre sesiones y procesos.
+
+El texto se obtiene a través de un backend intercambiable
+(``COTIZACION_PDF_BACKEND``): ``pdfplumber`` (por defecto) o ``pdfium``,
+mucho más rápido. Si el backend elegido no encuentra algún campo principal
+se recurre a pdfplumber para completarlo.
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from io import BytesIO
+from typing import Optional
+
+import pdfplumber
+from pdfminer.psparser import PSException
+
+from cache_memoria import CacheLRU
+from cache_tdr import obtener_cache_tdr
+from metricas import anotar, instrumentar
+from reglas_tdr import MOTOR, VERSION_REGLAS
+
+SERVICIO_NO_ENCONTRADO = "Servicio no encontrado"
+FORMA_PAGO_NO_ENCONTRADA = "FORMA DE PAGO NO ENCONTRADA"
+DIAS_NO_ENCONTRADOS = "DÍAS NO ENCONTRADOS"
+
+# Campos imprescindibles para la cotización; el resto es informativo
+CAMPOS_PRINCIPALES = ('servicio', 'forma_pago', 'dias')
+
+# Número máximo de documentos distintos que se mantienen en memoria
+MAX_DOCUMENTOS_EN_CACHE = 32
+
+# Caracteres de las páginas anteriores que se conservan al buscar en la
+# página actual, para encontrar secciones partidas entre dos páginas
+TAMANO_VENTANA = 6000
+
+# Una vez hallados los campos principales, páginas consecutivas sin ningún
+# hallazgo nuevo tras las cuales se deja de buscar los campos opcionales
+PAGINAS_SIN_HALLAZGOS = 10
+
+# Páginas tras las cuales un campo hallado con una regla de menor prioridad
+# se da por definitivo si no apareció una regla mejor
+PAGINAS_SIN_MEJORA = 10
+
+# Extracción en paralelo: número de procesos (0 o 1 la desactiva) y número
+# mínimo de páginas para usarla; por debajo del umbral se lee en serie
+PROCESOS_EXTRACCION = int(os.environ.get('COTIZACION_TDR_PROCESOS', '0'))
+UMBRAL_PAGINAS_PARALELO = int(os.environ.get('COTIZACION_TDR_UMBRAL_PAGINAS', '40'))
+PAGINAS_POR_LOTE = int(os.environ.get('COTIZACION_TDR_PAGINAS_POR_LOTE', '8'))
+
+
+class ErrorLecturaTDR(Exception):
+    """El archivo del TDR está dañado o no es un PDF."""
+
+
+@dataclass(frozen=True)
+class TDRDocument:
+    """
+    Resultado de procesar un TDR.
+
+    Attributes:
+        sha256: Hash del contenido del PDF
+        texto: Texto normalizado de las páginas analizadas
+        servicio: Objeto de la contratación
+        forma_pago: Forma de pago en mayúsculas
+        dias: Plazo de ejecución en días calendario
+        numero_armadas: Número de armadas del pago, si se pudo determinar
+        lugar_prestacion: Lugar de prestación del servicio
+        entregables: Sección de entregables
+        penalidades: Sección de penalidades
+        requisitos_proveedor: Requisitos o perfil del proveedor
+        reglas: Campo -> nombre de la regla de ``reglas_tdr`` que lo extrajo
+        paginas_leidas: Páginas abiertas antes de encontrar todos los campos
+        backend: Backend de texto que produjo el resultado
+    """
+    sha256: str
+    texto: str
+    servicio: str
+    forma_pago: str
+    dias: str
+    numero_armadas: Optional[int] = None
+    lugar_prestacion: str = ''
+    entregables: str = ''
+    penalidades: str = ''
+    requisitos_proveedor: str = ''
+    reglas: dict = field(default_factory=dict)
+    paginas_leidas: int = 0
+    backend: str = 'pdfplumber'
+
+
+_cache = CacheLRU(MAX_DOCUMENTOS_EN_CACHE)
+
+_ejecutor = None
+_procesos_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def leer_bytes(pdf_file):
+    """
+    Obtiene los bytes de un PDF sin alterar la posición del archivo.
+
+    Args:
+        pdf_file: Ruta, bytes o archivo subido (objeto tipo BytesIO)
+
+    Returns:
+        bytes: Contenido del archivo
+    """
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as f:
+            return f.read()
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    posicion = pdf_file.tell()
+    pdf_file.seek(0)
+    contenido = pdf_file.read()
+    pdf_file.seek(posicion)
+    return contenido
+
+
+def normalizar_texto(texto):
+    return ' '.join(texto.split())
+
+
+class BackendPdfplumber:
+    """
+    Backend de texto basado en pdfplumber (pdfminer con análisis de layout).
+
+    Es el más lento pero el de referencia: los patrones de los campos se
+    escribieron contra su salida.
+    """
+    nombre = 'pdfplumber'
+
+    def errores_lectura(self):
+        """Excepciones con que la biblioteca rechaza un PDF dañado."""
+        return (PSException,)
+
+    def contar_paginas(self, fuente):
+        with pdfplumber.open(_como_archivo(fuente)) as pdf:
+            return len(pdf.pages)
+
+    def iterar_paginas(self, fuente, inicio=0, fin=None):
+        with pdfplumber.open(_como_archivo(fuente)) as pdf:
+            for pagina in pdf.pages[inicio:fin]:
+                texto = pagina.extract_text()
+                # Liberar los objetos de layout de la página ya procesada
+                pagina.close()
+                yield texto or ''
+
+
+class BackendPdfium:
+    """
+    Backend de texto basado en pypdfium2 (PDFium, código nativo).
+
+    Varias veces más rápido que pdfplumber. PDFium no es seguro entre hilos,
+    así que cada llamada a la biblioteca se serializa con un candado global.
+    """
+    nombre = 'pdfium'
+    _lock = threading.Lock()
+
+    def errores_lectura(self):
+        import pypdfium2
+
+        return (pypdfium2.PdfiumError,)
+
+    def contar_paginas(self, fuente):
+        import pypdfium2
+
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(fuente)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def iterar_paginas(self, fuente, inicio=0, fin=None):
+        import pypdfium2
+
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(fuente)
+        try:
+            with self._lock:
+                total = len(pdf)
+            for indice in range(inicio, total if fin is None else min(fin, total)):
+                with self._lock:
+                    pagina = pdf[indice]
+                    pagina_texto = pagina.get_textpage()
+                    texto = pagina_texto.get_text_bounded()
+                    pagina_texto.close()
+                    pagina.close()
+                yield texto or ''
+        finally:
+            with self._lock:
+                pdf.close()
+
+
+BACKENDS = {
+    BackendPdfplumber.nombre: BackendPdfplumber,
+    BackendPdfium.nombre: BackendPdfium,
+}
+
+# Backend usado para leer el TDR y backend de respaldo cuando el primero no
+# encuentra algún campo (sólo se usa si son distintos)
+BACKEND_PDF = os.environ.get('COTIZACION_PDF_BACKEND', BackendPdfplumber.nombre)
+BACKEND_RESPALDO = BackendPdfplumber.nombre
+
+# Versión del formato de TDRDocument y del análisis de páginas; se incrementa
+# al cambiarlos para no servir extracciones viejas del cache persistente
+ESQUEMA_TDR = 1
+VERSION_CACHE_TDR = f'{ESQUEMA_TDR}-{VERSION_REGLAS}-{BACKEND_PDF}'
+
+
+def obtener_backend(nombre=None):
+    """
+    Devuelve una instancia del backend de texto indicado.
+
+    Args:
+        nombre: Clave en ``BACKENDS`` (por defecto ``BACKEND_PDF``)
+
+    Raises:
+        ValueError: Si el backend no existe
+    """
+    nombre = nombre or BACKEND_PDF
+    try:
+        return BACKENDS[nombre]()
+    except KeyError:
+        raise ValueError(
+            f"Backend de PDF desconocido: {nombre!r}. Opciones: {', '.join(BACKENDS)}"
+        ) from None
+
+
+def _como_archivo(fuente):
+    return BytesIO(fuente) if isinstance(fuente, (bytes, bytearray)) else fuente
+
+
+def iterar_paginas(contenido, backend=None):
+    """
+    Genera el texto normalizado de cada página del PDF, en orden.
+
+    Las páginas sin texto extraíble (``extract_text()`` devuelve ``None``)
+    producen una cadena vacía. Al cerrar el generador se cierra el PDF, por
+    lo que las páginas restantes nunca llegan a analizarse.
+
+    Args:
+        contenido: Bytes del PDF
+        backend: Nombre del backend de texto (por defecto ``BACKEND_PDF``)
+
+    Yields:
+        str: Texto de la página con los espacios colapsados
+    """
+    for texto in obtener_backend(backend).iterar_paginas(contenido):
+        yield normalizar_texto(texto)
+
+
+def contar_paginas(contenido, backend=None):
+    return obtener_backend(backend).contar_paginas(contenido)
+
+
+def _extraer_lote(ruta, inicio, fin, backend):
+    """
+    Extrae el texto de las páginas ``[inicio, fin)`` en un proceso del pool.
+
+    Returns:
+        list: Texto normalizado de cada página del lote, en orden
+    """
+    paginas = obtener_backend(backend).iterar_paginas(ruta, inicio, fin)
+    return [normalizar_texto(texto) for texto in paginas]
+
+
+def _obtener_ejecutor(procesos):
+    """Devuelve el pool compartido, recreándolo si cambia el número de procesos."""
+    global _ejecutor, _procesos_ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is not None and _procesos_ejecutor != procesos:
+            # Los lotes ya enviados al pool anterior terminan por su cuenta
+            _ejecutor.shutdown(wait=False)
+            _ejecutor = None
+        if _ejecutor is None:
+            if _procesos_ejecutor is None:
+                atexit.register(_cerrar_ejecutor)
+            # spawn evita heredar los hilos del servidor de Streamlit
+            _ejecutor = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _procesos_ejecutor = procesos
+        return _ejecutor
+
+
+def _cerrar_ejecutor():
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is not None:
+            _ejecutor.shutdown(wait=False, cancel_futures=True)
+            _ejecutor = None
+
+
+def iterar_paginas_en_paralelo(contenido, procesos=None, paginas_por_lote=None, backend=None,
+                               total=None):
+    """
+    Igual que ``iterar_paginas`` pero repartiendo lotes de páginas entre
+    varios procesos.
+
+    Se mantienen en vuelo como máximo dos lotes por proceso y los textos se
+    entregan en el orden original de las páginas. Al cerrar el generador se
+    cancelan los lotes pendientes, de modo que la salida temprana de
+    ``escanear_campos`` sigue evitando el trabajo innecesario.
+
+    Args:
+        contenido: Bytes del PDF
+        procesos: Número de procesos (por defecto ``PROCESOS_EXTRACCION``)
+        paginas_por_lote: Páginas por tarea (por defecto ``PAGINAS_POR_LOTE``)
+        backend: Nombre del backend de texto (por defecto ``BACKEND_PDF``)
+        total: Número de páginas, si ya se contó (evita abrir el PDF otra vez)
+
+    Yields:
+        str: Texto de la página con los espacios colapsados
+    """
+    procesos = procesos or PROCESOS_EXTRACCION
+    paginas_por_lote = paginas_por_lote or PAGINAS_POR_LOTE
+    backend = backend or BACKEND_PDF
+    if total is None:
+        total = contar_paginas(contenido, backend)
+    ejecutor = _obtener_ejecutor(procesos)
+
+    # Los procesos abren el PDF desde disco en lugar de recibir los bytes
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+        tmp.write(contenido)
+        ruta = tmp.name
+
+    inicios = iter(range(0, total, paginas_por_lote))
+    en_vuelo = deque()
+
+    def enviar_lote():
+        inicio = next(inicios, None)
+        if inicio is not None:
+            fin = min(inicio + paginas_por_lote, total)
+            en_vuelo.append(ejecutor.submit(_extraer_lote, ruta, inicio, fin, backend))
+
+    try:
+        for _ in range(procesos * 2):
+            enviar_lote()
+        while en_vuelo:
+            textos = en_vuelo.popleft().result()
+            enviar_lote()
+            yield from textos
+    finally:
+        for futuro in en_vuelo:
+            futuro.cancel()
+        os.unlink(ruta)
+
+
+def _iterar_paginas_tdr(contenido, backend):
+    """Elige la lectura en serie o en paralelo según la configuración."""
+    if PROCESOS_EXTRACCION > 1:
+        total = contar_paginas(contenido, backend)
+        if total >= UMBRAL_PAGINAS_PARALELO:
+            return iterar_paginas_en_paralelo(contenido, backend=backend, total=total)
+    return iterar_paginas(contenido, backend)
+
+
+def escanear_campos(paginas, tamano_ventana=TAMANO_VENTANA):
+    """
+    Busca los campos del TDR de forma incremental, página por página.
+
+    Cada página se concatena a la cola de las anteriores (hasta
+    ``tamano_ventana`` caracteres) y sobre esa ventana se aplica el motor de
+    reglas sólo para los campos pendientes. Un campo hallado con una regla de
+    menor prioridad sigue pendiente, por si aparece una regla mejor, durante
+    ``PAGINAS_SIN_MEJORA`` páginas; después se da por definitivo. La
+    iteración se detiene cuando todos los campos son definitivos, o cuando
+    ya lo son los principales y pasan ``PAGINAS_SIN_HALLAZGOS`` páginas sin
+    encontrar ninguno nuevo.
+
+    Args:
+        paginas: Iterable con el texto normalizado de cada página
+        tamano_ventana: Caracteres de contexto que se arrastran entre páginas
+
+    Returns:
+        tuple: (campos encontrados, dict campo -> regla usada,
+            lista de textos leídos)
+    """
+    encontrados = {}
+    reglas = {}
+    definitivos = set()
+    # Campo provisional -> páginas leídas desde que se encontró
+    provisionales = {}
+    leidas = []
+    ventana = ''
+    paginas_sin_hallazgos = 0
+    for texto_pagina in paginas:
+        leidas.append(texto_pagina)
+        ventana = f"{ventana} {texto_pagina}" if ventana else texto_pagina
+
+        pendientes = [campo for campo in MOTOR.campos if campo not in definitivos]
+        nuevos, reglas_nuevas = MOTOR.buscar(ventana, pendientes)
+        hallazgo = False
+        for campo, valor in nuevos.items():
+            regla = reglas_nuevas[campo]
+            # La ventana arrastra texto ya visto: un valor de igual prioridad
+            # es el mismo o uno posterior y no reemplaza al anterior
+            if campo in reglas and MOTOR.prioridad(regla) <= MOTOR.prioridad(reglas[campo]):
+                continue
+            encontrados[campo] = valor
+            reglas[campo] = regla
+            hallazgo = True
+            if MOTOR.es_definitiva(campo, regla):
+                definitivos.add(campo)
+                provisionales.pop(campo, None)
+            else:
+                provisionales[campo] = 0
+
+        for campo in list(provisionales):
+            provisionales[campo] += 1
+            if provisionales[campo] > PAGINAS_SIN_MEJORA:
+                definitivos.add(campo)
+                del provisionales[campo]
+
+        if len(definitivos) == len(MOTOR.campos):
+            break
+        if all(campo in definitivos for campo in CAMPOS_PRINCIPALES):
+            paginas_sin_hallazgos = 0 if hallazgo else paginas_sin_hallazgos + 1
+            if paginas_sin_hallazgos >= PAGINAS_SIN_HALLAZGOS:
+                break
+        ventana = ventana[-tamano_ventana:]
+
+    return encontrados, reglas, leidas
+
+
+def analizar_contenido(contenido, backend=None):
+    """
+    Lee el PDF con un backend concreto y busca los campos, sin cache ni
+    respaldo.
+
+    Args:
+        contenido: Bytes del PDF
+        backend: Nombre del backend de texto (por defecto ``BACKEND_PDF``)
+
+    Returns:
+        tuple: (campos encontrados, dict campo -> regla usada,
+            lista de textos leídos)
+
+    Raises:
+        ErrorLecturaTDR: Si el backend no puede leer el PDF
+    """
+    backend = backend or BACKEND_PDF
+    try:
+        # Contar las páginas (modo paralelo) ya abre el PDF
+        paginas = _iterar_paginas_tdr(contenido, backend)
+        try:
+            return escanear_campos(paginas)
+        finally:
+            # Cierra el PDF aunque queden páginas sin leer
+            paginas.close()
+    except obtener_backend(backend).errores_lectura() as e:
+        raise ErrorLecturaTDR(f"No se pudo leer el PDF del TDR: {e}") from e
+
+
+def buscar_documento(sha256, persistente=True):
+    """
+    Busca un TDR ya analizado, primero en memoria y luego en el cache
+    persistente; un acierto en este último se copia a memoria.
+
+    Args:
+        sha256: Hash del contenido del PDF
+        persistente: Si es ``False`` sólo se busca en memoria
+
+    Returns:
+        TDRDocument: Documento guardado, o ``None`` si no está en ningún cache
+    """
+    documento = _cache.obtener(sha256)
+    if documento is not None or not persistente:
+        return documento
+
+    cache_persistente = obtener_cache_tdr()
+    if cache_persistente is None:
+        return None
+    try:
+        datos = cache_persistente.obtener(sha256, VERSION_CACHE_TDR)
+    except sqlite3.Error:
+        return None
+    if datos is None:
+        return None
+    try:
+        documento = TDRDocument(**datos)
+    except TypeError:
+        # Campos que ya no existen en TDRDocument: cuenta como fallo
+        try:
+            cache_persistente.eliminar(sha256, VERSION_CACHE_TDR)
+        except sqlite3.Error:
+            pass
+        return None
+    _cache.guardar(sha256, documento)
+    return documento
+
+
+@instrumentar('tdr')
+def extraer_datos_tdr(pdf_file, sha256=None, persistente_consultado=False):
+    """
+    Punto de entrada único para obtener los datos de un TDR.
+
+    El PDF se analiza una sola vez por contenido; las llamadas siguientes con
+    el mismo archivo devuelven el resultado memorizado, primero en memoria y
+    luego en el cache persistente compartido entre procesos. Si el backend
+    configurado no encuentra algún campo principal, el documento se vuelve a
+    leer con el backend de respaldo y se completan los campos que falten.
+
+    Args:
+        pdf_file: Ruta, bytes o archivo subido
+        sha256: Hash del contenido, si quien llama ya lo calculó
+        persistente_consultado: ``True`` si quien llama ya buscó el TDR con
+            ``buscar_documento`` sin encontrarlo; sólo se revisa la memoria,
+            por si otra sesión lo analizó mientras tanto
+
+    Returns:
+        TDRDocument: Texto y campos extraídos del TDR
+
+    Raises:
+        ErrorLecturaTDR: Si el archivo está dañado o no es un PDF
+    """
+    contenido = leer_bytes(pdf_file)
+    anotar(tamano=len(contenido))
+    sha256 = sha256 or hashlib.sha256(contenido).hexdigest()
+
+    documento = buscar_documento(sha256, persistente=not persistente_consultado)
+    if documento is not None:
+        anotar(cache=True)
+        return documento
+
+    anotar(cache=False)
+    backend = BACKEND_PDF
+    encontrados, reglas, leidas = analizar_contenido(contenido, backend)
+    faltan_principales = any(campo not in encontrados for campo in CAMPOS_PRINCIPALES)
+    if faltan_principales and backend != BACKEND_RESPALDO:
+        backend = BACKEND_RESPALDO
+        encontrados_respaldo, reglas_respaldo, leidas = analizar_contenido(contenido, backend)
+        encontrados = {**encontrados_respaldo, **encontrados}
+        reglas = {**reglas_respaldo, **reglas}
+
+    documento = TDRDocument(
+        sha256=sha256,
+        texto=' '.join(texto for texto in leidas if texto),
+        servicio=encontrados.get('servicio', SERVICIO_NO_ENCONTRADO),
+        forma_pago=encontrados.get('forma_pago', FORMA_PAGO_NO_ENCONTRADA),
+        dias=encontrados.get('dias', DIAS_NO_ENCONTRADOS),
+        numero_armadas=encontrados.get('numero_armadas'),
+        lugar_prestacion=encontrados.get('lugar_prestacion', ''),
+        entregables=encontrados.get('entregables', ''),
+        penalidades=encontrados.get('penalidades', ''),
+        requisitos_proveedor=encontrados.get('requisitos_proveedor', ''),
+        reglas=reglas,
+        paginas_leidas=len(leidas),
+        backend=backend,
+    )
+
+    _cache.guardar(sha256, documento)
+    cache_persistente = obtener_cache_tdr()
+    if cache_persistente is not None:
+        try:
+            cache_persistente.guardar(sha256, asdict(documento), VERSION_CACHE_TDR)
+        except sqlite3.Error:
+            pass
+    return documento
+
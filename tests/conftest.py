@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de la aplicación están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Las pruebas no comparten el cache persistente de TDR del repositorio
+os.environ.setdefault('COTIZACION_CACHE_TDR', '')
+
+
+@pytest.fixture(scope='session')
+def corpus_tdr(tmp_path_factory):
+    """Carpeta con el corpus sintético de TDR (no se versiona)."""
+    from benchmarks.generar_corpus_tdr import generar
+
+    carpeta = tmp_path_factory.mktemp('corpus_tdr')
+    generar(str(carpeta))
+    return carpeta
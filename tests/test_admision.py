@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from admision import ColaLlena, Etapa, EsperaAgotada
+
+
+class AvisoInterrumpido(BaseException):
+    """Imita la RerunException/StopException con que Streamlit corta el script."""
+
+
+def ocupar(etapa, liberar):
+    ocupada = threading.Event()
+
+    def trabajo():
+        with etapa.turno():
+            ocupada.set()
+            liberar.wait(5)
+
+    hilo = threading.Thread(target=trabajo)
+    hilo.start()
+    ocupada.wait(5)
+    return hilo
+
+
+def test_aviso_que_lanza_no_deja_el_ticket_en_la_cola():
+    etapa = Etapa('prueba', 1, max_en_cola=2, espera_maxima=5)
+    liberar = threading.Event()
+    hilo = ocupar(etapa, liberar)
+
+    def aviso(posicion):
+        raise AvisoInterrumpido
+
+    with pytest.raises(AvisoInterrumpido):
+        with etapa.turno(aviso):
+            pass
+    assert etapa.estado() == {'activas': 1, 'en_cola': 0, 'limite': 1}
+
+    liberar.set()
+    hilo.join()
+    # La etapa sigue aceptando solicitudes
+    with etapa.turno():
+        assert etapa.estado()['activas'] == 1
+    assert etapa.estado() == {'activas': 0, 'en_cola': 0, 'limite': 1}
+
+
+def test_espera_agotada_libera_la_cola():
+    etapa = Etapa('prueba', 1, max_en_cola=2, espera_maxima=0.1)
+    liberar = threading.Event()
+    hilo = ocupar(etapa, liberar)
+
+    with pytest.raises(EsperaAgotada):
+        with etapa.turno():
+            pass
+    assert etapa.estado()['en_cola'] == 0
+    liberar.set()
+    hilo.join()
+
+
+def test_cola_llena_rechaza_de_inmediato():
+    etapa = Etapa('prueba', 1, max_en_cola=0, espera_maxima=5)
+    liberar = threading.Event()
+    hilo = ocupar(etapa, liberar)
+
+    inicio = time.monotonic()
+    with pytest.raises(ColaLlena):
+        with etapa.turno():
+            pass
+    assert time.monotonic() - inicio < 1
+    liberar.set()
+    hilo.join()
@@ -0,0 +1,110 @@
+import http.client
+import json
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import tdr
+from api import ServidorCotizaciones
+
+LIMITE = b'limite-de-prueba'
+TDR_DANADO = b'%PDF-1.4 basura'
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorCotizaciones(('127.0.0.1', 0), hilos=2, cola=2)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+    hilo.join()
+
+
+@pytest.fixture
+def firma_png():
+    imagen = Image.new('RGB', (200, 80), 'white')
+    imagen.paste((0, 0, 0), (20, 30, 180, 40))
+    salida = BytesIO()
+    imagen.save(salida, format='PNG')
+    return salida.getvalue()
+
+
+def multipart(partes):
+    cuerpo = b''
+    for nombre, contenido in partes.items():
+        cuerpo += (b'--' + LIMITE + b'\r\nContent-Disposition: form-data; name="'
+                   + nombre.encode() + b'"\r\n\r\n' + contenido + b'\r\n')
+    return cuerpo + b'--' + LIMITE + b'--\r\n'
+
+
+def enviar(servidor, ruta, cuerpo, tipo):
+    conexion = http.client.HTTPConnection(*servidor.server_address, timeout=30)
+    try:
+        conexion.request('POST', ruta, cuerpo, {'Content-Type': tipo})
+        respuesta = conexion.getresponse()
+        return respuesta.status, json.loads(respuesta.read())
+    finally:
+        conexion.close()
+
+
+def datos(**cambios):
+    base = {
+        'dni': '12345678', 'telefono': '999888777', 'correo': 'a@b.pe',
+        'banco': 'BCP', 'cuenta': '191-1234567-0-12', 'oferta': 1500,
+        'direccion': 'Av. Lima 123', 'nombres': 'PRUEBA', 'ruc': '10123456781',
+    }
+    return json.dumps({**base, **cambios}).encode()
+
+
+@pytest.mark.parametrize('campo', ['oferta', 'banco'])
+def test_valor_no_escalar_en_datos_es_422(servidor, firma_png, campo):
+    cuerpo = multipart({'tdr': TDR_DANADO, 'firma': firma_png, 'datos': datos(**{campo: [1]})})
+
+    estado, respuesta = enviar(servidor, '/cotizaciones', cuerpo,
+                               'multipart/form-data; boundary=' + LIMITE.decode())
+
+    assert estado == 422
+    assert 'error' in respuesta
+
+
+def test_coordenadas_no_escalares_son_422(servidor, firma_png):
+    cuerpo = multipart({'tdr': TDR_DANADO, 'firma': firma_png,
+                        'datos': datos(direccion='', lat=[1], lon={'x': 2})})
+
+    estado, _ = enviar(servidor, '/cotizaciones', cuerpo,
+                       'multipart/form-data; boundary=' + LIMITE.decode())
+
+    assert estado == 422
+
+
+@pytest.mark.parametrize('procesos', [0, 2])
+def test_tdr_danado_en_cotizacion_es_422(servidor, firma_png, monkeypatch, procesos):
+    monkeypatch.setattr(tdr, 'PROCESOS_EXTRACCION', procesos)
+    cuerpo = multipart({'tdr': TDR_DANADO, 'firma': firma_png, 'datos': datos()})
+
+    estado, _ = enviar(servidor, '/cotizaciones', cuerpo,
+                       'multipart/form-data; boundary=' + LIMITE.decode())
+
+    assert estado == 422
+
+
+@pytest.mark.parametrize('procesos', [0, 2])
+def test_tdr_danado_en_extraccion_es_422(servidor, monkeypatch, procesos):
+    monkeypatch.setattr(tdr, 'PROCESOS_EXTRACCION', procesos)
+
+    estado, _ = enviar(servidor, '/tdr/extract', TDR_DANADO, 'application/pdf')
+
+    assert estado == 422
+
+
+def test_firma_ilegible_es_422(servidor):
+    cuerpo = multipart({'tdr': TDR_DANADO, 'firma': b'no es una imagen', 'datos': datos()})
+
+    estado, _ = enviar(servidor, '/cotizaciones', cuerpo,
+                       'multipart/form-data; boundary=' + LIMITE.decode())
+
+    assert estado == 422
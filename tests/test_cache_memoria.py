@@ -0,0 +1,31 @@
+from cache_memoria import CacheLRU
+
+
+def test_descarta_las_mas_antiguas_al_superar_max_bytes():
+    cache = CacheLRU(10, max_bytes=10)
+    cache.guardar('a', b'x' * 4)
+    cache.guardar('b', b'x' * 4)
+    cache.obtener('a')
+    cache.guardar('c', b'x' * 4)
+
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.bytes == 8
+
+
+def test_reemplazar_una_entrada_no_acumula_bytes():
+    cache = CacheLRU(10, max_bytes=10)
+    cache.guardar('a', b'x' * 6)
+    cache.guardar('a', b'x' * 6)
+
+    assert cache.bytes == 6
+    assert len(cache) == 1
+
+
+def test_conserva_la_entrada_mas_reciente_aunque_supere_el_limite():
+    cache = CacheLRU(10, max_bytes=10)
+    cache.guardar('a', b'x' * 4)
+    cache.guardar('grande', b'x' * 20)
+
+    assert 'a' not in cache
+    assert cache.obtener('grande') == b'x' * 20
@@ -0,0 +1,62 @@
+import sqlite3
+import time
+
+from cache_tdr import CacheTDR
+
+DATOS = {'sha256': 'abc', 'servicio': 'Limpieza', 'dias': '30', 'texto': 'texto del TDR ' * 50}
+
+
+def test_guarda_y_recupera_el_texto_y_los_campos(tmp_path):
+    cache = CacheTDR(str(tmp_path / 'tdr.sqlite3'))
+    cache.guardar('abc', DATOS, 'v1')
+
+    assert cache.obtener('abc', 'v1') == DATOS
+    assert cache.estadisticas()['aciertos'] == 1
+
+
+def test_otra_version_no_reutiliza_la_entrada(tmp_path):
+    cache = CacheTDR(str(tmp_path / 'tdr.sqlite3'))
+    cache.guardar('abc', DATOS, 'v1')
+
+    assert cache.obtener('abc', 'v2') is None
+    assert cache.estadisticas()['fallos'] == 1
+
+
+def test_se_comparte_entre_instancias(tmp_path):
+    ruta = str(tmp_path / 'tdr.sqlite3')
+    CacheTDR(ruta).guardar('abc', DATOS, 'v1')
+
+    assert CacheTDR(ruta).obtener('abc', 'v1') == DATOS
+
+
+def test_entradas_vencidas_no_se_devuelven(tmp_path):
+    cache = CacheTDR(str(tmp_path / 'tdr.sqlite3'), max_edad=0.05)
+    cache.guardar('abc', DATOS)
+    time.sleep(0.1)
+
+    assert cache.obtener('abc') is None
+
+
+def test_al_superar_el_limite_se_elimina_la_menos_usada(tmp_path):
+    cache = CacheTDR(str(tmp_path / 'tdr.sqlite3'))
+    cache.guardar('viejo', DATOS)
+    cache.guardar('usado', DATOS)
+    cache.max_bytes = cache.estadisticas()['bytes']
+    time.sleep(0.01)
+    cache.obtener('viejo')
+    cache.guardar('nuevo', DATOS)
+
+    assert cache.obtener('usado') is None
+    assert cache.obtener('viejo') == DATOS
+    assert cache.obtener('nuevo') == DATOS
+
+
+def test_fila_corrupta_se_elimina_y_cuenta_como_fallo(tmp_path):
+    ruta = str(tmp_path / 'tdr.sqlite3')
+    cache = CacheTDR(ruta)
+    cache.guardar('abc', DATOS)
+    with sqlite3.connect(ruta) as con:
+        con.execute("UPDATE tdr SET texto = x'00'")
+
+    assert cache.obtener('abc') is None
+    assert cache.estadisticas() == {'aciertos': 0, 'fallos': 1, 'entradas': 0, 'bytes': 0}
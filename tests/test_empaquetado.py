@@ -0,0 +1,54 @@
+import os
+import zipfile
+from io import BytesIO
+
+from empaquetado import empaquetar
+
+
+def test_cada_tipo_de_contenido_llega_intacto_al_zip(tmp_path):
+    ruta = tmp_path / 'tdr.pdf'
+    ruta.write_bytes(b'%PDF' + os.urandom(2000))
+    docx = BytesIO(os.urandom(3000))
+    docx.seek(1500)
+    texto = b'linea de texto\n' * 200
+    with open(ruta, 'rb') as archivo:
+        paquete = empaquetar([
+            ('cotizacion.docx', docx),
+            ('firma.png', b'\x89PNG' + os.urandom(500)),
+            ('tdr.pdf', str(ruta)),
+            ('copia.pdf', archivo),
+            ('notas.txt', texto),
+        ])
+
+    with paquete.archivo, zipfile.ZipFile(paquete.archivo) as zipf:
+        assert zipf.read('cotizacion.docx') == docx.getvalue()
+        assert zipf.read('tdr.pdf') == zipf.read('copia.pdf') == ruta.read_bytes()
+        assert zipf.read('notas.txt') == texto
+        metodos = {info.filename: info.compress_type for info in zipf.infolist()}
+    # El buffer de origen no se mueve
+    assert docx.tell() == 1500
+    assert metodos == {
+        'cotizacion.docx': zipfile.ZIP_STORED,
+        'firma.png': zipfile.ZIP_STORED,
+        'tdr.pdf': zipfile.ZIP_STORED,
+        'copia.pdf': zipfile.ZIP_STORED,
+        'notas.txt': zipfile.ZIP_DEFLATED,
+    }
+    assert [(nombre, tamano) for nombre, tamano, _ in paquete.entradas][-1] == ('notas.txt', len(texto))
+
+
+def test_tamano_y_posicion_del_archivo():
+    paquete = empaquetar([('a.png', b'x' * 100)])
+
+    with paquete.archivo:
+        assert paquete.archivo.tell() == 0
+        assert len(paquete.archivo.read()) == paquete.tamano
+
+
+def test_el_zip_pasa_a_disco_al_superar_el_umbral():
+    pequeno = empaquetar([('a.png', b'x' * 100)], umbral=10_000)
+    grande = empaquetar([('a.png', os.urandom(20_000))], umbral=10_000)
+
+    with pequeno.archivo, grande.archivo:
+        assert not pequeno.archivo._rolled
+        assert grande.archivo._rolled
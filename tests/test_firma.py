@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import firma
+from firma import (
+    ErrorImagenFirma,
+    altura_objetivo,
+    escala_de_grises,
+    fondo_uniforme,
+    procesar_firma,
+    remover_fondo_clasico,
+    umbral_otsu,
+)
+
+
+def escaneo(fondo=235, tinta=30, tamano=(400, 160)):
+    """Trazo oscuro sobre papel claro con un poco de ruido, como un escaneo."""
+    aleatorio = np.random.default_rng(3)
+    gris = np.clip(aleatorio.normal(fondo, 4, tamano[::-1]), 0, 255)
+    gris[60:100, 80:320] = tinta
+    return Image.fromarray(gris.astype(np.uint8), 'L').convert('RGB')
+
+
+def png(image):
+    salida = BytesIO()
+    image.save(salida, format='PNG')
+    return salida.getvalue()
+
+
+def test_umbral_separa_tinta_y_papel():
+    gris = escala_de_grises(escaneo())
+
+    assert 30 <= umbral_otsu(gris) < 220
+
+
+def test_fondo_claro_es_uniforme_y_una_foto_no():
+    ruido = np.random.default_rng(5).integers(0, 255, (160, 400), dtype=np.uint8)
+
+    assert fondo_uniforme(escala_de_grises(escaneo()))
+    assert not fondo_uniforme(escala_de_grises(Image.fromarray(ruido, 'L')))
+
+
+def test_remover_fondo_clasico_vuelve_transparente_el_papel_y_recorta():
+    resultado = remover_fondo_clasico(escaneo())
+    alfa = np.asarray(resultado)[..., 3]
+
+    assert resultado.mode == 'RGBA'
+    assert resultado.size == (240 + 2 * firma.MARGEN_RECORTE, 40 + 2 * firma.MARGEN_RECORTE)
+    assert alfa[firma.MARGEN_RECORTE + 20, firma.MARGEN_RECORTE + 120] == 255
+    assert alfa[0, 0] == 0
+
+
+def test_modo_auto_no_usa_rembg_en_un_escaneo(monkeypatch):
+    def rembg_no_disponible(image):
+        raise AssertionError('no debería llamarse a rembg')
+
+    monkeypatch.setattr(firma, 'remover_fondo_rembg', rembg_no_disponible)
+
+    resultado = Image.open(BytesIO(procesar_firma(png(escaneo(fondo=236)), True, 'auto')))
+
+    assert resultado.mode == 'RGBA'
+    assert resultado.height <= altura_objetivo()
+
+
+def test_modo_auto_usa_rembg_con_fondo_complejo(monkeypatch):
+    llamadas = []
+
+    def rembg_falso(image):
+        llamadas.append(image.size)
+        return image.convert('RGBA')
+
+    monkeypatch.setattr(firma, 'remover_fondo_rembg', rembg_falso)
+    ruido = np.random.default_rng(9).integers(0, 255, (160, 400, 3), dtype=np.uint8)
+
+    procesar_firma(png(Image.fromarray(ruido, 'RGB')), True, 'auto')
+
+    assert llamadas
+
+
+def test_imagen_invalida():
+    with pytest.raises(ErrorImagenFirma):
+        procesar_firma(b'no es una imagen')
+
+
+def test_sesion_rembg_se_construye_una_vez_con_hilos_concurrentes(monkeypatch):
+    construidas = []
+
+    def new_session(modelo):
+        construidas.append(modelo)
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setitem(sys.modules, 'rembg', SimpleNamespace(new_session=new_session))
+    monkeypatch.setattr(firma, '_sesiones_rembg', {})
+    sesiones = []
+    hilos = [
+        threading.Thread(target=lambda: sesiones.append(firma.obtener_sesion_rembg('u2netp')))
+        for _ in range(4)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert construidas == ['u2netp']
+    assert len(sesiones) == 4 and len({id(sesion) for sesion in sesiones}) == 1
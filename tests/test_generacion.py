@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from generacion import ErrorEtapa, Tarea, ejecutar_tareas
+
+
+def test_devuelve_los_resultados_por_nombre():
+    resultados = ejecutar_tareas([
+        Tarea('suma', lambda a, b: a + b, (1, 2)),
+        Tarea('texto', str.upper, ('tdr',), timeout=5),
+    ])
+
+    assert resultados == {'suma': 3, 'texto': 'TDR'}
+
+
+def test_timeout_lanza_error_etapa_sin_causa():
+    liberar = threading.Event()
+
+    inicio = time.monotonic()
+    with pytest.raises(ErrorEtapa) as error:
+        ejecutar_tareas([Tarea('tdr', liberar.wait, (5,), timeout=0.1)])
+    liberar.set()
+
+    assert time.monotonic() - inicio < 2
+    assert error.value.etapa == 'tdr'
+    assert error.value.causa is None
+
+
+def test_excepcion_de_una_tarea_conserva_la_causa():
+    causa = ValueError('firma ilegible')
+
+    def fallar():
+        raise causa
+
+    with pytest.raises(ErrorEtapa) as error:
+        ejecutar_tareas([Tarea('sunat', time.sleep, (0.01,)), Tarea('firma', fallar)])
+
+    assert error.value.etapa == 'firma'
+    assert error.value.causa is causa
+    assert 'firma ilegible' in str(error.value)
+
+
+def test_timeout_se_cuenta_desde_el_lanzamiento():
+    # La segunda tarea ya consumió su plazo mientras se esperaba a la primera
+    with pytest.raises(ErrorEtapa) as error:
+        ejecutar_tareas([
+            Tarea('sunat', time.sleep, (0.3,)),
+            Tarea('tdr', time.sleep, (1,), timeout=0.2),
+        ])
+
+    assert error.value.etapa == 'tdr'
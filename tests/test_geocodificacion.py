@@ -0,0 +1,69 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from geopy.exc import GeocoderTimedOut
+
+from geocodificacion import ErrorGeocodificacion, ServicioGeocodificacion, centro_geohash, geohash
+
+LAT, LON = -12.0464, -77.0428
+
+
+class NominatimFalso:
+    """Falla la primera consulta y demora las siguientes."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.consultando = threading.Event()
+
+    def reverse(self, punto):
+        self.consultas += 1
+        if self.consultas == 1:
+            time.sleep(0.1)
+            raise GeocoderTimedOut('sin respuesta')
+        self.consultando.set()
+        time.sleep(0.3)
+        return SimpleNamespace(address='Av. Abancay, Lima')
+
+
+def test_celda_se_consulta_una_vez_aunque_falle_la_primera_consulta():
+    servicio = ServicioGeocodificacion(tasa=1000, modo='nominatim')
+    servicio.geolocator = NominatimFalso()
+    resultados = []
+
+    def consultar():
+        try:
+            resultados.append(servicio.direccion(LAT, LON))
+        except ErrorGeocodificacion:
+            resultados.append('error')
+
+    primera = threading.Thread(target=consultar)
+    segunda = threading.Thread(target=consultar)
+    primera.start()
+    time.sleep(0.02)
+    segunda.start()
+    # Llega una tercera sesión mientras la segunda reintenta la celda
+    assert servicio.geolocator.consultando.wait(5)
+    tercera = threading.Thread(target=consultar)
+    tercera.start()
+    for hilo in (primera, segunda, tercera):
+        hilo.join(5)
+
+    assert servicio.geolocator.consultas == 2
+    assert sorted(resultados) == ['Av. Abancay, Lima', 'Av. Abancay, Lima', 'error']
+    assert servicio._en_curso == {}
+
+
+def test_modo_offline_no_consulta_nominatim():
+    servicio = ServicioGeocodificacion(modo='offline')
+    servicio.geolocator = None
+
+    assert servicio.direccion(LAT, LON)
+
+
+@pytest.mark.parametrize('lat, lon', [(LAT, LON), (0.0, 0.0), (-89.9, 179.9)])
+def test_centro_de_la_celda_cae_en_la_misma_celda(lat, lon):
+    celda = geohash(lat, lon)
+
+    assert geohash(*centro_geohash(celda)) == celda
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+
+import lote
+
+PROVEEDOR = {
+    'dni': '12345678', 'telefono': '999888777', 'correo': 'a@b.pe', 'direccion': 'Av. Lima 123',
+    'banco': 'BCP', 'cuenta': '19112345670', 'cci': '00219100123456701254', 'oferta': '1500',
+    'nombres': 'PRUEBA', 'ruc': '10123456781', 'remover_fondo': False,
+}
+
+
+class ArchivoRoto:
+    """Falla a mitad de la copia, como un disco lleno."""
+
+    def read(self, tamano=-1):
+        raise OSError('sin espacio')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_copia_fallida_no_deja_el_parcial(tmp_path, monkeypatch):
+    firma = tmp_path / 'firma.png'
+    firma.write_bytes(b'png')
+    monkeypatch.setattr(lote, 'procesar_firma', lambda contenido, remover_fondo: contenido)
+    monkeypatch.setattr(lote, 'generar_paquete',
+                        lambda *args, **kwargs: SimpleNamespace(archivo=ArchivoRoto(), tamano=0))
+    destino = tmp_path / 'salida.zip'
+
+    with pytest.raises(OSError):
+        lote.generar('tdr.pdf', {**PROVEEDOR, 'firma': str(firma)}, str(destino))
+
+    assert list(tmp_path.iterdir()) == [firma]
@@ -0,0 +1,89 @@
+import re
+
+import pytest
+
+import metricas
+from metricas import Histograma, anotar, exportar_prometheus, instrumentar, medir, observar
+
+
+@pytest.fixture(autouse=True)
+def registros_vacios(monkeypatch):
+    monkeypatch.setattr(metricas, '_metricas', {})
+    monkeypatch.setattr(metricas, '_histogramas', {})
+    monkeypatch.setattr(metricas, '_contadores', {})
+    monkeypatch.setattr(metricas, '_colectores', [])
+
+
+def test_buckets_incluyen_su_limite_superior():
+    histograma = Histograma((1, 2, 4))
+
+    for valor in (0.5, 1, 1.5, 2, 3, 10):
+        histograma.observar(valor)
+
+    assert histograma.conteos == [2, 2, 1, 1]
+    assert histograma.cantidad == 6
+    assert histograma.suma == pytest.approx(18)
+
+
+def test_cuantil_interpola_dentro_del_bucket():
+    histograma = Histograma((1, 2, 4))
+    for valor in (0.5, 1.5, 1.5, 3):
+        histograma.observar(valor)
+
+    assert histograma.cuantil(0.25) == pytest.approx(1.0)
+    assert histograma.cuantil(0.5) == pytest.approx(1.5)
+    assert histograma.cuantil(1.0) == pytest.approx(4.0)
+
+
+def test_cuantil_sin_observaciones_o_sobre_el_ultimo_limite():
+    histograma = Histograma((1, 2, 4))
+
+    assert histograma.cuantil(0.5) is None
+    histograma.observar(100)
+    assert histograma.cuantil(0.99) == 4
+
+
+def test_exportacion_de_histogramas_en_formato_prometheus():
+    with medir('tdr'):
+        anotar(tamano=2048, cache=False)
+
+    @instrumentar('firma')
+    def fallar():
+        raise ValueError('ilegible')
+
+    with pytest.raises(ValueError):
+        fallar()
+
+    texto = exportar_prometheus()
+    lineas = texto.splitlines()
+
+    assert texto.endswith('\n')
+    assert '# TYPE cotizacion_etapa_segundos histogram' in lineas
+    buckets = [l for l in lineas if l.startswith('cotizacion_etapa_segundos_bucket{etapa="tdr"')]
+    assert len(buckets) == len(metricas.BUCKETS_SEGUNDOS) + 1
+    assert buckets[-1] == 'cotizacion_etapa_segundos_bucket{etapa="tdr",le="+Inf"} 1'
+    # Los buckets son acumulativos
+    conteos = [int(l.rsplit(' ', 1)[1]) for l in buckets]
+    assert conteos == sorted(conteos)
+    assert re.search(r'^cotizacion_etapa_segundos_sum\{etapa="tdr"\} \d', texto, re.M)
+    assert 'cotizacion_etapa_segundos_count{etapa="tdr"} 1' in lineas
+    assert 'cotizacion_etapa_bytes_bucket{etapa="tdr",le="1024"} 0' in lineas
+    assert 'cotizacion_etapa_bytes_bucket{etapa="tdr",le="4096"} 1' in lineas
+    assert 'cotizacion_etapa_bytes_sum{etapa="tdr"} 2048.0' in lineas
+    assert '# TYPE cotizacion_etapa_errores_total counter' in lineas
+    assert 'cotizacion_etapa_errores_total{etapa="firma"} 1' in lineas
+    assert 'cotizacion_etapa_cache_fallos_total{etapa="tdr"} 1' in lineas
+
+
+def test_exportacion_de_resumenes_y_colectores():
+    observar('mapa_render_segundos', 0.25)
+    observar('mapa_render_segundos', 0.5)
+    metricas.registrar_colector(lambda: [('cola_espera', {'etapa': 'tdr "pdf"'}, 3)])
+
+    lineas = exportar_prometheus().splitlines()
+
+    assert '# TYPE cotizacion_mapa_render_segundos summary' in lineas
+    assert 'cotizacion_mapa_render_segundos_sum 0.75' in lineas
+    assert 'cotizacion_mapa_render_segundos_count 2' in lineas
+    assert '# TYPE cotizacion_cola_espera gauge' in lineas
+    assert 'cotizacion_cola_espera{etapa="tdr \\"pdf\\""} 3' in lineas
@@ -0,0 +1,82 @@
+from io import BytesIO
+
+import pytest
+from docx import Document
+from PIL import Image
+
+import plantilla
+from plantilla import PlantillaCompilada, obtener_plantilla, renderizar_paquete
+
+
+@pytest.fixture
+def ruta_plantilla(tmp_path):
+    doc = Document()
+    parrafo = doc.add_paragraph()
+    # Word suele partir un marcador en varios runs
+    parrafo.add_run('Oferta: {{ofe')
+    parrafo.add_run('rta}} soles')
+    doc.add_paragraph('Sin marcadores')
+    tabla = doc.add_table(rows=1, cols=2)
+    tabla.cell(0, 0).text = 'DNI {{dni}} {{desconocido}}'
+    tabla.cell(0, 1).text = '{{firma}}'
+    ruta = tmp_path / 'plantilla.docx'
+    doc.save(ruta)
+    return str(ruta)
+
+
+@pytest.fixture
+def firma_png():
+    salida = BytesIO()
+    Image.new('RGBA', (120, 40), (0, 0, 0, 255)).save(salida, format='PNG')
+    return salida.getvalue()
+
+
+def textos(documento):
+    doc = Document(documento)
+    return [p.text for p in doc.paragraphs] + [c.text for c in doc.tables[0].rows[0].cells]
+
+
+def test_indexa_los_marcadores_al_compilar(ruta_plantilla):
+    compilada = PlantillaCompilada(ruta_plantilla)
+
+    assert compilada.marcadores == {'oferta', 'dni', 'desconocido'}
+    assert compilada.usa_firma
+
+
+def test_reemplaza_marcadores_partidos_y_conserva_los_desconocidos(ruta_plantilla, firma_png):
+    documento = PlantillaCompilada(ruta_plantilla).renderizar({'oferta': 1500, 'dni': '12345678'}, firma_png)
+
+    assert textos(documento) == [
+        'Oferta: 1500 soles', 'Sin marcadores', 'DNI 12345678 {{desconocido}}', '',
+    ]
+    assert len(Document(documento).inline_shapes) == 1
+
+
+def test_renderizar_no_altera_la_plantilla_compilada(ruta_plantilla):
+    compilada = obtener_plantilla(ruta_plantilla)
+    compilada.renderizar({'oferta': 1, 'dni': 'a'})
+
+    assert obtener_plantilla(ruta_plantilla) is compilada
+    assert textos(compilada.renderizar({'oferta': 2, 'dni': 'b'}))[0] == 'Oferta: 2 soles'
+
+
+def test_paquete_solo_renderiza_de_nuevo_si_cambian_sus_marcadores(ruta_plantilla, firma_png, monkeypatch):
+    llamadas = []
+    renderizar = PlantillaCompilada.renderizar
+
+    def contar(self, reemplazos, firma=None):
+        llamadas.append(reemplazos)
+        return renderizar(self, reemplazos, firma)
+
+    monkeypatch.setattr(PlantillaCompilada, 'renderizar', contar)
+    monkeypatch.setattr(plantilla, '_renderizados', plantilla.CacheLRU(8))
+    entradas = [(ruta_plantilla, 'cotizacion.docx')]
+
+    primero = renderizar_paquete(entradas, {'oferta': 100, 'dni': '1', 'correo': 'a@b.pe'}, firma_png)
+    # correo no aparece en la plantilla
+    segundo = renderizar_paquete(entradas, {'oferta': 100, 'dni': '1', 'correo': 'c@d.pe'}, firma_png)
+    renderizar_paquete(entradas, {'oferta': 200, 'dni': '1', 'correo': 'c@d.pe'}, firma_png)
+
+    assert len(llamadas) == 2
+    assert primero[0][0] == 'cotizacion.docx'
+    assert primero[0][1].getvalue() == segundo[0][1].getvalue()
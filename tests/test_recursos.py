@@ -0,0 +1,100 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from recursos import RecursoRemoto
+
+
+class ManejadorRecurso(BaseHTTPRequestHandler):
+    """Sirve ``servidor.contenido`` con su ETag y responde 304 si no cambió."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        with servidor.lock:
+            servidor.consultas.append(self.headers.get('If-None-Match'))
+            contenido, etag, truncar = servidor.contenido, servidor.etag, servidor.truncar
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        # Con truncar se corta la conexión a mitad del cuerpo
+        self.wfile.write(contenido[:len(contenido) // 2] if truncar else contenido)
+        if truncar:
+            self.close_connection = True
+
+    def log_message(self, formato, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorRecurso)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.consultas = []
+    servidor.contenido, servidor.etag, servidor.truncar = b'MZ' + b'\0' * 4096, '"v1"', False
+    servidor.url = f'http://127.0.0.1:{servidor.server_address[1]}/constancia.exe'
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def leer(ruta):
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+
+def test_primera_descarga_en_segundo_plano(servidor, tmp_path):
+    recurso = RecursoRemoto('constancia.exe', servidor.url, str(tmp_path))
+
+    assert recurso.disponible() is None
+    recurso._hilo.join(5)
+
+    assert recurso.disponible() == recurso.ruta
+    assert leer(recurso.ruta) == servidor.contenido
+    # Vigente: no se vuelve a consultar el origen
+    assert servidor.consultas == [None]
+
+
+def test_revalida_con_etag_sin_volver_a_descargar(servidor, tmp_path):
+    recurso = RecursoRemoto('constancia.exe', servidor.url, str(tmp_path), revalidar_cada=0)
+    recurso.actualizar()
+    modificado = os.path.getmtime(recurso.ruta)
+
+    recurso.actualizar()
+
+    assert servidor.consultas == [None, '"v1"']
+    assert os.path.getmtime(recurso.ruta) == modificado
+
+
+def test_version_nueva_reemplaza_la_copia(servidor, tmp_path):
+    recurso = RecursoRemoto('constancia.exe', servidor.url, str(tmp_path), revalidar_cada=0)
+    recurso.actualizar()
+    servidor.contenido, servidor.etag = b'MZ nueva version', '"v2"'
+
+    recurso.actualizar()
+
+    assert leer(recurso.ruta) == b'MZ nueva version'
+    assert sorted(os.listdir(tmp_path)) == ['constancia.exe', 'constancia.exe.json']
+
+
+def test_descarga_cortada_conserva_la_copia_anterior(servidor, tmp_path):
+    recurso = RecursoRemoto('constancia.exe', servidor.url, str(tmp_path), revalidar_cada=0)
+    recurso.actualizar()
+    anterior = leer(recurso.ruta)
+    servidor.contenido, servidor.etag, servidor.truncar = b'MZ' + b'\1' * 65536, '"v2"', True
+
+    assert recurso.actualizar() == recurso.ruta
+
+    assert leer(recurso.ruta) == anterior
+    assert sorted(os.listdir(tmp_path)) == ['constancia.exe', 'constancia.exe.json']
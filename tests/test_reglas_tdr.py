@@ -0,0 +1,100 @@
+import pytest
+
+from reglas_tdr import MOTOR
+
+
+def test_plazo_de_la_penalidad_no_reemplaza_al_plazo_del_servicio():
+    texto = (
+        "En caso de retraso en el plazo de ejecución de 5 días calendario se aplicará "
+        "una penalidad. El plazo de ejecución del servicio es de hasta 30 días calendario."
+    )
+
+    campos, reglas = MOTOR.buscar(texto, ['dias'])
+
+    assert campos == {'dias': '30'}
+    assert reglas == {'dias': 'plazo_hasta'}
+
+
+def test_extrae_los_campos_en_una_sola_pasada():
+    texto = (
+        "2. OBJETO DE LA CONTRATACION Contratar el servicio de limpieza "
+        "3. FINALIDAD PUBLICA Mantener los ambientes. "
+        "El plazo de ejecución del servicio es de hasta 45 días calendario. "
+        "El pago se realizará en DOS (02) ARMADAS, luego de la emisión de la conformidad del servicio, "
+        "previa presentación del comprobante."
+    )
+
+    campos, _ = MOTOR.buscar(texto)
+
+    assert campos['servicio'] == 'Contratar el servicio de limpieza'
+    assert campos['dias'] == '45'
+    assert campos['forma_pago'] == 'DOS (02) ARMADAS,'
+    assert campos['numero_armadas'] == 2
+
+
+def test_armadas_en_letras():
+    campos, reglas = MOTOR.buscar("El pago se realizará en UNA ARMADA, luego de", ['numero_armadas'])
+
+    assert campos == {'numero_armadas': 1}
+    assert reglas == {'numero_armadas': 'armadas_en_letras'}
+
+
+def test_secciones_vacias_del_indice_se_descartan():
+    texto = (
+        "INDICE 9. ENTREGABLES 10. PENALIDADES "
+        "9. ENTREGABLES Informe final al término del servicio. "
+        "10. PENALIDADES Una penalidad por cada día de atraso."
+    )
+
+    campos, _ = MOTOR.buscar(texto, ['entregables', 'penalidades'])
+
+    assert campos['entregables'] == 'Informe final al término del servicio.'
+    assert campos['penalidades'] == 'Una penalidad por cada día de atraso.'
+
+
+def test_un_plazo_de_pago_no_cuenta_como_armada():
+    texto = "El pago se realizará en un plazo máximo de diez (10) días"
+
+    campos, _ = MOTOR.buscar(texto, ['numero_armadas'])
+
+    assert 'numero_armadas' not in campos
+
+
+def test_plazo_generico_cuando_no_hay_plazo_hasta():
+    texto = "El plazo de ejecución será de sesenta (60) días calendario, contados desde"
+
+    campos, reglas = MOTOR.buscar(texto, ['dias'])
+
+    assert campos == {'dias': '60'}
+    assert reglas == {'dias': 'plazo_generico'}
+
+
+@pytest.mark.parametrize('texto', [
+    "En caso de retraso en el plazo de ejecución de 5 días calendario se aplicará una penalidad.",
+    "Si se excede el plazo de ejecución en 3 días calendario se aplicará la penalidad por mora.",
+])
+def test_plazo_de_una_penalidad_no_es_el_plazo_del_servicio(texto):
+    campos, _ = MOTOR.buscar(texto, ['dias'])
+
+    assert 'dias' not in campos
+
+
+def test_penalidad_en_otra_oracion_no_descarta_el_plazo():
+    texto = (
+        "Se aplicará una penalidad por cada día de atraso. "
+        "El plazo de ejecución será de sesenta (60) días calendario."
+    )
+
+    campos, _ = MOTOR.buscar(texto, ['dias'])
+
+    assert campos == {'dias': '60'}
+
+
+def test_version_cambia_con_el_catalogo_y_no_con_el_archivo():
+    from dataclasses import replace
+
+    from reglas_tdr import REGLAS, VERSION_REGLAS, _huella_catalogo
+
+    assert _huella_catalogo(REGLAS) == VERSION_REGLAS
+    cambiadas = (replace(REGLAS[0], prioridad=REGLAS[0].prioridad + 1),) + REGLAS[1:]
+    assert _huella_catalogo(cambiadas) != VERSION_REGLAS
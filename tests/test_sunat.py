@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import sunat
+from benchmarks.servidores_stub import DNI_INEXISTENTE, StubSunat, iniciar
+from sunat import (
+    CacheSunatPersistente,
+    ClienteSunat,
+    DatosSunat,
+    DniNoEncontrado,
+    ErrorSunat,
+    SunatNoDisponible,
+)
+
+RESPUESTA = {'nombres': 'ANA', 'apellidoPaterno': 'QUISPE', 'apellidoMaterno': 'ROJAS', 'ruc': '10456789011'}
+
+
+class ManejadorGuionado(BaseHTTPRequestHandler):
+    """Responde a cada DNI con la siguiente respuesta de su guion y cuenta las consultas."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        dni = parse_qs(urlparse(self.path).query)['numero'][0]
+        servidor = self.server
+        with servidor.lock:
+            servidor.consultas[dni] = servidor.consultas.get(dni, 0) + 1
+            guion = servidor.guiones[dni]
+            estado, datos, demora = guion.pop(0) if len(guion) > 1 else guion[0]
+        if demora:
+            time.sleep(demora)
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ManejadorGuionado)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.consultas = {}
+    servidor.guiones = {}
+    servidor.url = f'http://127.0.0.1:{servidor.server_address[1]}/'
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def cliente(servidor, **opciones):
+    opciones.setdefault('reintentos', 1)
+    opciones.setdefault('timeout', (1, 2))
+    return ClienteSunat('token', url_base=servidor.url, **opciones)
+
+
+def test_contra_el_stub_de_benchmarks():
+    stub = iniciar(StubSunat, 0)
+    try:
+        cliente_stub = ClienteSunat('stub', url_base=f'http://127.0.0.1:{stub.server_address[1]}/')
+
+        assert cliente_stub.consultar('12345678') == DatosSunat('PRUEBA CARGA LOCAL', '10123456781')
+        with pytest.raises(DniNoEncontrado):
+            cliente_stub.consultar(DNI_INEXISTENTE)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+
+def test_respuesta_valida_se_guarda_en_cache(servidor):
+    servidor.guiones['12345678'] = [(200, RESPUESTA, 0)]
+    consulta = cliente(servidor)
+
+    primera = consulta.consultar('12345678')
+    segunda = consulta.consultar('12345678')
+
+    assert primera == segunda == DatosSunat('ANA QUISPE ROJAS', '10456789011')
+    assert servidor.consultas['12345678'] == 1
+
+
+def test_cache_expira_tras_el_ttl(servidor, monkeypatch):
+    monkeypatch.setattr(sunat, 'TTL_CACHE_SUNAT', 0.05)
+    servidor.guiones['12345678'] = [(200, RESPUESTA, 0)]
+    consulta = cliente(servidor)
+
+    consulta.consultar('12345678')
+    time.sleep(0.1)
+    consulta.consultar('12345678')
+
+    assert servidor.consultas['12345678'] == 2
+
+
+@pytest.mark.parametrize('estado, datos', [(404, {'message': 'not found'}), (200, {}), (200, [])])
+def test_dni_inexistente_o_sin_datos(servidor, estado, datos):
+    servidor.guiones['00000000'] = [(estado, datos, 0)]
+
+    with pytest.raises(DniNoEncontrado):
+        cliente(servidor).consultar('00000000')
+    assert servidor.consultas['00000000'] == 1
+
+
+@pytest.mark.parametrize('estado', [401, 403])
+def test_token_rechazado_no_se_reintenta(servidor, estado):
+    servidor.guiones['12345678'] = [(estado, {'message': 'unauthorized'}, 0)]
+
+    with pytest.raises(ErrorSunat) as error:
+        cliente(servidor).consultar('12345678')
+    assert not isinstance(error.value, (DniNoEncontrado, SunatNoDisponible))
+    assert servidor.consultas['12345678'] == 1
+
+
+@pytest.mark.parametrize('estado', [429, 500, 503])
+def test_saturado_tras_los_reintentos(servidor, estado):
+    servidor.guiones['12345678'] = [(estado, {'message': 'busy'}, 0)]
+
+    with pytest.raises(SunatNoDisponible):
+        cliente(servidor, reintentos=1).consultar('12345678')
+    assert servidor.consultas['12345678'] == 2
+
+
+def test_error_transitorio_se_recupera_con_un_reintento(servidor):
+    servidor.guiones['12345678'] = [(503, {'message': 'busy'}, 0), (200, RESPUESTA, 0)]
+
+    datos = cliente(servidor, reintentos=1).consultar('12345678')
+
+    assert datos.ruc == '10456789011'
+    assert servidor.consultas['12345678'] == 2
+
+
+def test_timeout_de_lectura(servidor):
+    servidor.guiones['12345678'] = [(200, RESPUESTA, 0.5)]
+
+    inicio = time.monotonic()
+    with pytest.raises(ErrorSunat):
+        cliente(servidor, reintentos=0, timeout=(1, 0.1)).consultar('12345678')
+    assert time.monotonic() - inicio < 0.5
+
+
+def test_cache_persistente_se_comparte_entre_clientes(servidor, tmp_path):
+    servidor.guiones['12345678'] = [(200, RESPUESTA, 0)]
+    ruta = str(tmp_path / 'sunat.sqlite3')
+
+    cliente(servidor, cache_persistente=CacheSunatPersistente(ruta)).consultar('12345678')
+    datos = cliente(servidor, cache_persistente=CacheSunatPersistente(ruta)).consultar('12345678')
+
+    assert datos.nombres == 'ANA QUISPE ROJAS'
+    assert servidor.consultas['12345678'] == 1
@@ -0,0 +1,84 @@
+import hashlib
+
+import pytest
+
+import tdr
+from cache_memoria import CacheLRU
+from cache_tdr import CacheTDR
+from tdr import ErrorLecturaTDR, analizar_contenido, buscar_documento, escanear_campos, extraer_datos_tdr
+
+
+def test_plazo_hasta_en_una_pagina_posterior_gana_al_plazo_generico():
+    paginas = [
+        "En caso de retraso en el plazo de ejecución de 5 días calendario se aplicará una penalidad.",
+        "El plazo de ejecución del servicio es de hasta 30 días calendario.",
+    ]
+
+    encontrados, reglas, leidas = escanear_campos(paginas)
+
+    assert encontrados['dias'] == '30'
+    assert reglas['dias'] == 'plazo_hasta'
+    assert len(leidas) == 2
+
+
+@pytest.mark.parametrize('backend', ['pdfplumber', 'pdfium'])
+def test_pdf_danado_en_modo_paralelo_es_error_de_lectura(monkeypatch, backend):
+    monkeypatch.setattr(tdr, 'PROCESOS_EXTRACCION', 2)
+
+    with pytest.raises(ErrorLecturaTDR):
+        analizar_contenido(b'%PDF-1.4 basura', backend)
+
+
+def test_el_pool_se_recrea_si_cambia_el_numero_de_procesos():
+    try:
+        uno = tdr._obtener_ejecutor(1)
+        assert tdr._obtener_ejecutor(1) is uno
+        dos = tdr._obtener_ejecutor(2)
+        assert dos is not uno
+        assert dos._max_workers == 2
+    finally:
+        tdr._cerrar_ejecutor()
+
+
+def test_buscar_documento_consulta_el_cache_persistente_una_vez(monkeypatch, tmp_path, corpus_tdr):
+    cache = CacheTDR(str(tmp_path / 'tdr.sqlite3'))
+    monkeypatch.setattr(tdr, 'obtener_cache_tdr', lambda: cache)
+    monkeypatch.setattr(tdr, '_cache', CacheLRU(4))
+    contenido = (corpus_tdr / 'tdr_corto.pdf').read_bytes()
+    sha256 = hashlib.sha256(contenido).hexdigest()
+
+    assert buscar_documento(sha256) is None
+    documento = extraer_datos_tdr(contenido, sha256, persistente_consultado=True)
+    # Un TDR nuevo cuenta un solo fallo en el cache persistente
+    assert cache.estadisticas()['fallos'] == 1
+    # Otro proceso: memoria vacía, mismo cache persistente
+    monkeypatch.setattr(tdr, '_cache', CacheLRU(4))
+
+    assert buscar_documento(sha256) == documento
+    assert sha256 in tdr._cache
+    assert cache.estadisticas()['aciertos'] == 1
+
+
+@pytest.mark.filterwarnings('error')
+def test_pdfium_extrae_los_campos_del_corpus_sin_avisos(corpus_tdr):
+    from benchmarks.generar_corpus_tdr import ESPERADOS
+
+    for nombre, esperados in ESPERADOS.items():
+        encontrados, _, _ = analizar_contenido((corpus_tdr / nombre).read_bytes(), 'pdfium')
+        assert {campo: encontrados.get(campo) for campo in esperados} == esperados, nombre
+
+
+def test_plazo_provisional_no_impide_la_salida_temprana():
+    primera = (
+        "2. OBJETO DE LA CONTRATACION Contratar el servicio de limpieza 3. FINALIDAD PUBLICA Mantener. "
+        "El plazo de ejecución será de sesenta (60) días calendario. "
+        "El pago se realizará en DOS (02) ARMADAS, luego de la emisión de la conformidad del servicio, "
+    )
+    paginas = [primera] + ['Relleno sin campos.'] * 60
+    paginas[50] = "El plazo de ejecución del servicio es de hasta 30 días calendario."
+
+    encontrados, reglas, leidas = escanear_campos(paginas)
+
+    assert encontrados['dias'] == '60'
+    assert reglas['dias'] == 'plazo_generico'
+    assert len(leidas) < 30
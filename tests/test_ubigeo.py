@@ -0,0 +1,56 @@
+import math
+import random
+
+import pytest
+
+from ubigeo import RADIO_TIERRA_KM, IndiceUbigeo, cargar_indice, direccion_aproximada, obtener_indice_ubigeo
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+@pytest.fixture(scope='module')
+def registros():
+    aleatorio = random.Random(7)
+    return [
+        (f'{i:06d}', f'D{i}', f'P{i}', f'R{i}', aleatorio.uniform(-18.5, -0.5), aleatorio.uniform(-81, -68.5))
+        for i in range(500)
+    ]
+
+
+@pytest.mark.parametrize('distancia_maxima_km', [5, 25, 400])
+def test_coincide_con_la_busqueda_exhaustiva(registros, distancia_maxima_km):
+    indice = IndiceUbigeo(registros)
+    aleatorio = random.Random(11)
+
+    for _ in range(200):
+        lat, lon = aleatorio.uniform(-18.5, -0.5), aleatorio.uniform(-81, -68.5)
+        distancia, mas_cercano = min(
+            (haversine(lat, lon, r[4], r[5]), r) for r in registros
+        )
+        resultado = indice.buscar(lat, lon, distancia_maxima_km)
+        if distancia > distancia_maxima_km:
+            assert resultado is None
+        else:
+            assert resultado.ubigeo == mas_cercano[0]
+            assert resultado.distancia_km == pytest.approx(distancia)
+
+
+def test_fuera_del_radio_no_hay_resultado(registros):
+    assert IndiceUbigeo(registros).buscar(40.0, 0.0) is None
+
+
+def test_archivo_incluido_ubica_lima():
+    indice = obtener_indice_ubigeo()
+
+    assert len(indice) > 0
+    assert 'Lima' in direccion_aproximada(-12.0464, -77.0428)
+
+
+def test_archivo_inexistente_desactiva_el_respaldo(tmp_path):
+    assert obtener_indice_ubigeo(str(tmp_path / 'no_existe.csv')) is None
+    with pytest.raises(OSError):
+        cargar_indice(str(tmp_path / 'no_existe.csv'))
@@ -0,0 +1,169 @@
+# ubigeo.py
+"""
+Geocodificación inversa sin conexión para el Perú.
+
+Carga un CSV de centroides de ubigeo (``ubigeo, distrito, provincia,
+departamento, lat, lon``) en un índice de rejilla respaldado por NumPy: los
+puntos se ordenan por celda y cada celda guarda el rango que ocupa en los
+arreglos, así que una búsqueda sólo mide distancias contra los centroides de
+las celdas vecinas. Responde "distrito, provincia, departamento" en
+microsegundos y sirve de respaldo cuando Nominatim es lento o no responde.
+
+Cobertura limitada: el archivo incluido sólo trae 67 centroides
+aproximados (los 43 distritos de Lima Metropolitana y las capitales de
+departamento), así que fuera de esas zonas no hay un centroide a menos de
+``DISTANCIA_MAXIMA_KM`` y la búsqueda no devuelve nada. Para cubrir todo el
+país basta apuntar ``COTIZACION_UBIGEO_CSV`` al padrón completo del INEI con
+las mismas columnas.
+"""
+import csv
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_UBIGEO = os.environ.get('COTIZACION_UBIGEO_CSV', os.path.join(BASE_DIR, 'ubigeo_centroides.csv'))
+# Distancia máxima al centroide más cercano para aceptar el resultado
+DISTANCIA_MAXIMA_KM = float(os.environ.get('COTIZACION_UBIGEO_DISTANCIA_KM', '10'))
+# Lado de cada celda de la rejilla, en grados
+TAMANO_CELDA = 0.1
+
+RADIO_TIERRA_KM = 6371.0
+KM_POR_GRADO = math.pi * RADIO_TIERRA_KM / 180
+
+
+@dataclass(frozen=True)
+class Ubigeo:
+    ubigeo: str
+    distrito: str
+    provincia: str
+    departamento: str
+    distancia_km: float
+
+    @property
+    def texto(self):
+        return f"{self.distrito}, {self.provincia}, {self.departamento}"
+
+
+class IndiceUbigeo:
+    """
+    Índice espacial de centroides de ubigeo.
+
+    Args:
+        registros: Iterable de tuplas (ubigeo, distrito, provincia,
+            departamento, lat, lon)
+        tamano_celda: Lado de cada celda de la rejilla, en grados
+    """
+
+    def __init__(self, registros, tamano_celda=TAMANO_CELDA):
+        registros = list(registros)
+        self.tamano_celda = tamano_celda
+        lat = np.array([r[4] for r in registros], dtype=np.float64)
+        lon = np.array([r[5] for r in registros], dtype=np.float64)
+        filas = np.floor(lat / tamano_celda).astype(np.int64)
+        columnas = np.floor(lon / tamano_celda).astype(np.int64)
+
+        orden = np.lexsort((columnas, filas))
+        self._lat = np.radians(lat[orden])
+        self._lon = np.radians(lon[orden])
+        self._cos_lat = np.cos(self._lat)
+        self._datos = [registros[i][:4] for i in orden]
+
+        # Celda -> (inicio, fin) en los arreglos ordenados
+        self._celdas = {}
+        filas, columnas = filas[orden], columnas[orden]
+        inicio = 0
+        for i in range(1, len(orden) + 1):
+            if i == len(orden) or (filas[i], columnas[i]) != (filas[inicio], columnas[inicio]):
+                self._celdas[(int(filas[inicio]), int(columnas[inicio]))] = (inicio, i)
+                inicio = i
+
+    def __len__(self):
+        return len(self._datos)
+
+    def buscar(self, lat, lon, distancia_maxima_km=DISTANCIA_MAXIMA_KM):
+        """
+        Busca el ubigeo cuyo centroide está más cerca de unas coordenadas.
+
+        Returns:
+            Ubigeo: El más cercano, o ``None`` si ninguno está dentro de
+            ``distancia_maxima_km``
+        """
+        fila = math.floor(lat / self.tamano_celda)
+        columna = math.floor(lon / self.tamano_celda)
+        # Celdas que cubre el radio de búsqueda (las de longitud se estrechan
+        # hacia los polos)
+        radio_filas = math.ceil(distancia_maxima_km / KM_POR_GRADO / self.tamano_celda)
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        radio_columnas = math.ceil(distancia_maxima_km / (KM_POR_GRADO * cos_lat) / self.tamano_celda)
+
+        if (2 * radio_filas + 1) * (2 * radio_columnas + 1) > len(self._celdas):
+            # Radio muy grande: es más barato recorrer las celdas ocupadas
+            rangos = [
+                rango for (f, c), rango in self._celdas.items()
+                if abs(f - fila) <= radio_filas and abs(c - columna) <= radio_columnas
+            ]
+        else:
+            rangos = [
+                self._celdas[(f, c)]
+                for f in range(fila - radio_filas, fila + radio_filas + 1)
+                for c in range(columna - radio_columnas, columna + radio_columnas + 1)
+                if (f, c) in self._celdas
+            ]
+        if not rangos:
+            return None
+        candidatos = np.concatenate([np.arange(inicio, fin) for inicio, fin in rangos])
+
+        # Distancia haversine contra los candidatos
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        a = (
+            np.sin((self._lat[candidatos] - lat_r) / 2) ** 2
+            + math.cos(lat_r) * self._cos_lat[candidatos] * np.sin((self._lon[candidatos] - lon_r) / 2) ** 2
+        )
+        distancias = 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        mejor = int(np.argmin(distancias))
+        if distancias[mejor] > distancia_maxima_km:
+            return None
+        return Ubigeo(*self._datos[candidatos[mejor]], distancia_km=float(distancias[mejor]))
+
+
+def cargar_indice(ruta):
+    """
+    Construye el índice a partir de un CSV de centroides.
+
+    Returns:
+        IndiceUbigeo: Índice con todas las filas del archivo
+    """
+    with open(ruta, encoding='utf-8', newline='') as f:
+        registros = [
+            (fila['ubigeo'], fila['distrito'], fila['provincia'], fila['departamento'],
+             float(fila['lat']), float(fila['lon']))
+            for fila in csv.DictReader(f)
+        ]
+    return IndiceUbigeo(registros)
+
+
+@lru_cache(maxsize=None)
+def obtener_indice_ubigeo(ruta=RUTA_UBIGEO):
+    """Índice compartido por el proceso, o ``None`` si no hay archivo de ubigeos."""
+    try:
+        return cargar_indice(ruta)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def direccion_aproximada(lat, lon):
+    """
+    Dirección aproximada ("distrito, provincia, departamento") sin conexión.
+
+    Returns:
+        str: Dirección, o ``None`` si no hay un ubigeo cercano conocido
+    """
+    indice = obtener_indice_ubigeo()
+    if indice is None:
+        return None
+    ubigeo = indice.buscar(lat, lon)
+    return ubigeo.texto if ubigeo else None